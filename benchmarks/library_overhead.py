@@ -0,0 +1,399 @@
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_corpus import SyntheticCorpus
+from document_batcher.validation import Validation
+from document_batcher.document.document_batch_iterator import DocumentBatchIterator
+from document_batcher.document.document_batch_monitor import DocumentBatchMonitor
+from document_batcher.io.input_file import InputFile
+from document_batcher.io.output_file import OutputFile
+
+
+class LibraryOverheadBenchmark:
+
+    #######################################################
+    #### times the library's own overhead on a synthetic
+    ####     corpus, i.e. everything but the user's
+    ####     processor:
+    ####
+    #### input_file_cold_build : InputFile without a cache
+    ####                         (sentence segmentation)
+    #### input_file_warm_load  : InputFile from its cache
+    #### output_file_resume    : OutputFile and iterator
+    ####                         construction on a half
+    ####                         written output file whose
+    ####                         last doc batch is partial
+    #### iterator_throughput   : a full run with a no-op
+    ####                         processor
+    #### monitor_overhead      : post_batch_update for as
+    ####                         many doc batches as a full
+    ####                         run reports
+    ####
+    #### each benchmark reports the minimum over n_repeats
+    ####     runs; results can be compared with a baseline
+    ####     results file, flagging every benchmark that got
+    ####     slower by more than the regression threshold
+
+    _BENCHMARKS = [
+        'input_file_cold_build',
+        'input_file_warm_load',
+        'output_file_resume',
+        'iterator_throughput',
+        'monitor_overhead'
+    ]
+
+    _PREDICTED_STATISTICS_KEY = 'stats'
+
+    def __init__(
+        self           : LibraryOverheadBenchmark,
+        corpus         : SyntheticCorpus = None, # required
+        doc_batch_size : int             = 64,   # optional
+        n_repeats      : int             = 3     # optional
+    ) -> LibraryOverheadBenchmark:
+        assert isinstance(corpus, SyntheticCorpus)
+        assert 0 < doc_batch_size
+        assert 0 < n_repeats
+
+        self._corpus         = corpus         ; del corpus
+        self._doc_batch_size = doc_batch_size ; del doc_batch_size
+        self._n_repeats      = n_repeats      ; del n_repeats
+
+        # the library logs truncations and resumes at warning level and
+        #     above; keep them out of the benchmark output
+        self._logger = logging.getLogger('library_overhead_benchmark')
+        self._logger.setLevel(logging.CRITICAL)
+
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._input_file_path = self._get_tmp_file_path('input.jsonl')
+        self._corpus.write_to_disk(self._input_file_path)
+
+    def _get_tmp_file_path(
+        self      : LibraryOverheadBenchmark,
+        file_name : str
+    ) -> str:
+        return os.path.join(self._tmp_dir.name, file_name)
+
+    def _remove_with_caches(
+        self      : LibraryOverheadBenchmark,
+        file_path : str
+    ) -> None:
+        # removes the file and every cache file derived from its path
+        base = os.path.splitext(os.path.basename(file_path))[0]
+        for file_name in os.listdir(self._tmp_dir.name):
+            if file_name == os.path.basename(file_path) or file_name.startswith(base + '.'):
+                os.remove(self._get_tmp_file_path(file_name))
+
+    def _time(
+        self     : LibraryOverheadBenchmark,
+        setup    : callable,
+        function : callable
+    ) -> float:
+        # setup is called before, and excluded from, each timed run;
+        #     its return value is passed to function
+        n_secs = []
+        for _ in range(self._n_repeats):
+            state = setup()
+            begin = time.perf_counter()
+            function(state)
+            n_secs.append(time.perf_counter() - begin)
+        return min(n_secs)
+
+    def _load_input_file(self : LibraryOverheadBenchmark) -> InputFile:
+        return InputFile(
+            logger    = self._logger,
+            file_path = self._input_file_path
+        )
+
+    def _process_all(
+        self        : LibraryOverheadBenchmark,
+        input_file  : InputFile,
+        output_file : OutputFile
+    ) -> None:
+        doc_batch_iterator = DocumentBatchIterator(
+            logger         = self._logger,
+            input_file     = input_file,
+            output_file    = output_file,
+            monitor        = DocumentBatchMonitor(
+                logger     = self._logger,
+                input_file = input_file
+            ),
+            doc_batch_size = self._doc_batch_size
+        )
+        begin = datetime.datetime.now(datetime.timezone.utc)
+        for doc_batch in doc_batch_iterator:
+            for doc in doc_batch.get_list_of_docs():
+                doc.set_predicted_statistics({})
+            doc_batch.set_begin_datetime(begin)
+            end = datetime.datetime.now(datetime.timezone.utc)
+            doc_batch.set_end_datetime(end)
+            begin = end
+            doc_batch.write_to_disk()
+
+    def _open_output_file(
+        self      : LibraryOverheadBenchmark,
+        file_path : str
+    ) -> OutputFile:
+        return OutputFile(
+            logger                   = self._logger,
+            file_path                = file_path,
+            predicted_statistics_key = LibraryOverheadBenchmark._PREDICTED_STATISTICS_KEY
+        )
+
+    def _run_input_file_cold_build(self : LibraryOverheadBenchmark) -> float:
+        def setup():
+            self._remove_with_caches(self._input_file_path)
+            self._corpus.write_to_disk(self._input_file_path)
+        return self._time(setup, lambda _: self._load_input_file())
+
+    def _run_input_file_warm_load(self : LibraryOverheadBenchmark) -> float:
+        self._load_input_file() # make sure the cache exists
+        return self._time(lambda: None, lambda _: self._load_input_file())
+
+    def _run_iterator_throughput(self : LibraryOverheadBenchmark) -> float:
+        output_file_path = self._get_tmp_file_path('throughput_output.jsonl')
+        def setup():
+            self._remove_with_caches(output_file_path)
+            return self._load_input_file(), self._open_output_file(output_file_path)
+        return self._time(setup, lambda state: self._process_all(*state))
+
+    def _run_output_file_resume(self : LibraryOverheadBenchmark) -> float:
+        # half of the doc batches of a full output file, followed by the
+        #     first doc of the next doc batch, as left by an interrupted run
+        full_output_file_path = self._get_tmp_file_path('throughput_output.jsonl')
+        if not os.path.isfile(full_output_file_path):
+            self._process_all(
+                self._load_input_file(),
+                self._open_output_file(full_output_file_path)
+            )
+        with open(full_output_file_path, 'r') as full_output_file:
+            lines = full_output_file.read().split('\n')
+        n_doc_batches = (len(lines) + self._doc_batch_size - 1) // self._doc_batch_size
+        n_lines = min(
+            len(lines),
+            (n_doc_batches // 2) * self._doc_batch_size + 1
+        )
+        partial_output_file_path = self._get_tmp_file_path('partial_output.jsonl')
+        original_file_path = self._get_tmp_file_path('original_partial_output.jsonl')
+        with open(original_file_path, 'w') as partial_output_file:
+            partial_output_file.write('\n'.join(lines[:n_lines]))
+
+        def setup():
+            self._remove_with_caches(partial_output_file_path)
+            shutil.copyfile(original_file_path, partial_output_file_path)
+            return self._load_input_file()
+        def resume(input_file):
+            DocumentBatchIterator(
+                logger         = self._logger,
+                input_file     = input_file,
+                output_file    = self._open_output_file(partial_output_file_path),
+                monitor        = DocumentBatchMonitor(
+                    logger     = self._logger,
+                    input_file = input_file
+                ),
+                doc_batch_size = self._doc_batch_size
+            )
+        return self._time(setup, resume)
+
+    def _run_monitor_overhead(self : LibraryOverheadBenchmark) -> float:
+        input_file = self._load_input_file()
+        doc_batch_size = self._doc_batch_size
+        n_docs = input_file.get_file_len_in_docs()
+        # one doc batch's worth of the corpus' average doc lengths
+        batch_n_sents = max(1, input_file.get_file_len_in_sents() * doc_batch_size // n_docs)
+        batch_n_words = max(1, input_file.get_file_len_in_words() * doc_batch_size // n_docs)
+        batch_n_chars = max(1, input_file.get_file_len_in_chars() * doc_batch_size // n_docs)
+        batch_stage_n_secs = {
+            'fetch'     : 1e-4,
+            'process'   : 1e-2,
+            'serialize' : 1e-4,
+            'write'     : 1e-4
+        }
+        batch_doc_latencies = [
+            (str(doc_index), batch_n_chars // doc_batch_size, 1e-2 / doc_batch_size)
+            for doc_index in range(doc_batch_size)
+        ]
+        def setup():
+            return DocumentBatchMonitor(
+                logger     = self._logger,
+                input_file = input_file
+            )
+        def update(monitor):
+            for begin_doc_index in range(0, n_docs, doc_batch_size):
+                monitor.post_batch_update(
+                    batch_n_docs        = min(doc_batch_size, n_docs - begin_doc_index),
+                    batch_n_sents       = batch_n_sents,
+                    batch_n_words       = batch_n_words,
+                    batch_n_chars       = batch_n_chars,
+                    batch_n_secs        = 1e-2,
+                    batch_stage_n_secs  = batch_stage_n_secs,
+                    batch_doc_latencies = batch_doc_latencies
+                )
+        return self._time(setup, update)
+
+    def run(self : LibraryOverheadBenchmark) -> dict:
+        n_docs = self._corpus.get_params()['n_docs']
+        results = dict()
+        for benchmark in LibraryOverheadBenchmark._BENCHMARKS:
+            n_secs = getattr(self, '_run_' + benchmark)()
+            results[benchmark] = {
+                'secs'         : n_secs,
+                'docs_per_sec' : n_docs / n_secs if 0.0 < n_secs else None
+            }
+        return {
+            'params' : dict(
+                self._corpus.get_params(),
+                doc_batch_size   = self._doc_batch_size,
+                n_repeats        = self._n_repeats,
+                validation_level = Validation.get_level(),
+                python_version   = platform.python_version(),
+                platform         = platform.platform()
+            ),
+            'results' : results
+        }
+
+    @staticmethod
+    def compare_with_baseline(
+        results              : dict,
+        baseline             : dict,
+        regression_threshold : float
+    ) -> list[dict]:
+        # one comparison per benchmark present in both; a benchmark
+        #     regressed if it got slower by more than the threshold,
+        #     e.g. 0.1 for 10%
+        assert 0.0 <= regression_threshold
+        comparisons = []
+        for benchmark, result in results['results'].items():
+            if benchmark not in baseline['results']:
+                continue
+            baseline_secs = baseline['results'][benchmark]['secs']
+            ratio = result['secs'] / baseline_secs if 0.0 < baseline_secs else 1.0
+            comparisons.append({
+                'benchmark'     : benchmark,
+                'baseline_secs' : baseline_secs,
+                'secs'          : result['secs'],
+                'ratio'         : ratio,
+                'regressed'     : 1.0 + regression_threshold < ratio
+            })
+        return comparisons
+
+
+if '__main__' == __name__:
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        '--n-docs',
+        dest='n_docs',
+        action='store',
+        type=int,
+        default=10000
+    )
+    arg_parser.add_argument(
+        '--mean-doc-len-in-sents',
+        dest='mean_doc_len_in_sents',
+        action='store',
+        type=float,
+        default=8.0
+    )
+    arg_parser.add_argument(
+        '--doc-len-distribution',
+        dest='doc_len_distribution',
+        action='store',
+        choices=SyntheticCorpus.get_len_distributions(),
+        default='lognormal'
+    )
+    arg_parser.add_argument(
+        '--doc-batch-size',
+        dest='doc_batch_size',
+        action='store',
+        type=int,
+        default=64
+    )
+    arg_parser.add_argument(
+        '--n-repeats',
+        dest='n_repeats',
+        action='store',
+        type=int,
+        default=3
+    )
+    arg_parser.add_argument(
+        '--results-file-path',
+        dest='results_file_path',
+        action='store',
+        type=str,
+        default=None,
+        help='write the results as json to this file, e.g. to store a baseline'
+    )
+    arg_parser.add_argument(
+        '--baseline-file-path',
+        dest='baseline_file_path',
+        action='store',
+        type=str,
+        default=None,
+        help='compare the results with this results file; exit with 1 on regressions'
+    )
+    arg_parser.add_argument(
+        '--regression-threshold',
+        dest='regression_threshold',
+        action='store',
+        type=float,
+        default=0.1
+    )
+    args = arg_parser.parse_args()
+
+    results = LibraryOverheadBenchmark(
+        corpus         = SyntheticCorpus(
+            n_docs                = args.n_docs,
+            mean_doc_len_in_sents = args.mean_doc_len_in_sents,
+            doc_len_distribution  = args.doc_len_distribution
+        ),
+        doc_batch_size = args.doc_batch_size,
+        n_repeats      = args.n_repeats
+    ).run()
+
+    if args.results_file_path is not None:
+        with open(args.results_file_path, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    print('{0:<24} {1:>12} {2:>14}'.format('benchmark', 'secs', 'docs per sec'))
+    for benchmark, result in results['results'].items():
+        print(
+            '{0:<24} {1:>12.4f} {2:>14.0f}'.format(
+                benchmark,
+                result['secs'],
+                result['docs_per_sec'] or float('nan')
+            )
+        )
+
+    if args.baseline_file_path is not None:
+        with open(args.baseline_file_path, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['params']['n_docs'] != results['params']['n_docs']:
+            print('warning: the baseline was run on a corpus of a different size')
+        comparisons = LibraryOverheadBenchmark.compare_with_baseline(
+            results              = results,
+            baseline             = baseline,
+            regression_threshold = args.regression_threshold
+        )
+        print()
+        print('{0:<24} {1:>14} {2:>12} {3:>8}'.format('benchmark', 'baseline secs', 'secs', 'ratio'))
+        for comparison in comparisons:
+            print(
+                '{0:<24} {1:>14.4f} {2:>12.4f} {3:>8.2f}{4}'.format(
+                    comparison['benchmark'],
+                    comparison['baseline_secs'],
+                    comparison['secs'],
+                    comparison['ratio'],
+                    '  REGRESSION' if comparison['regressed'] else ''
+                )
+            )
+        if any(comparison['regressed'] for comparison in comparisons):
+            sys.exit(1)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic_corpus import SyntheticCorpus
+from document_batcher.document.document import Document
+from document_batcher.document.document_batch_monitor import DocumentBatchMonitor
+from document_batcher.io.input_file import InputFile
+
+
+class LoggingOverheadBenchmark:
+
+    #######################################################
+    #### times the hot paths that log, with their log
+    ####     level disabled and enabled (to a handler that
+    ####     drops every record), on a corpus of long sents
+    ####     that are all truncated:
+    ####
+    #### segment_docs     : Document.from_input_doc_dict,
+    ####                    which truncates the sents
+    #### post_batch_update: DocumentBatchMonitor, with a
+    ####                    progress summary every doc batch
+
+    def __init__(
+        self                  : LoggingOverheadBenchmark,
+        corpus                : SyntheticCorpus = None, # required
+        max_sent_len_in_chars : int             = 32,   # optional
+        doc_batch_size        : int             = 64,   # optional
+        n_repeats             : int             = 3     # optional
+    ) -> LoggingOverheadBenchmark:
+        assert isinstance(corpus, SyntheticCorpus)
+        assert 0 < max_sent_len_in_chars
+        assert 0 < doc_batch_size
+        assert 0 < n_repeats
+
+        self._corpus                = corpus                ; del corpus
+        self._max_sent_len_in_chars = max_sent_len_in_chars ; del max_sent_len_in_chars
+        self._doc_batch_size        = doc_batch_size        ; del doc_batch_size
+        self._n_repeats             = n_repeats             ; del n_repeats
+
+        self._logger = logging.getLogger('logging_overhead_benchmark')
+        self._logger.propagate = False
+        self._logger.addHandler(logging.NullHandler())
+
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._input_file_path = os.path.join(self._tmp_dir.name, 'input.jsonl')
+        self._corpus.write_to_disk(self._input_file_path)
+        with open(self._input_file_path, 'r') as input_file:
+            self._doc_dicts = [json.loads(line) for line in input_file]
+
+    def _time(
+        self     : LoggingOverheadBenchmark,
+        function : callable
+    ) -> float:
+        n_secs = []
+        for _ in range(self._n_repeats):
+            begin = time.perf_counter()
+            function()
+            n_secs.append(time.perf_counter() - begin)
+        return min(n_secs)
+
+    def _segment_docs(self : LoggingOverheadBenchmark) -> None:
+        for doc_dict in self._doc_dicts:
+            Document.from_input_doc_dict(
+                logger                = self._logger,
+                input_doc_dict        = doc_dict,
+                max_sent_len_in_chars = self._max_sent_len_in_chars
+            )
+
+    def _post_batch_updates(self : LoggingOverheadBenchmark) -> None:
+        monitor = DocumentBatchMonitor(
+            logger              = self._logger,
+            input_file          = self._input_file,
+            log_every_n_batches = 1
+        )
+        n_docs = self._input_file.get_file_len_in_docs()
+        for begin_doc_index in range(0, n_docs, self._doc_batch_size):
+            monitor.post_batch_update(
+                batch_n_docs  = min(self._doc_batch_size, n_docs - begin_doc_index),
+                batch_n_sents = 8 * self._doc_batch_size,
+                batch_n_words = 128 * self._doc_batch_size,
+                batch_n_chars = 1024 * self._doc_batch_size,
+                batch_n_secs  = 1e-2
+            )
+
+    def run(self : LoggingOverheadBenchmark) -> dict:
+        self._logger.setLevel(logging.WARNING)
+        self._input_file = InputFile(
+            logger                = self._logger,
+            file_path             = self._input_file_path,
+            max_sent_len_in_chars = self._max_sent_len_in_chars
+        )
+        results = dict()
+        for level_name in ['WARNING', 'DEBUG']:
+            self._logger.setLevel(getattr(logging, level_name))
+            results[level_name] = {
+                'segment_docs_secs'      : self._time(self._segment_docs),
+                'post_batch_update_secs' : self._time(self._post_batch_updates)
+            }
+        return results
+
+
+if '__main__' == __name__:
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        '--n-docs',
+        dest='n_docs',
+        action='store',
+        type=int,
+        default=2000
+    )
+    arg_parser.add_argument(
+        '--mean-sent-len-in-words',
+        dest='mean_sent_len_in_words',
+        action='store',
+        type=float,
+        default=64.0
+    )
+    arg_parser.add_argument(
+        '--max-sent-len-in-chars',
+        dest='max_sent_len_in_chars',
+        action='store',
+        type=int,
+        default=32
+    )
+    arg_parser.add_argument(
+        '--n-repeats',
+        dest='n_repeats',
+        action='store',
+        type=int,
+        default=3
+    )
+    args = arg_parser.parse_args()
+
+    results = LoggingOverheadBenchmark(
+        corpus                = SyntheticCorpus(
+            n_docs                 = args.n_docs,
+            mean_sent_len_in_words = args.mean_sent_len_in_words
+        ),
+        max_sent_len_in_chars = args.max_sent_len_in_chars,
+        n_repeats             = args.n_repeats
+    ).run()
+
+    print('{0:<10} {1:>20} {2:>24}'.format('level', 'segment docs (s)', 'post batch update (s)'))
+    for level_name, result in results.items():
+        print(
+            '{0:<10} {1:>20.4f} {2:>24.4f}'.format(
+                level_name,
+                result['segment_docs_secs'],
+                result['post_batch_update_secs']
+            )
+        )
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic_corpus import SyntheticCorpus
+from document_batcher.document.document import Document
+from document_batcher.document.statistics_processor import StatisticsProcessor
+from document_batcher.io.input_file import InputFile
+
+
+class StatisticsProcessorBenchmark:
+
+    #######################################################
+    #### times each statistic of StatisticsProcessor on
+    ####     the doc batches of a synthetic corpus, against
+    ####     the per-char python loop of the readme example
+    ####     for the char frequencies; the docs are loaded
+    ####     before timing, so only the statistics are timed
+
+    def __init__(
+        self           : StatisticsProcessorBenchmark,
+        corpus         : SyntheticCorpus = None, # required
+        doc_batch_size : int             = 64,   # optional
+        n_repeats      : int             = 3     # optional
+    ) -> StatisticsProcessorBenchmark:
+        assert isinstance(corpus, SyntheticCorpus)
+        assert 0 < doc_batch_size
+        assert 0 < n_repeats
+
+        self._corpus         = corpus         ; del corpus
+        self._doc_batch_size = doc_batch_size ; del doc_batch_size
+        self._n_repeats      = n_repeats      ; del n_repeats
+
+        logger = logging.getLogger('statistics_processor_benchmark')
+        logger.setLevel(logging.CRITICAL)
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        input_file_path = os.path.join(tmp_dir.name, 'input.jsonl')
+        self._corpus.write_to_disk(input_file_path)
+        input_file = InputFile(
+            logger    = logger,
+            file_path = input_file_path
+        )
+        docs = [
+            input_file.get_input_doc_at_index(doc_index)
+            for doc_index in range(input_file.get_file_len_in_docs())
+        ]
+        self._doc_batches = [
+            docs[begin_doc_index:begin_doc_index+self._doc_batch_size]
+            for begin_doc_index in range(0, len(docs), self._doc_batch_size)
+        ]
+        tmp_dir.cleanup()
+
+    @staticmethod
+    def _get_readme_char_frequencies(docs : list[Document]) -> list[dict]:
+        list_of_char_to_freq = []
+        for doc in docs:
+            char_to_freq = dict()
+            for char in doc.get_full_text():
+                if char not in char_to_freq:
+                    char_to_freq[char] = 1
+                else:
+                    char_to_freq[char] += 1
+            list_of_char_to_freq.append(char_to_freq)
+        return list_of_char_to_freq
+
+    def _time(
+        self    : StatisticsProcessorBenchmark,
+        compute : callable
+    ) -> float:
+        n_secs = []
+        for _ in range(self._n_repeats):
+            begin = time.perf_counter()
+            for docs in self._doc_batches:
+                compute(docs)
+            n_secs.append(time.perf_counter() - begin)
+        return min(n_secs)
+
+    def run(self : StatisticsProcessorBenchmark) -> dict:
+        # the built-in char frequencies must equal the readme's
+        char_frequencies_processor = StatisticsProcessor(['char_frequencies'])
+        for docs in self._doc_batches:
+            assert (
+                [
+                    predicted_statistics['char_frequencies']
+                    for predicted_statistics in char_frequencies_processor.compute(docs)
+                ]
+                == StatisticsProcessorBenchmark._get_readme_char_frequencies(docs)
+            )
+
+        results = {
+            'readme_char_frequencies' : self._time(
+                StatisticsProcessorBenchmark._get_readme_char_frequencies
+            )
+        }
+        for statistic in StatisticsProcessor.get_statistics():
+            results[statistic] = self._time(
+                StatisticsProcessor([statistic]).compute
+            )
+        return results
+
+
+if '__main__' == __name__:
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        '--n-docs',
+        dest='n_docs',
+        action='store',
+        type=int,
+        default=10000
+    )
+    arg_parser.add_argument(
+        '--doc-batch-size',
+        dest='doc_batch_size',
+        action='store',
+        type=int,
+        default=64
+    )
+    arg_parser.add_argument(
+        '--n-repeats',
+        dest='n_repeats',
+        action='store',
+        type=int,
+        default=3
+    )
+    args = arg_parser.parse_args()
+
+    results = StatisticsProcessorBenchmark(
+        corpus         = SyntheticCorpus(n_docs=args.n_docs),
+        doc_batch_size = args.doc_batch_size,
+        n_repeats      = args.n_repeats
+    ).run()
+
+    readme_n_secs = results['readme_char_frequencies']
+    print('{0:<32} {1:>12} {2:>18}'.format('statistic', 'secs', 'vs readme loop'))
+    for statistic, n_secs in results.items():
+        print(
+            '{0:<32} {1:>12.4f} {2:>17.1f}x'.format(
+                statistic,
+                n_secs,
+                readme_n_secs / n_secs if 0.0 < n_secs else float('nan')
+            )
+        )
@@ -0,0 +1,166 @@
+from __future__ import annotations
+import argparse
+import json
+import math
+import random
+
+
+class SyntheticCorpus:
+
+    #######################################################
+    #### generates an input JSONL file of synthetic docs
+    ####
+    #### doc lengths in sentences are drawn from one of
+    ####     the _LEN_DISTRIBUTIONS, all with the given mean:
+    ####
+    #### 'fixed'     : every doc has the mean length
+    #### 'uniform'   : uniform between 1 and twice the mean
+    #### 'lognormal' : heavy tailed, like real web corpora,
+    ####               with a few docs many times the mean
+    ####
+    #### sentence lengths in words are drawn uniformly
+    ####     between 1 and twice the mean; the corpus is
+    ####     fully determined by the seed
+
+    _LEN_DISTRIBUTIONS = ['fixed', 'uniform', 'lognormal']
+
+    _LOGNORMAL_SIGMA = 1.0
+
+    _WORDS = [
+        'the', 'of', 'and', 'to', 'in', 'batch', 'document', 'sentence',
+        'word', 'output', 'input', 'file', 'cache', 'monitor', 'statistics',
+        'processing', 'resume', 'throughput', 'a', 'is'
+    ]
+
+    @staticmethod
+    def get_len_distributions() -> list[str]:
+        return SyntheticCorpus._LEN_DISTRIBUTIONS.copy()
+
+    def __init__(
+        self                   : SyntheticCorpus,
+        n_docs                 : int   = 10000,       # optional
+        mean_doc_len_in_sents  : float = 8.0,         # optional
+        mean_sent_len_in_words : float = 16.0,        # optional
+        doc_len_distribution   : str   = 'lognormal', # optional
+        seed                   : int   = 0            # optional
+    ) -> SyntheticCorpus:
+        assert isinstance(n_docs, int)
+        assert 0 < n_docs
+        assert 1.0 <= mean_doc_len_in_sents
+        assert 1.0 <= mean_sent_len_in_words
+        assert doc_len_distribution in SyntheticCorpus._LEN_DISTRIBUTIONS, \
+            'doc_len_distribution is {0} but should be one of {1}' \
+            .format(
+                doc_len_distribution,
+                SyntheticCorpus._LEN_DISTRIBUTIONS
+            )
+        assert isinstance(seed, int)
+
+        self._n_docs                 = n_docs                 ; del n_docs
+        self._mean_doc_len_in_sents  = mean_doc_len_in_sents  ; del mean_doc_len_in_sents
+        self._mean_sent_len_in_words = mean_sent_len_in_words ; del mean_sent_len_in_words
+        self._doc_len_distribution   = doc_len_distribution   ; del doc_len_distribution
+        self._seed                   = seed                   ; del seed
+
+    def get_params(self : SyntheticCorpus) -> dict:
+        return {
+            'n_docs'                 : self._n_docs,
+            'mean_doc_len_in_sents'  : self._mean_doc_len_in_sents,
+            'mean_sent_len_in_words' : self._mean_sent_len_in_words,
+            'doc_len_distribution'   : self._doc_len_distribution,
+            'seed'                   : self._seed
+        }
+
+    def _draw_doc_len_in_sents(
+        self : SyntheticCorpus,
+        rng  : random.Random
+    ) -> int:
+        mean = self._mean_doc_len_in_sents
+        if 'fixed' == self._doc_len_distribution:
+            return max(1, round(mean))
+        if 'uniform' == self._doc_len_distribution:
+            return rng.randint(1, max(1, round(2 * mean - 1)))
+        # choose mu such that the mean of the lognormal is the given mean
+        sigma = SyntheticCorpus._LOGNORMAL_SIGMA
+        return max(1, round(rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)))
+
+    def _draw_sent(
+        self : SyntheticCorpus,
+        rng  : random.Random
+    ) -> str:
+        n_words = rng.randint(1, max(1, round(2 * self._mean_sent_len_in_words - 1)))
+        words = rng.choices(SyntheticCorpus._WORDS, k=n_words)
+        return words[0].capitalize() + ''.join(' ' + word for word in words[1:]) + '.'
+
+    def write_to_disk(
+        self      : SyntheticCorpus,
+        file_path : str
+    ) -> None:
+        rng = random.Random(self._seed)
+        with open(file_path, 'w') as corpus_file:
+            for doc_index in range(self._n_docs):
+                if 0 < doc_index:
+                    corpus_file.write('\n')
+                corpus_file.write(
+                    json.dumps({
+                        'document_id' : 'synthetic-{0}'.format(doc_index),
+                        'fullText'    : ' '.join(
+                            self._draw_sent(rng)
+                            for _ in range(self._draw_doc_len_in_sents(rng))
+                        )
+                    })
+                )
+
+
+if '__main__' == __name__:
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        'file_path',
+        action='store',
+        type=str
+    )
+    arg_parser.add_argument(
+        '--n-docs',
+        dest='n_docs',
+        action='store',
+        type=int,
+        default=10000
+    )
+    arg_parser.add_argument(
+        '--mean-doc-len-in-sents',
+        dest='mean_doc_len_in_sents',
+        action='store',
+        type=float,
+        default=8.0
+    )
+    arg_parser.add_argument(
+        '--mean-sent-len-in-words',
+        dest='mean_sent_len_in_words',
+        action='store',
+        type=float,
+        default=16.0
+    )
+    arg_parser.add_argument(
+        '--doc-len-distribution',
+        dest='doc_len_distribution',
+        action='store',
+        choices=SyntheticCorpus.get_len_distributions(),
+        default='lognormal'
+    )
+    arg_parser.add_argument(
+        '--seed',
+        dest='seed',
+        action='store',
+        type=int,
+        default=0
+    )
+    args = arg_parser.parse_args()
+
+    SyntheticCorpus(
+        n_docs                 = args.n_docs,
+        mean_doc_len_in_sents  = args.mean_doc_len_in_sents,
+        mean_sent_len_in_words = args.mean_sent_len_in_words,
+        doc_len_distribution   = args.doc_len_distribution,
+        seed                   = args.seed
+    ).write_to_disk(args.file_path)
@@ -0,0 +1,135 @@
+from __future__ import annotations
+import argparse
+import logging
+import tempfile
+import timeit
+import json
+import os
+
+from document_batcher.validation import Validation
+from document_batcher.document.document import Document
+from document_batcher.document.document_batch import DocumentBatch
+from document_batcher.document.document_batch_monitor import DocumentBatchMonitor
+from document_batcher.io.input_file import InputFile
+
+
+class ValidationOverheadBenchmark:
+
+    #######################################################
+    #### times batch assembly and per-doc getter access,
+    ####     which are the hot paths that re-validate state,
+    ####     under each validation level
+
+    def __init__(
+        self           : ValidationOverheadBenchmark,
+        doc_batch_size : int = 1024,
+        n_repeats      : int = 5
+    ) -> ValidationOverheadBenchmark:
+        assert 0 < doc_batch_size
+        assert 0 < n_repeats
+
+        self._doc_batch_size = doc_batch_size
+        self._n_repeats      = n_repeats
+
+        logger = logging.getLogger('validation_overhead_benchmark')
+
+        # a monitor, and hence a (tiny) input file, is required
+        #     to construct a DocumentBatch
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        input_file_path = os.path.join(self._tmp_dir.name, 'input.jsonl')
+        with open(input_file_path, 'w') as input_file:
+            input_file.write(
+                json.dumps({'document_id' : '0', 'fullText' : 'A sentence.'})
+            )
+        self._monitor = DocumentBatchMonitor(
+            logger     = logger,
+            input_file = InputFile(
+                logger    = logger,
+                file_path = input_file_path
+            )
+        )
+
+        # output doc dicts are used because they do not require
+        #     sentence segmentation
+        self._docs = [
+            Document.from_output_doc_dict(
+                logger                   = logger,
+                predicted_statistics_key = 'stats',
+                output_doc_dict          = {
+                    'document_id'              : str(doc_index),
+                    'len_in_sents'             : 3,
+                    'len_in_words'             : 40,
+                    'len_in_chars'             : 200,
+                    'begin_doc_batch_datetime' : 'not first doc in doc batch',
+                    'end_doc_batch_datetime'   : 'not last doc in doc batch',
+                    'stats'                    : {}
+                }
+            )
+            for doc_index in range(self._doc_batch_size)
+        ]
+
+    def _assemble_batch(self : ValidationOverheadBenchmark) -> None:
+        doc_batch = DocumentBatch(
+            monitor     = self._monitor,
+            output_file = None
+        )
+        for doc in self._docs:
+            doc_batch.append_doc(doc)
+
+    def _read_doc_lengths(self : ValidationOverheadBenchmark) -> None:
+        n_chars = 0
+        for doc in self._docs:
+            n_chars += doc.get_len_in_sents()
+            n_chars += doc.get_len_in_words()
+            n_chars += doc.get_len_in_chars()
+            doc.get_id()
+
+    def run(self : ValidationOverheadBenchmark) -> dict:
+        results = dict()
+        for level in Validation.get_levels():
+            Validation.set_level(level)
+            results[level] = {
+                'assemble_batch_secs' : min(
+                    timeit.repeat(self._assemble_batch, number=1, repeat=self._n_repeats)
+                ),
+                'read_doc_lengths_secs' : min(
+                    timeit.repeat(self._read_doc_lengths, number=1, repeat=self._n_repeats)
+                )
+            }
+        Validation.set_level('full')
+        return results
+
+
+if '__main__' == __name__:
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        '--doc-batch-size',
+        dest='doc_batch_size',
+        action='store',
+        type=int,
+        default=1024
+    )
+    arg_parser.add_argument(
+        '--n-repeats',
+        dest='n_repeats',
+        action='store',
+        type=int,
+        default=5
+    )
+    args = arg_parser.parse_args()
+
+    results = ValidationOverheadBenchmark(
+        doc_batch_size = args.doc_batch_size,
+        n_repeats      = args.n_repeats
+    ).run()
+
+    print('{0:<10} {1:>22} {2:>22}'.format('level', 'assemble batch (ms)', 'read doc lengths (ms)'))
+    for level, result in results.items():
+        print(
+            '{0:<10} {1:>22.3f} {2:>22.3f}'.format(
+                level,
+                1000 * result['assemble_batch_secs'],
+                1000 * result['read_doc_lengths_secs']
+            )
+        )
@@ -1,3 +1,113 @@
-print('outside guard')
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import logging
+
+from .io.run_status import RunStatus
+
+
+def _format_n(n : int | float | None) -> str:
+    if n is None:
+        return 'unknown'
+    return '{0:,}'.format(round(n))
+
+
+def _format_n_secs(n_secs : float | None) -> str:
+    if n_secs is None:
+        return 'unknown'
+    return str(datetime.timedelta(seconds=round(n_secs)))
+
+
+def _format_status(status : dict) -> str:
+    lines = [
+        'input file      : {0}'.format(status['input_file_path']),
+        'output file     : {0}'.format(status['output_file_path']),
+        'state           : {0}'.format(status['state'])
+    ]
+    for unit in ['docs', 'sents', 'words', 'chars']:
+        lines.append(
+            '{0:<16}: {1} of {2}'.format(
+                unit,
+                _format_n(status['n_{0}_done'.format(unit)]),
+                _format_n(status['n_{0}_total'.format(unit)])
+            )
+        )
+    lines += [
+        'done            : {0}'.format(
+            'unknown' if status['fraction_done'] is None else
+            '{0:.2%}'.format(status['fraction_done'])
+        ),
+        'last doc batch  : {0} ({1} ago)'.format(
+            status['last_doc_batch_end_datetime'] or 'unknown',
+            _format_n_secs(status['n_secs_since_last_doc_batch'])
+        ),
+        'rate            : {0} docs/s, {1} chars/s'.format(
+            _format_n(status['n_docs_per_sec']),
+            _format_n(status['n_chars_per_sec'])
+        ),
+        'eta             : {0} ({1})'.format(
+            status['eta_datetime'] or 'unknown',
+            _format_n_secs(status['eta_n_secs'])
+        )
+    ]
+    return '\n'.join(lines)
+
+
 if '__main__' == __name__:
-    print('inside guard')
+
+    arg_parser = argparse.ArgumentParser(prog='python -m document_batcher')
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    #### status: the progress of a run, from the output file tail and
+    ####     the cache headers only (see RunStatus)
+    status_arg_parser = subparsers.add_parser(
+        'status',
+        help='report the progress of a run without loading the caches'
+    )
+    status_arg_parser.add_argument(
+        'input_file_path',
+        action='store',
+        type=str
+    )
+    status_arg_parser.add_argument(
+        'output_file_path',
+        action='store',
+        type=str
+    )
+    status_arg_parser.add_argument(
+        '--cache-dir-path',
+        dest='cache_dir_path',
+        action='store',
+        type=str,
+        default=None
+    )
+    status_arg_parser.add_argument(
+        '--max-sent-len-in-chars',
+        dest='max_sent_len_in_chars',
+        action='store',
+        type=int,
+        default=2048
+    )
+    status_arg_parser.add_argument(
+        '--json',
+        dest='json',
+        action='store_true'
+    )
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s')
+    logger = logging.getLogger('document_batcher')
+
+    if 'status' == args.command:
+        status = RunStatus(
+            logger                = logger,
+            input_file_path       = args.input_file_path,
+            output_file_path      = args.output_file_path,
+            cache_dir_path        = args.cache_dir_path,
+            max_sent_len_in_chars = args.max_sent_len_in_chars
+        ).get_status()
+        if args.json:
+            print(json.dumps(status))
+        else:
+            print(_format_status(status))
@@ -1,11 +1,14 @@
 from __future__ import annotations
 import sys
+import logging
 from logging import Logger
 from textwrap import dedent
 import datetime
 
 import nltk # for sentence segmentation
 
+from ..validation import Validation
+
 
 class Document:
     
@@ -23,28 +26,45 @@ class Document:
         self          : Document,
         id_key_to_use : str
     ) -> None:
-        assert not hasattr(self, '_id_key_to_use')
-        assert isinstance(id_key_to_use, str)
-        assert id_key_to_use in Document._ID_KEYS
+        if Validation.boundary:
+            assert not hasattr(self, '_id_key_to_use')
+            assert isinstance(id_key_to_use, str)
+            assert id_key_to_use in Document._ID_KEYS
         self._id_key_to_use = id_key_to_use
     
     def _get_id_key_to_use(self : Document) -> str:
-        assert isinstance(self._id_key_to_use, str)
-        assert self._id_key_to_use in Document._ID_KEYS
+        if Validation.full:
+            assert isinstance(self._id_key_to_use, str)
+            assert self._id_key_to_use in Document._ID_KEYS
         return self._id_key_to_use
     
     def _set_id(
         self   : Document,
         doc_id : str
     ) -> None:
-        assert not hasattr(self, '_id')
-        assert isinstance(doc_id, str)
+        if Validation.boundary:
+            assert not hasattr(self, '_id')
+            assert isinstance(doc_id, str)
         self._id = doc_id
     
     def get_id(self : Document) -> str:
-        assert isinstance(self._id, str)
+        if Validation.full:
+            assert isinstance(self._id, str)
         return self._id
     
+    def get_id_key_index(self : Document) -> int:
+        # index of the doc id json key used by this doc in _ID_KEYS
+        return Document._ID_KEYS.index(self._get_id_key_to_use())
+
+    @staticmethod
+    def get_id_of_doc_dict(doc_dict : dict) -> str | None:
+        # the doc id of an input or output doc dict, without building the
+        #     doc, or None if it has none of the doc id json keys
+        for id_key in Document._ID_KEYS:
+            if id_key in doc_dict:
+                return doc_dict[id_key]
+        return None
+
     
     #######################################################
     #### document text
@@ -59,19 +79,21 @@ class Document:
         self      : Document,
         full_text : str
     ) -> None:
-        assert not hasattr(self, '_full_text')
-        assert isinstance(full_text, str)
+        if Validation.boundary:
+            assert not hasattr(self, '_full_text')
+            assert isinstance(full_text, str)
         self._full_text = full_text
     
     def get_full_text(self : Document) -> str:
-        assert isinstance(self._full_text, str)
+        if Validation.full:
+            assert isinstance(self._full_text, str)
         return self._full_text
     
     def _set_list_of_sents(
         self          : Document,
         list_of_sents : list[str]
     ) -> None:
-        if __debug__:
+        if Validation.boundary:
             assert not hasattr(self, '_list_of_sents')
             assert isinstance(list_of_sents, list)
             for sent in list_of_sents:
@@ -79,7 +101,7 @@ class Document:
         self._list_of_sents = list_of_sents
     
     def get_list_of_sents(self : Document) -> list[str]:
-        if __debug__:
+        if Validation.full:
             assert isinstance(self._list_of_sents, list)
             for sent in self._list_of_sents:
                 assert isinstance(sent, str)
@@ -99,14 +121,16 @@ class Document:
         self         : Document,
         len_in_sents : int
     ) -> None:
-        assert not hasattr(self, '_len_in_sents')
-        assert isinstance(len_in_sents, int)
-        assert 0 < len_in_sents
+        if Validation.boundary:
+            assert not hasattr(self, '_len_in_sents')
+            assert isinstance(len_in_sents, int)
+            assert 0 < len_in_sents
         self._len_in_sents = len_in_sents
     
     def get_len_in_sents(self : Document) -> int:
-        assert isinstance(self._len_in_sents, int)
-        assert 0 < self._len_in_sents
+        if Validation.full:
+            assert isinstance(self._len_in_sents, int)
+            assert 0 < self._len_in_sents
         return self._len_in_sents
    
 
@@ -123,14 +147,16 @@ class Document:
         self         : Document,
         len_in_words : int
     ) -> None:
-        assert not hasattr(self, '_len_in_words')
-        assert isinstance(len_in_words, int)
-        assert 0 < len_in_words
+        if Validation.boundary:
+            assert not hasattr(self, '_len_in_words')
+            assert isinstance(len_in_words, int)
+            assert 0 < len_in_words
         self._len_in_words = len_in_words
 
     def get_len_in_words(self : Document) -> int:
-        assert isinstance(self._len_in_words, int)
-        assert 0 < self._len_in_words
+        if Validation.full:
+            assert isinstance(self._len_in_words, int)
+            assert 0 < self._len_in_words
         return self._len_in_words
    
 
@@ -147,14 +173,16 @@ class Document:
         self         : Document,
         len_in_chars : int
     ) -> None:
-        assert not hasattr(self, '_len_in_chars')
-        assert isinstance(len_in_chars, int)
-        assert 0 < len_in_chars
+        if Validation.boundary:
+            assert not hasattr(self, '_len_in_chars')
+            assert isinstance(len_in_chars, int)
+            assert 0 < len_in_chars
         self._len_in_chars = len_in_chars
 
     def get_len_in_chars(self : Document) -> int:
-        assert isinstance(self._len_in_chars, int)
-        assert 0 < self._len_in_chars
+        if Validation.full:
+            assert isinstance(self._len_in_chars, int)
+            assert 0 < self._len_in_chars
         return self._len_in_chars
     
     
@@ -171,20 +199,22 @@ class Document:
         self  : Document,
         begin : datetime.datetime | str
     ) -> None:
-        assert not hasattr(self, '_begin_doc_batch_datetime')
-        assert (
-            isinstance(begin, datetime.datetime)
-            or 'not first doc in doc batch' == begin
-        )
+        if Validation.boundary:
+            assert not hasattr(self, '_begin_doc_batch_datetime')
+            assert (
+                isinstance(begin, datetime.datetime)
+                or 'not first doc in doc batch' == begin
+            )
         self._begin_doc_batch_datetime = begin
     
     def get_begin_doc_batch_datetime(
         self : Document
     ) -> datetime.datetime | str:
-        assert (
-            isinstance(self._begin_doc_batch_datetime, datetime.datetime)
-            or 'not first doc in doc batch'  == self._begin_doc_batch_datetime
-        )
+        if Validation.full:
+            assert (
+                isinstance(self._begin_doc_batch_datetime, datetime.datetime)
+                or 'not first doc in doc batch'  == self._begin_doc_batch_datetime
+            )
         return self._begin_doc_batch_datetime
     
     def _begin_doc_batch_datetime_to_str(
@@ -211,20 +241,22 @@ class Document:
         self : Document,
         end  : datetime.datetime | str
     ) -> None:
-        assert not hasattr(self, '_end_doc_batch_datetime')
-        assert (
-            isinstance(end, datetime.datetime)
-            or 'not last doc in doc batch' == end
-        )
+        if Validation.boundary:
+            assert not hasattr(self, '_end_doc_batch_datetime')
+            assert (
+                isinstance(end, datetime.datetime)
+                or 'not last doc in doc batch' == end
+            )
         self._end_doc_batch_datetime = end
 
     def get_end_doc_batch_datetime(
         self : Document
     ) -> datetime.datetime | str:
-        assert (
-            isinstance(self._end_doc_batch_datetime, datetime.datetime)
-            or 'not last doc in doc batch' == self._end_doc_batch_datetime
-        )
+        if Validation.full:
+            assert (
+                isinstance(self._end_doc_batch_datetime, datetime.datetime)
+                or 'not last doc in doc batch' == self._end_doc_batch_datetime
+            )
         return self._end_doc_batch_datetime
     
     def _end_doc_batch_datetime_to_str(
@@ -238,6 +270,16 @@ class Document:
             return self._end_doc_batch_datetime
     
     
+    #######################################################
+    #### number of sents truncated to the max sent len; the
+    ####     input file cache stores the untruncated sents, so
+    ####     for a doc read from it, the sents are truncated
+    ####     when the doc is decoded
+    
+    def get_n_truncated_sents(self : Document) -> int:
+        return getattr(self, '_n_truncated_sents', 0)
+    
+    
     #######################################################
     #### predicted statistics for document
     
@@ -245,14 +287,24 @@ class Document:
         self                 : Document,
         predicted_statistics : dict
     ) -> None:
-        assert not hasattr(self, '_predicted_statistics')
-        assert isinstance(predicted_statistics, dict)
+        if Validation.boundary:
+            assert not hasattr(self, '_predicted_statistics')
+            assert isinstance(predicted_statistics, dict)
         self._predicted_statistics = predicted_statistics
     
     def get_predicted_statistics(self : Document) -> dict:
-        assert isinstance(self._predicted_statistics, dict)
+        if Validation.full:
+            assert isinstance(self._predicted_statistics, dict)
         return self._predicted_statistics
     
+    def has_predicted_statistics(self : Document) -> bool:
+        return hasattr(self, '_predicted_statistics')
+    
+    def clear_predicted_statistics(self : Document) -> None:
+        # so that the doc can be processed again after a failure
+        if hasattr(self, '_predicted_statistics'):
+            del self._predicted_statistics
+    
     
     #######################################################
     #### output representation of document
@@ -261,7 +313,8 @@ class Document:
         self                     : Document,
         predicted_statistics_key : str
     ) -> dict:
-        assert isinstance(predicted_statistics_key, str)
+        if Validation.full:
+            assert isinstance(predicted_statistics_key, str)
         return {
             self._get_id_key_to_use()                    : self.get_id(),
             Document._get_len_in_sents_key()             : self.get_len_in_sents(),
@@ -280,29 +333,40 @@ class Document:
         self   : Document,
         logger : Logger
     ) -> None:
-        assert hasattr(self, '_logger') is False
-        assert isinstance(logger, Logger)
+        if Validation.boundary:
+            assert hasattr(self, '_logger') is False
+            assert isinstance(logger, Logger)
         self._logger = logger
         
     def _get_logger(self : Logger) -> Logger:
-        assert isinstance(self._logger, Logger)
+        if Validation.full:
+            assert isinstance(self._logger, Logger)
         return self._logger
     
     
     #######################################################
-    #### enforced maximum sentence length
+    #### enforced maximum sentence length; None for the
+    ####     untruncated docs written to the input file cache
     
     def _set_max_sent_len_in_chars(
         self                  : Document,
-        max_sent_len_in_chars : int
+        max_sent_len_in_chars : int | None
     ) -> None:
-        assert hasattr(self, '_max_sent_len_in_chars') is False
-        assert isinstance(max_sent_len_in_chars, int)
-        assert 0 < max_sent_len_in_chars
+        if Validation.boundary:
+            assert hasattr(self, '_max_sent_len_in_chars') is False
+            assert (
+                isinstance(max_sent_len_in_chars, int)
+                and 0 < max_sent_len_in_chars
+                or max_sent_len_in_chars is None
+            )
         self._max_sent_len_in_chars = max_sent_len_in_chars
 
-    def _get_max_sent_len_in_chars(self : Document) -> int:
-        assert 0 < self._max_sent_len_in_chars
+    def _get_max_sent_len_in_chars(self : Document) -> int | None:
+        if Validation.full:
+            assert (
+                self._max_sent_len_in_chars is None
+                or 0 < self._max_sent_len_in_chars
+            )
         return self._max_sent_len_in_chars
     
     
@@ -345,11 +409,60 @@ class Document:
         self._set_id_key_to_use(id_key); del id_key
     
     
+    _TRUNCATED_SENTS_MESSAGE = dedent(
+        '''\
+        document.document: Document._truncate_sents:
+        {0} of the {1} sents in the doc with id of {2}
+        were truncated to {3} chars, the longest from {4} chars:
+        the truncation threshold can be adjusted with the option
+        "--max-sent-len-in-chars len"'''
+    ).replace('\n', ' ')
+    
+    def _truncate_sents(
+        self          : Document,
+        list_of_sents : list[str]
+    ) -> int:
+        # truncates the sents in place to the max sent len and returns the
+        #     number of truncated sents; truncations are counted rather than
+        #     logged per sent, and InputFile logs the totals for the run
+        n_truncated_sents = 0
+        max_truncated_sent_len_in_chars = 0
+        max_sent_len_in_chars = self._get_max_sent_len_in_chars()
+        if max_sent_len_in_chars is None:
+            return n_truncated_sents
+        for sent_index in range(len(list_of_sents)):
+            if max_sent_len_in_chars < len(list_of_sents[sent_index]):
+                n_truncated_sents += 1
+                max_truncated_sent_len_in_chars = max(
+                    max_truncated_sent_len_in_chars,
+                    len(list_of_sents[sent_index])
+                )
+                list_of_sents[sent_index] = \
+                    list_of_sents[sent_index][:max_sent_len_in_chars]
+        self._n_truncated_sents = n_truncated_sents
+        
+        if (
+            0 < n_truncated_sents
+            and self._get_logger().isEnabledFor(logging.DEBUG)
+        ):
+            self._get_logger().debug(
+                Document._TRUNCATED_SENTS_MESSAGE.format(
+                    n_truncated_sents,
+                    len(list_of_sents),
+                    self.get_id(),
+                    max_sent_len_in_chars,
+                    max_truncated_sent_len_in_chars
+                )
+            )
+        
+        return n_truncated_sents
+    
+    
     @staticmethod
     def from_input_doc_dict(
         logger                : Logger,
         input_doc_dict        : dict,
-        max_sent_len_in_chars : int
+        max_sent_len_in_chars : int | None
     ) -> Document:
         assert isinstance(input_doc_dict, dict)
         
@@ -394,31 +507,9 @@ class Document:
         
         list_of_sents = nltk.sent_tokenize(input_doc.get_full_text())
         
-        for sent_index in range(len(list_of_sents)):
-            if (
-                input_doc._get_max_sent_len_in_chars()
-                < len(list_of_sents[sent_index])
-            ):
-                input_doc._get_logger().debug(
-                    dedent(
-                        '''\
-                        document.document: Document.from_input_doc_dict:
-                        the sent at index {0}
-                        in the doc with id of {1}
-                        was truncated from its original length of {2} chars
-                        to {3} chars:
-                        the truncation threshold can be adjusted with the option
-                        "--max-sent-len-in-chars len"'''
-                    ).replace('\n', ' ').format(
-                        sent_index,
-                        input_doc.get_id(),
-                        len(list_of_sents[sent_index]),
-                        input_doc._get_max_sent_len_in_chars()
-                    )
-                )
-
-                list_of_sents[sent_index] = \
-                    list_of_sents[sent_index][:input_doc._get_max_sent_len_in_chars()]
+        # with a max sent len of None, e.g. for the input file cache,
+        #     the sents are left untruncated
+        input_doc._truncate_sents(list_of_sents)
         
         input_doc._set_list_of_sents(list_of_sents); del list_of_sents
         input_doc._set_len_in_sents(len(input_doc.get_list_of_sents()))
@@ -434,8 +525,43 @@ class Document:
         )
         
         return input_doc
-        
-        
+
+
+    @staticmethod
+    def from_input_cache(
+        logger                : Logger,
+        id_key_index          : int,
+        doc_id                : str,
+        full_text             : str,
+        list_of_sents         : list[str],
+        len_in_words          : int,
+        len_in_chars          : int,
+        max_sent_len_in_chars : int
+    ) -> Document:
+        # rebuilds an input doc from the parts stored in an InputCache,
+        #     i.e. with its sentences already segmented but not yet
+        #     truncated; len_in_words and len_in_chars are those of the
+        #     untruncated sents, and are only recounted if a sent is
+        #     truncated
+        input_doc = Document(
+            logger   = logger,
+            doc_dict = {Document._ID_KEYS[id_key_index] : doc_id}
+        )                                     ; del logger
+        input_doc._set_max_sent_len_in_chars(
+            max_sent_len_in_chars
+        )                                     ; del max_sent_len_in_chars
+        input_doc._set_full_text(full_text)   ; del full_text
+        if 0 < input_doc._truncate_sents(list_of_sents):
+            len_in_words = sum(len(sent.split()) for sent in list_of_sents)
+            len_in_chars = sum(len(sent)         for sent in list_of_sents)
+        input_doc._set_list_of_sents(list_of_sents)
+        input_doc._set_len_in_sents(len(list_of_sents)) ; del list_of_sents
+        input_doc._set_len_in_words(len_in_words)       ; del len_in_words
+        input_doc._set_len_in_chars(len_in_chars)       ; del len_in_chars
+
+        return input_doc
+
+
     @staticmethod
     def from_output_doc_dict(
         logger                   : Logger,
@@ -1,32 +1,88 @@
 from __future__ import annotations
 import datetime
-import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
 
 from ..io.output_file import OutputFile
+from ..io.quarantine import Quarantine
+from ..io.result_cache import ResultCache
+from ..io.segmented_output_file import SegmentedOutputFile
 from .document import Document
+from .document_batch_columns import DocumentBatchColumns
 from .document_batch_monitor import DocumentBatchMonitor
+from ..validation import Validation
 
 
 class DocumentBatch:
 
     def __init__(
-        self        : DocumentBatch,
-        monitor     : DocumentBatchMonitor,
-        output_file : OutputFile
+        self         : DocumentBatch,
+        monitor      : DocumentBatchMonitor,
+        output_file  : OutputFile | SegmentedOutputFile,
+        result_cache : ResultCache = None,
+        is_writable  : Callable[[], bool] = None
     ) -> DocumentBatch:
         
         assert isinstance(monitor, DocumentBatchMonitor)
         assert (
-            isinstance(output_file, OutputFile)
+            isinstance(output_file, (OutputFile, SegmentedOutputFile))
             or output_file is None
         )
+        assert (
+            isinstance(result_cache, ResultCache)
+            or result_cache is None
+        )
+        assert (
+            callable(is_writable)
+            or is_writable is None
+        )
+        
+        self._monitor      = monitor      ; del monitor
+        self._output_file  = output_file  ; del output_file
+        self._result_cache = result_cache ; del result_cache
         
-        self._monitor     = monitor     ; del monitor
-        self._output_file = output_file ; del output_file
+        # called by write_to_disk right before the doc batch is written; if
+        #     it returns False, the doc batch is dropped instead, e.g. when
+        #     the lease on the work queue range it belongs to was lost
+        self._is_writable  = is_writable  ; del is_writable
         
         
         self._list_of_docs = []
         self._done = False
+        
+        # the duration of a doc batch that is processed (rather than replayed
+        #     from the output file) is measured with a monotonic
+        #     high-resolution clock from the creation of the doc batch
+        #     until its monitor update
+        self._begin_perf_counter = time.perf_counter()
+        
+        # per-stage durations of a processed doc batch; the monitor stage is
+        #     timed by the monitor itself
+        self._fetched_perf_counter = None
+        self._stage_n_secs = {
+            'fetch'     : 0.0,
+            'process'   : 0.0,
+            'serialize' : 0.0,
+            'write'     : 0.0
+        }
+        
+        # (doc id, len_in_chars, n_secs) for each doc timed with time_doc
+        self._doc_latencies = []
+        
+        # populated by _look_up_result_cache
+        self._list_of_docs_to_process   = None
+        self._list_of_cached_docs       = None
+        self._text_hash_to_missed_docs  = None
+        self._n_cache_lookups           = 0
+        self._n_cache_hits              = 0
+        
+        # populated by get_columns
+        self._columns = None
+        
+        # populated by process_isolating_failures
+        self._quarantine              = None
+        self._quarantined_doc_ids     = set()
 
 
     def _validate_list_of_docs(
@@ -41,24 +97,272 @@ class DocumentBatch:
 
     def get_list_of_docs(self : DocumentBatch) -> list[Document]:
 
-        assert self._done is False
-        self._validate_list_of_docs()
+        if Validation.full:
+            assert self._done is False
+            self._validate_list_of_docs()
 
         return self._list_of_docs
 
 
+    def get_list_of_docs_to_process(
+        self : DocumentBatch
+    ) -> list[Document]:
+        # Returns the docs whose predicted statistics still need to be
+        # computed: without a result cache these are all the docs in the batch;
+        # with a result cache, docs whose text already has a known result get
+        # their predicted statistics set from the cache, and of several docs in
+        # the batch with identical text only the first is returned (the others
+        # receive its predicted statistics in write_to_disk)
+        
+        if Validation.full:
+            assert self._done is False
+            self._validate_list_of_docs()
+        
+        if self._result_cache is None:
+            return self._list_of_docs
+        
+        if self._list_of_docs_to_process is None:
+            self._look_up_result_cache()
+        
+        return self._list_of_docs_to_process
+    
+    
+    def get_columns(
+        self : DocumentBatch
+    ) -> DocumentBatchColumns:
+        # Returns a columnar (numpy) view of the docs to process, see
+        # DocumentBatchColumns; their predicted statistics can be set from
+        # arrays with DocumentBatchColumns.set_predicted_statistics
+        
+        if Validation.full:
+            assert self._done is False
+        
+        if self._columns is None:
+            self._columns = DocumentBatchColumns(
+                self.get_list_of_docs_to_process()
+            )
+        
+        return self._columns
+    
+    
+    def get_list_of_cached_docs(
+        self : DocumentBatch
+    ) -> list[Document]:
+        
+        if Validation.full:
+            assert self._done is False
+            assert isinstance(self._result_cache, ResultCache)
+        
+        if self._list_of_cached_docs is None:
+            self._look_up_result_cache()
+        
+        return self._list_of_cached_docs
+    
+    
+    def _look_up_result_cache(
+        self : DocumentBatch
+    ) -> None:
+        
+        if Validation.full:
+            assert self._done is False
+            assert isinstance(self._result_cache, ResultCache)
+            assert self._list_of_docs_to_process is None
+        
+        self._list_of_docs_to_process  = []
+        self._list_of_cached_docs      = []
+        self._text_hash_to_missed_docs = dict()
+        
+        for doc in self._list_of_docs:
+            
+            text_hash = self._result_cache.get_text_hash(doc)
+            
+            # duplicate of a doc earlier in the same batch, whose result is
+            #     not in the cache yet: neither a lookup nor a hit
+            if text_hash in self._text_hash_to_missed_docs:
+                self._text_hash_to_missed_docs[text_hash].append(doc)
+                continue
+            
+            self._n_cache_lookups += 1
+            predicted_statistics = \
+                self._result_cache.get_predicted_statistics(text_hash)
+            
+            if predicted_statistics is None:
+                self._text_hash_to_missed_docs[text_hash] = [doc]
+                self._list_of_docs_to_process.append(doc)
+            else:
+                doc.set_predicted_statistics(predicted_statistics)
+                self._list_of_cached_docs.append(doc)
+                self._n_cache_hits += 1
+    
+    
+    def _update_result_cache(
+        self : DocumentBatch
+    ) -> None:
+        
+        if Validation.full:
+            assert self._done is False
+            assert isinstance(self._result_cache, ResultCache)
+        
+        if self._text_hash_to_missed_docs is None:
+            # the user processed every doc via get_list_of_docs,
+            #     so every result is new to the cache
+            for doc in self._list_of_docs:
+                if doc.get_id() in self._quarantined_doc_ids:
+                    continue
+                self._result_cache.put_predicted_statistics(
+                    self._result_cache.get_text_hash(doc),
+                    doc.get_predicted_statistics()
+                )
+        else:
+            for text_hash, docs in self._text_hash_to_missed_docs.items():
+                predicted_statistics = docs[0].get_predicted_statistics()
+                for duplicate_doc in docs[1:]:
+                    duplicate_doc.set_predicted_statistics(predicted_statistics)
+                # a placeholder result must never be served from the cache
+                if docs[0].get_id() in self._quarantined_doc_ids:
+                    for duplicate_doc in docs[1:]:
+                        self._quarantine.add(
+                            duplicate_doc,
+                            'same text as quarantined doc {0}'.format(docs[0].get_id())
+                        )
+                    continue
+                self._result_cache.put_predicted_statistics(
+                    text_hash,
+                    predicted_statistics
+                )
+        
+        self._result_cache.commit()
+    
+    
+    def process_isolating_failures(
+        self                : DocumentBatch,
+        process_docs        : Callable[[list[Document]], None],
+        quarantine          : Quarantine,
+        max_failed_fraction : float = 1.0
+    ) -> None:
+        # Calls process_docs, which must set the predicted statistics of
+        # every doc in the list it is given, on the docs to process; if it
+        # raises, the docs are split in half and each half is processed again,
+        # recursively, until the docs it raises on are isolated: these get the
+        # placeholder predicted statistics of the quarantine and are recorded
+        # in it, while every other doc gets its real result, e.g.
+        #
+        #     doc_batch.process_isolating_failures(
+        #         lambda docs: [
+        #             doc.set_predicted_statistics(stats)
+        #             for doc, stats in zip(docs, model.predict(docs))
+        #         ],
+        #         quarantine
+        #     )
+        #
+        # a batch without poison docs costs a single call of process_docs
+        #
+        # a failure that is not a property of a doc (e.g. the model server
+        #     is down, or the device is out of memory) fails every doc, so
+        #     once more than max_failed_fraction of the docs (and in any
+        #     case all of the docs of a batch of more than one doc) failed,
+        #     the exception is re-raised instead, and nothing is quarantined;
+        #     a single doc to process is quarantined only if it already
+        #     failed once (see Quarantine.has_failed), so that, as with a
+        #     doc the process dies on, one transient failure does not
+        #     quarantine an innocent doc
+        
+        if Validation.boundary:
+            assert self._done is False
+            assert callable(process_docs)
+            assert isinstance(quarantine, Quarantine)
+            assert isinstance(max_failed_fraction, float)
+            assert 0.0 <= max_failed_fraction <= 1.0
+        
+        self._quarantine = quarantine
+        
+        docs = self.get_list_of_docs_to_process()
+        max_n_failed_docs = int(max_failed_fraction * len(docs))
+        if 1 < len(docs):
+            max_n_failed_docs = min(max_n_failed_docs, len(docs) - 1)
+        elif 1 == len(docs) and not self._quarantine.has_failed(docs[0]):
+            max_n_failed_docs = 0
+        else:
+            max_n_failed_docs = len(docs)
+        
+        failures = list()
+        try:
+            self._process_isolating_failures(
+                docs,
+                process_docs,
+                failures,
+                max_n_failed_docs
+            )
+        except Exception:
+            if 1 == len(docs):
+                self._quarantine.record_failure(docs[0])
+            raise
+        
+        # the docs are only quarantined once it is certain that their
+        #     failures are doc-specific
+        for doc, exception in failures:
+            doc.set_predicted_statistics(
+                self._quarantine.get_placeholder_predicted_statistics()
+            )
+            self._quarantine.add(doc, repr(exception))
+            self._quarantined_doc_ids.add(doc.get_id())
+    
+    
+    def _process_isolating_failures(
+        self              : DocumentBatch,
+        docs              : list[Document],
+        process_docs      : Callable[[list[Document]], None],
+        failures          : list[tuple[Document, Exception]],
+        max_n_failed_docs : int
+    ) -> None:
+        
+        if 0 == len(docs):
+            return
+        
+        try:
+            process_docs(docs)
+            return
+        except Exception as exception:
+            if 1 == len(docs):
+                docs[0].clear_predicted_statistics()
+                failures.append((docs[0], exception))
+                if max_n_failed_docs < len(failures):
+                    raise
+                return
+        
+        # outside of the except clause, so that the exception of a failed
+        #     half is not chained to the exception of the whole
+        for doc in docs:
+            doc.clear_predicted_statistics()
+        half_len_in_docs = len(docs) // 2
+        self._process_isolating_failures(
+            docs[:half_len_in_docs],
+            process_docs,
+            failures,
+            max_n_failed_docs
+        )
+        self._process_isolating_failures(
+            docs[half_len_in_docs:],
+            process_docs,
+            failures,
+            max_n_failed_docs
+        )
+    
+    
     def get_len_in_docs(self : DocumentBatch) -> int:
 
-        assert self._done is False
-        self._validate_list_of_docs()
+        if Validation.full:
+            assert self._done is False
+            self._validate_list_of_docs()
 
         return len(self._list_of_docs)
 
     
     def get_index(self : DocumentBatch) -> int:
         
-        assert self._done is False
-        assert isinstance(self._monitor, DocumentBatchMonitor)
+        if Validation.full:
+            assert self._done is False
+            assert isinstance(self._monitor, DocumentBatchMonitor)
 
         return self._monitor.get_current_doc_batch_index()
 
@@ -69,26 +373,76 @@ class DocumentBatch:
     ) -> None:
 
         # validate method-invocation preconditions
-        assert self._done is False
-        self._validate_list_of_docs()
+        if Validation.full:
+            assert self._done is False
+            self._validate_list_of_docs()
 
         # validate method argument
-        assert isinstance(doc_to_append, Document)
+        if Validation.boundary:
+            assert isinstance(doc_to_append, Document)
 
 
         self._list_of_docs.append(doc_to_append)
 
 
+    def set_fetched(
+        self : DocumentBatch
+    ) -> None:
+        
+        # called by the iterator once all docs of the doc batch are appended;
+        #     the time until write_to_disk is attributed to the processor
+        if Validation.boundary:
+            assert self._done is False
+            assert self._fetched_perf_counter is None
+        
+        self._fetched_perf_counter = time.perf_counter()
+        self._stage_n_secs['fetch'] = \
+            self._fetched_perf_counter - self._begin_perf_counter
+
+
+    @contextmanager
+    def time_doc(
+        self : DocumentBatch,
+        doc  : Document
+    ) -> Iterator[Document]:
+        
+        # Optional per-doc timing context for the user's per-doc work, e.g.
+        #
+        #     for doc in doc_batch.get_list_of_docs():
+        #         with doc_batch.time_doc(doc):
+        #             doc.set_predicted_statistics(process(doc))
+        #
+        # the latencies are reported to the monitor with the doc batch
+        
+        if Validation.boundary:
+            assert self._done is False
+            assert isinstance(doc, Document)
+        
+        begin = time.perf_counter()
+        try:
+            yield doc
+        finally:
+            self._doc_latencies.append(
+                (
+                    doc.get_id(),
+                    doc.get_len_in_chars(),
+                    time.perf_counter() - begin
+                )
+            )
+
+
     def set_begin_datetime(
         self  : DocumentBatch,
         begin : datetime.datetime | str
     ) -> None:
 
         # validate method-invocation preconditions
-        assert self._done is False
+        if Validation.boundary:
+            assert self._done is False
 
         # validate method argument
-        assert isinstance(begin, datetime.datetime)
+        if Validation.boundary:
+            assert isinstance(begin, datetime.datetime)
        
         
         self._list_of_docs[0].set_begin_doc_batch_datetime(begin)
@@ -102,10 +456,12 @@ class DocumentBatch:
     ) -> None:
 
         # validate method-invocation preconditions
-        assert self._done is False
+        if Validation.boundary:
+            assert self._done is False
 
         # validate method argument
-        assert isinstance(end, datetime.datetime)
+        if Validation.boundary:
+            assert isinstance(end, datetime.datetime)
 
 
         self._list_of_docs[-1].set_end_doc_batch_datetime(end)
@@ -118,9 +474,10 @@ class DocumentBatch:
     ) -> None:
         
         # validate method-invocation preconditions
-        assert self._done is False
-        assert isinstance(self._monitor, DocumentBatchMonitor)
-        self._validate_list_of_docs()
+        if Validation.full:
+            assert self._done is False
+            assert isinstance(self._monitor, DocumentBatchMonitor)
+            self._validate_list_of_docs()
         
         
         n_docs  = 0
@@ -136,17 +493,27 @@ class DocumentBatch:
             n_chars += doc.get_len_in_chars()
 
 
-        begin = self._list_of_docs[0].get_begin_doc_batch_datetime()
-        end   = self._list_of_docs[-1].get_end_doc_batch_datetime()
-        
-        n_secs = math.ceil((end - begin).total_seconds())
+        if self._output_file is not None:
+            n_secs = time.perf_counter() - self._begin_perf_counter
+        else:
+            # replayed from the output file, where only the datetimes are known
+            begin = self._list_of_docs[0].get_begin_doc_batch_datetime()
+            end   = self._list_of_docs[-1].get_end_doc_batch_datetime()
+            n_secs = (end - begin).total_seconds()
         
         self._monitor.post_batch_update(
-            batch_n_docs  = n_docs,
-            batch_n_sents = n_sents,
-            batch_n_words = n_words,
-            batch_n_chars = n_chars,
-            batch_n_secs  = n_secs
+            batch_n_docs          = n_docs,
+            batch_n_sents         = n_sents,
+            batch_n_words         = n_words,
+            batch_n_chars         = n_chars,
+            batch_n_secs          = n_secs,
+            batch_n_cache_lookups = self._n_cache_lookups,
+            batch_n_cache_hits    = self._n_cache_hits,
+            batch_stage_n_secs    = (
+                self._stage_n_secs if self._output_file is not None else None
+            ),
+            batch_doc_latencies   = self._doc_latencies,
+            is_replayed           = self._output_file is None
         )
 
 
@@ -154,13 +521,45 @@ class DocumentBatch:
         self : DocumentBatch
     ) -> None:
         
-        assert self._done is False
-        assert isinstance(self._output_file, OutputFile)
-        self._validate_list_of_docs()
+        # writing a doc batch twice would duplicate its docs in the output
+        #     file, so this is checked at the boundary level
+        if Validation.boundary:
+            assert self._done is False
+        if Validation.full:
+            assert isinstance(self._output_file, (OutputFile, SegmentedOutputFile))
+            self._validate_list_of_docs()
+
+        if (
+            self._is_writable is not None
+            and not self._is_writable()
+        ):
+            self.set_done(True)
+            return
+
+        write_to_disk_begin = time.perf_counter()
+        if self._fetched_perf_counter is not None:
+            self._stage_n_secs['process'] = \
+                write_to_disk_begin - self._fetched_perf_counter
+
+        if self._result_cache is not None:
+            self._update_result_cache()
+
+        result_cache_n_secs = time.perf_counter() - write_to_disk_begin
 
         for doc in self._list_of_docs:
             self._output_file.append_output_doc(doc)
 
+        # hand every complete doc batch to the os, so that it survives
+        #     the process being killed before the next doc batch is written
+        flush_begin = time.perf_counter()
+        self._output_file.flush()
+        flush_n_secs = time.perf_counter() - flush_begin
+
+        output_file_stage_n_secs = self._output_file.pop_stage_n_secs()
+        self._stage_n_secs['serialize'] = output_file_stage_n_secs['serialize']
+        self._stage_n_secs['write'] = \
+            output_file_stage_n_secs['write'] + result_cache_n_secs + flush_n_secs
+
 
         self.update_monitor()
         self.set_done(True)
@@ -170,13 +569,15 @@ class DocumentBatch:
         self : DocumentBatch,
         done : bool
     ) -> None:
-        assert self._done is False
-        assert done is True
+        if Validation.boundary:
+            assert self._done is False
+            assert done is True
         self._done = True
     
         
     def is_done(self : DocumentBatch) -> bool:
-        assert isinstance(self._done, bool)
+        if Validation.full:
+            assert isinstance(self._done, bool)
         return self._done
 
 
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+try:
+    import numpy as np # optional: pip install document-batcher[numpy]
+except ImportError:
+    np = None
+
+from .document import Document
+from ..validation import Validation
+
+
+class DocumentBatchColumns:
+
+    #######################################################
+    #### columnar view of the docs of a doc batch, for
+    ####     processors that compute statistics with
+    ####     vectorized numpy operations instead of
+    ####     python loops over docs and chars
+    ####
+    #### the full texts of the docs are concatenated into a
+    ####     single buffer of unicode code points (uint32),
+    ####     and doc_offsets[i]:doc_offsets[i+1] is the span
+    ####     of doc i in it; the sents are concatenated into
+    ####     a second buffer in the same way, since a
+    ####     truncated sent is not a span of its doc's text,
+    ####     and doc_sent_offsets[i]:doc_sent_offsets[i+1]
+    ####     are the indices of the sents of doc i
+    ####
+    #### every buffer is built with a single join and a
+    ####     single encode, and the code point arrays are
+    ####     views of the encoded bytes (np.frombuffer), so
+    ####     no doc is copied on its own; all of them are
+    ####     built lazily, on first access
+    ####
+    #### e.g. the char frequencies of every doc at once:
+    ####
+    ####     columns = doc_batch.get_columns()
+    ####     doc_index_per_char = columns.get_doc_index_per_char()
+    ####     code_points = columns.get_code_points()
+    ####     unique_code_points, code_point_indices = \
+    ####         np.unique(code_points, return_inverse=True)
+    ####     counts = np.bincount(
+    ####         doc_index_per_char * len(unique_code_points) + code_point_indices,
+    ####         minlength = columns.get_len_in_docs() * len(unique_code_points)
+    ####     ).reshape(columns.get_len_in_docs(), len(unique_code_points))
+
+    _UTF_32 = 'utf-32-le' # no byte order mark
+
+    def __init__(
+        self         : DocumentBatchColumns,
+        list_of_docs : list[Document]
+    ) -> DocumentBatchColumns:
+        if np is None:
+            raise ImportError(
+                'numpy is required for the columnar view of a doc batch: '
+                'pip install numpy'
+            )
+        if Validation.boundary:
+            assert isinstance(list_of_docs, list)
+            for doc in list_of_docs:
+                assert isinstance(doc, Document)
+
+        self._list_of_docs = list_of_docs ; del list_of_docs
+
+        self._text             = None
+        self._code_points      = None
+        self._doc_offsets      = None
+        self._sents_text       = None
+        self._sent_code_points = None
+        self._sent_offsets     = None
+        self._doc_sent_offsets = None
+
+
+    @staticmethod
+    def _get_offsets(lens : list[int]) -> np.ndarray:
+        offsets = np.zeros(len(lens) + 1, dtype=np.int64)
+        np.cumsum(lens, out=offsets[1:])
+        return offsets
+
+    @staticmethod
+    def _get_code_points(text : str) -> np.ndarray:
+        # one code point per char, since utf-32 has no surrogate pairs;
+        #     a lone surrogate, which json.loads makes of e.g. "\ud800",
+        #     is kept as its own code point rather than raising
+        return np.frombuffer(
+            text.encode(DocumentBatchColumns._UTF_32, errors='surrogatepass'),
+            dtype = np.dtype('<u4')
+        )
+
+
+    #######################################################
+    #### docs
+
+    def get_list_of_docs(self : DocumentBatchColumns) -> list[Document]:
+        return self._list_of_docs
+
+    def get_len_in_docs(self : DocumentBatchColumns) -> int:
+        return len(self._list_of_docs)
+
+    def get_len_in_sents(self : DocumentBatchColumns) -> np.ndarray:
+        return np.fromiter(
+            (doc.get_len_in_sents() for doc in self._list_of_docs),
+            dtype = np.int64,
+            count = len(self._list_of_docs)
+        )
+
+    def get_len_in_words(self : DocumentBatchColumns) -> np.ndarray:
+        return np.fromiter(
+            (doc.get_len_in_words() for doc in self._list_of_docs),
+            dtype = np.int64,
+            count = len(self._list_of_docs)
+        )
+
+    def get_len_in_chars(self : DocumentBatchColumns) -> np.ndarray:
+        # the number of chars in the (possibly truncated) sents of each doc,
+        #     as reported in the output file; see get_doc_offsets for the
+        #     length of the full texts
+        return np.fromiter(
+            (doc.get_len_in_chars() for doc in self._list_of_docs),
+            dtype = np.int64,
+            count = len(self._list_of_docs)
+        )
+
+
+    #######################################################
+    #### full texts
+
+    def get_text(self : DocumentBatchColumns) -> str:
+        # the concatenated full texts of the docs
+        if self._text is None:
+            self._text = ''.join(
+                [doc.get_full_text() for doc in self._list_of_docs]
+            )
+        return self._text
+
+    def get_code_points(self : DocumentBatchColumns) -> np.ndarray:
+        if self._code_points is None:
+            self._code_points = \
+                DocumentBatchColumns._get_code_points(self.get_text())
+        return self._code_points
+
+    def get_doc_offsets(self : DocumentBatchColumns) -> np.ndarray:
+        # len_in_docs + 1 offsets into the code points
+        if self._doc_offsets is None:
+            self._doc_offsets = DocumentBatchColumns._get_offsets(
+                [len(doc.get_full_text()) for doc in self._list_of_docs]
+            )
+        return self._doc_offsets
+
+    def get_doc_index_per_char(self : DocumentBatchColumns) -> np.ndarray:
+        # the index of the doc of each code point, e.g. for np.bincount
+        return np.repeat(
+            np.arange(len(self._list_of_docs), dtype=np.int64),
+            np.diff(self.get_doc_offsets())
+        )
+
+
+    #######################################################
+    #### sents
+
+    def get_sents_text(self : DocumentBatchColumns) -> str:
+        # the concatenated sents of the docs
+        if self._sents_text is None:
+            self._sents_text = ''.join(
+                [
+                    sent
+                    for doc in self._list_of_docs
+                    for sent in doc.get_list_of_sents()
+                ]
+            )
+        return self._sents_text
+
+    def get_sent_code_points(self : DocumentBatchColumns) -> np.ndarray:
+        if self._sent_code_points is None:
+            self._sent_code_points = \
+                DocumentBatchColumns._get_code_points(self.get_sents_text())
+        return self._sent_code_points
+
+    def get_sent_offsets(self : DocumentBatchColumns) -> np.ndarray:
+        # (total len in sents) + 1 offsets into the sent code points
+        if self._sent_offsets is None:
+            self._sent_offsets = DocumentBatchColumns._get_offsets(
+                [
+                    len(sent)
+                    for doc in self._list_of_docs
+                    for sent in doc.get_list_of_sents()
+                ]
+            )
+        return self._sent_offsets
+
+    def get_doc_sent_offsets(self : DocumentBatchColumns) -> np.ndarray:
+        # len_in_docs + 1 offsets into the sents
+        if self._doc_sent_offsets is None:
+            self._doc_sent_offsets = DocumentBatchColumns._get_offsets(
+                [doc.get_len_in_sents() for doc in self._list_of_docs]
+            )
+        return self._doc_sent_offsets
+
+
+    #######################################################
+    #### predicted statistics from arrays
+
+    def set_predicted_statistics(
+        self           : DocumentBatchColumns,
+        name_to_values : dict
+    ) -> None:
+        # sets the predicted statistics of every doc from arrays (or lists)
+        #     whose first dimension runs over the docs: doc i gets
+        #     {name : values[i]} for every name, with numpy scalars and
+        #     arrays converted to json-serializable python values
+        if Validation.boundary:
+            assert isinstance(name_to_values, dict)
+            for name, values in name_to_values.items():
+                assert isinstance(name, str)
+                assert len(values) == len(self._list_of_docs), \
+                    'the values of {0} have length {1} but there are {2} docs' \
+                    .format(
+                        name,
+                        len(values),
+                        len(self._list_of_docs)
+                    )
+
+        name_to_list = {
+            name : (
+                values.tolist() if isinstance(values, np.ndarray)
+                else [
+                    value.tolist() if isinstance(value, (np.ndarray, np.generic))
+                    else value
+                    for value in values
+                ]
+            )
+            for name, values in name_to_values.items()
+        }
+        for doc_index, doc in enumerate(self._list_of_docs):
+            doc.set_predicted_statistics(
+                {
+                    name : values[doc_index]
+                    for name, values in name_to_list.items()
+                }
+            )
@@ -2,16 +2,34 @@ from __future__ import annotations
 from logging import Logger
 from textwrap import dedent
 import datetime
+import signal
+import threading
 
 from .document import Document
 from .document_batch import DocumentBatch
 from .document_batch_monitor import DocumentBatchMonitor
+from .document_batch_size_controller import DocumentBatchSizeController
 from ..io.input_file import InputFile
 from ..io.output_file import OutputFile
+from ..io.quarantine import Quarantine
+from ..io.streaming_input_file import StreamingInputFile
+from ..io.result_cache import ResultCache
+from ..io.segmented_output_file import SegmentedOutputFile
 
 
 class DocumentBatchIterator:
     
+    # exit code for a run that stopped early, at a doc batch boundary, because
+    #     its time budget was (about to be) exhausted or it received SIGTERM or
+    #     SIGUSR1; the run can be resumed right away (EX_TEMPFAIL in sysexits.h)
+    EXIT_CODE_RESUMABLE = 75
+    
+    # the predicted duration of the next doc batch is multiplied by this factor
+    #     before it is compared with the remaining time budget
+    _TIME_BUDGET_SAFETY_FACTOR = 1.2
+    
+    _GRACEFUL_STOP_SIGNALS = [signal.SIGTERM, signal.SIGUSR1]
+    
     def __iter__(
         self : DocumentBatchIterator
     ) -> DocumentBatchIterator:
@@ -25,50 +43,299 @@ class DocumentBatchIterator:
         
         assert isinstance(self._doc_batch_size, int)
         assert 0 < self._doc_batch_size
-        assert isinstance(self._input_file, InputFile)
-        assert isinstance(self._output_file, OutputFile)
+        assert isinstance(self._input_file, (InputFile, StreamingInputFile))
+        assert isinstance(self._output_file, (OutputFile, SegmentedOutputFile))
         assert isinstance(self._monitor, DocumentBatchMonitor)
-        
-        
+
+        if self._finalized:
+            raise StopIteration
+
+        if (
+            not self.is_look_ahead_allowed()
+            and self._last_doc_batch is not None
+        ):
+            assert self._last_doc_batch.is_done(), \
+                'with a quarantine or graceful_stop, every doc batch must ' \
+                'be written before the next doc batch is requested'
+
+        # adjust the doc batch size once per doc batch reported to the monitor
+        if (
+            self._doc_batch_size_controller is not None
+            and self._monitor.get_current_doc_batch_index()
+                != self._doc_batch_size_controlled_at_index
+        ):
+            self._doc_batch_size = \
+                self._doc_batch_size_controller.get_next_doc_batch_size(
+                    current = self._doc_batch_size,
+                    monitor = self._monitor
+                )
+            self._doc_batch_size_controlled_at_index = \
+                self._monitor.get_current_doc_batch_index()
+
+        if self._graceful_stop and self._should_stop():
+            self._stop()
+            raise StopIteration
+
         doc_batch = DocumentBatch(
-            monitor     = self._monitor,
-            output_file = self._output_file
+            monitor      = self._monitor,
+            output_file  = self._output_file,
+            result_cache = self._result_cache
         )
         
-        for doc_batch_index in range(self._doc_batch_size):
+        doc_batch_size = self._doc_batch_size
+        is_retry       = False
+        
+        while (
+            doc_batch.get_len_in_docs() < doc_batch_size
+            and (
+                # a stream hands out a partial doc batch rather than
+                #     wait for longer than its max_wait_in_secs
+                0 == doc_batch.get_len_in_docs()
+                or not self._is_streaming
+                or self._input_file.is_next_input_doc_ready()
+            )
+            and self._input_file.has_next_input_doc()
+        ):
 
-            if self._input_file.has_next_input_doc():
+            input_doc = self._input_file.get_next_input_doc()
 
-                input_doc = self._input_file.get_next_input_doc()
+            assert isinstance(input_doc, Document)
 
-                assert isinstance(input_doc, Document)
+            if (
+                self._quarantine is not None
+                and 0 == doc_batch.get_len_in_docs()
+            ):
+                doc_batch_size, is_retry = \
+                    self._get_doc_batch_size_after_crash(input_doc, doc_batch_size)
+                if 0 == doc_batch_size:
+                    # the doc batch begins with the next doc instead
+                    self._quarantine_crashed_doc(input_doc)
+                    doc_batch_size = self._doc_batch_size
+                    is_retry       = False
+                    continue
+
+            doc_batch.append_doc(input_doc)
 
-                doc_batch.append_doc(input_doc)
+        if 0 < doc_batch.get_len_in_docs():
 
-            else:
+            if self._quarantine is not None:
+                self._quarantine.set_in_flight(
+                    doc_batch.get_list_of_docs()[0].get_id(),
+                    doc_batch.get_len_in_docs(),
+                    is_retry
+                )
 
-                break
+            doc_batch.set_fetched()
 
-        if 0 < doc_batch.get_len_in_docs():
+            self._last_doc_batch = doc_batch
 
             return doc_batch
 
         else:
 
+            if self._graceful_stop:
+                self._restore_signal_handlers()
+
+            if self._quarantine is not None:
+                self._quarantine.clear_in_flight()
+
+            self._monitor.log_final_progress_summary()
+
             raise StopIteration
     
     
+    def _get_doc_batch_size_after_crash(
+        self           : DocumentBatchIterator,
+        first_doc      : Document,
+        doc_batch_size : int
+    ) -> tuple[int, bool]:
+        
+        # returns the size of the doc batch that begins with first_doc, or 0
+        #     if first_doc is to be quarantined, and whether the doc batch is
+        #     handed out again after the process died on it
+        
+        crashed_in_flight = self._quarantine.get_crashed_in_flight()
+        
+        if (
+            crashed_in_flight is not None
+            and first_doc.get_id() == crashed_in_flight[0]
+        ):
+            crashed_doc_id, crashed_len_in_docs, crashed_is_retry = crashed_in_flight
+            
+            if 1 == crashed_len_in_docs and crashed_is_retry:
+                self._n_docs_left_to_retry = 0
+                return 0, False
+            
+            self._n_docs_left_to_retry = crashed_len_in_docs
+            doc_batch_size = max(1, crashed_len_in_docs // 2)
+            
+            self._logger.warning(
+                dedent(
+                    '''\
+                    document.document_batch_iterator:
+                    DocumentBatchIterator.__next__:
+                    the previous run died while processing the doc batch
+                    of {0} docs beginning with doc {1}:
+                    retrying it in doc batches of at most {2} docs'''
+                ).replace('\n', ' ').format(
+                    crashed_len_in_docs,
+                    crashed_doc_id,
+                    doc_batch_size
+                )
+            )
+        
+        if 0 < self._n_docs_left_to_retry:
+            doc_batch_size = min(doc_batch_size, self._n_docs_left_to_retry)
+            self._n_docs_left_to_retry -= doc_batch_size
+            return doc_batch_size, True
+        
+        return doc_batch_size, False
+    
+    
+    def _quarantine_crashed_doc(
+        self      : DocumentBatchIterator,
+        input_doc : Document
+    ) -> None:
+        
+        # the process died on this doc alone, twice: write it with the
+        #     placeholder result as a doc batch of its own, bypassing the
+        #     result cache
+        
+        doc_batch = DocumentBatch(
+            monitor     = self._monitor,
+            output_file = self._output_file
+        )
+        doc_batch.append_doc(input_doc)
+        input_doc.set_predicted_statistics(
+            self._quarantine.get_placeholder_predicted_statistics()
+        )
+        self._quarantine.add(input_doc, 'the process died while processing the doc')
+        now = datetime.datetime.now(datetime.timezone.utc)
+        doc_batch.set_begin_datetime(now)
+        doc_batch.set_end_datetime(now)
+        doc_batch.write_to_disk()
+    
+    
+    def _handle_stop_signal(
+        self          : DocumentBatchIterator,
+        signal_number : int,
+        frame
+    ) -> None:
+        
+        # only record the request; the doc batch in progress is completed
+        #     and the iterator stops before the next one
+        self._stop_signal_number = signal_number
+    
+    
+    def _restore_signal_handlers(self : DocumentBatchIterator) -> None:
+        
+        for signal_number, handler in self._previous_signal_handlers.items():
+            signal.signal(signal_number, handler)
+        self._previous_signal_handlers = dict()
+    
+    
+    def _should_stop(self : DocumentBatchIterator) -> bool:
+        
+        if self._stop_signal_number is not None:
+            self._stop_reason = 'received signal {0}'.format(
+                signal.Signals(self._stop_signal_number).name
+            )
+            return True
+        
+        if not self._input_file.has_next_input_doc():
+            return False
+        
+        predicted_batch_n_secs = \
+            self._monitor.get_predicted_batch_n_secs(self._doc_batch_size)
+        remaining_n_secs = self._monitor.get_remaining_time_budget_in_secs()
+        
+        if (
+            predicted_batch_n_secs is not None
+            and remaining_n_secs
+                < predicted_batch_n_secs * DocumentBatchIterator._TIME_BUDGET_SAFETY_FACTOR
+        ):
+            self._stop_reason = dedent(
+                '''\
+                the next doc batch is predicted to take {0:.1f} seconds
+                but only {1:.1f} seconds of the time budget remain'''
+            ).replace('\n', ' ').format(
+                predicted_batch_n_secs,
+                remaining_n_secs
+            )
+            return True
+        
+        return False
+    
+    
+    def _stop(self : DocumentBatchIterator) -> None:
+        
+        # every doc batch handed out so far has been written by the user,
+        #     so the output file ends at a doc batch boundary
+        self._output_file.flush(sync=True)
+        self._restore_signal_handlers()
+        if self._quarantine is not None:
+            self._quarantine.clear_in_flight()
+        self._stopped_early = True
+        
+        self._monitor.log_final_progress_summary()
+        
+        self._logger.warning(
+            dedent(
+                '''\
+                document.document_batch_iterator:
+                DocumentBatchIterator.__next__:
+                stopping early: {0}:
+                the output file ends with a complete doc batch
+                and the run can be resumed: exit code {1}'''
+            ).replace('\n', ' ').format(
+                self._stop_reason,
+                DocumentBatchIterator.EXIT_CODE_RESUMABLE
+            )
+        )
+    
+    
+    def is_look_ahead_allowed(self : DocumentBatchIterator) -> bool:
+        
+        # whether the next doc batch may be requested before the doc batch
+        #     handed out last is written: not with a quarantine, whose
+        #     in-flight record, nor with graceful_stop, whose stop at a doc
+        #     batch boundary, only covers the doc batch handed out last
+        return self._quarantine is None and not self._graceful_stop
+    
+    
+    def log_final_progress_summary(self : DocumentBatchIterator) -> None:
+        
+        # for a wrapper that writes doc batches after this iterator is
+        #     exhausted (see SentenceBatchIterator)
+        self._monitor.log_final_progress_summary()
+    
+    
+    def is_stopped_early(self : DocumentBatchIterator) -> bool:
+        
+        return self._stopped_early
+    
+    
+    def get_exit_code(self : DocumentBatchIterator) -> int:
+        
+        # 0 if all docs were processed (or the iteration has not ended yet)
+        return DocumentBatchIterator.EXIT_CODE_RESUMABLE if self._stopped_early else 0
+    
+    
     def __init__(
         self           : DocumentBatchIterator,
         logger         : Logger               = None, # required
-        input_file     : InputFile            = None, # required
-        output_file    : OutputFile           = None, # required
+        input_file     : InputFile | StreamingInputFile = None, # required
+        output_file    : OutputFile | SegmentedOutputFile = None, # required
         monitor        : DocumentBatchMonitor = None, # optional
-        doc_batch_size : int                  = 8     # optional
+        doc_batch_size : int                  = 8,    # optional
+        result_cache   : ResultCache          = None, # optional
+        doc_batch_size_controller : DocumentBatchSizeController = None, # optional
+        graceful_stop  : bool                 = False, # optional
+        quarantine     : Quarantine           = None  # optional
     ) -> DocumentBatchIterator:
         assert isinstance(logger, Logger) 
-        assert isinstance(input_file, InputFile)
-        assert isinstance(output_file, OutputFile)
+        assert isinstance(input_file, (InputFile, StreamingInputFile))
+        assert isinstance(output_file, (OutputFile, SegmentedOutputFile))
         if monitor is None:
             monitor = DocumentBatchMonitor(
                 logger     = logger,
@@ -78,28 +345,157 @@ class DocumentBatchIterator:
             assert isinstance(monitor, DocumentBatchMonitor)
         assert isinstance(doc_batch_size, int)
         assert 0 < doc_batch_size
+        assert (
+            isinstance(result_cache, ResultCache)
+            or result_cache is None
+        )
+        assert (
+            isinstance(doc_batch_size_controller, DocumentBatchSizeController)
+            or doc_batch_size_controller is None
+        )
+        assert isinstance(graceful_stop, bool)
+        assert (
+            isinstance(quarantine, Quarantine)
+            or quarantine is None
+        )
         
         self._logger         = logger         ; del logger
         self._input_file     = input_file     ; del input_file
         self._output_file    = output_file    ; del output_file
         self._monitor        = monitor        ; del monitor
         self._doc_batch_size = doc_batch_size ; del doc_batch_size
+        self._result_cache   = result_cache   ; del result_cache
         
+        # with a controller, doc_batch_size is only the size of the first
+        #     doc batch
+        self._doc_batch_size_controller = doc_batch_size_controller
+        del doc_batch_size_controller
+        self._doc_batch_size_controlled_at_index = None
         
+        # with graceful_stop, stop at a doc batch boundary when the next doc
+        #     batch would not finish within the monitor's time budget or on
+        #     SIGTERM/SIGUSR1 (see EXIT_CODE_RESUMABLE)
+        self._graceful_stop            = graceful_stop ; del graceful_stop
+        self._stop_signal_number       = None
+        self._stop_reason              = None
+        self._stopped_early            = False
+        self._previous_signal_handlers = dict()
+        if (
+            self._graceful_stop
+            and threading.current_thread() is threading.main_thread()
+        ):
+            for signal_number in DocumentBatchIterator._GRACEFUL_STOP_SIGNALS:
+                self._previous_signal_handlers[signal_number] = signal.signal(
+                    signal_number,
+                    self._handle_stop_signal
+                )
+        
+        # with a quarantine, a doc batch on which the process died is handed
+        #     out again, when the run is restarted, in halves, until the doc
+        #     the process dies on is isolated and quarantined (see Quarantine)
+        self._quarantine           = quarantine ; del quarantine
+        self._n_docs_left_to_retry = 0
+        
+        # the doc batch handed out last (see is_look_ahead_allowed)
+        self._last_doc_batch = None
+        
+        # a stream is neither rewound nor compared doc by doc with the output
+        #     file on resume: the docs already in the output file are skipped
+        #     when they are read (see StreamingInputFile)
+        self._is_streaming = isinstance(self._input_file, StreamingInputFile)
+        if (
+            self._is_streaming
+            and not self._output_file.is_bounded_memory()
+        ):
+            self._logger.warning(
+                dedent(
+                    '''\
+                    document.document_batch_iterator:
+                    DocumentBatchIterator.__init__:
+                    the input is a stream but the output file does not
+                    have bounded_memory: the memory use grows with
+                    the number of docs processed'''
+                ).replace('\n', ' ')
+            )
+
+
+        # A finalized output file that covers the whole input file needs no
+        # replay: its docs are loaded lazily and would otherwise all be decoded
+        # below just to confirm that there is nothing left to process
+        # (for a stream, a finalized output file means that the stream has
+        #     already ended once, and the stream is not read again)
+        self._finalized = (
+            self._output_file.is_finalized()
+            and (
+                self._is_streaming
+                or self._output_file.get_file_len_in_docs()
+                    == self._input_file.get_file_len_in_docs()
+            )
+        )
+        if self._finalized:
+            self._logger.info(
+                dedent(
+                    '''\
+                    document.document_batch_iterator:
+                    DocumentBatchIterator.__init__:
+                    the output file is already finalized
+                    and contains all {0} docs of the input:
+                    there are no docs left to process'''
+                ).replace('\n', ' ').format(
+                    self._output_file.get_file_len_in_docs()
+                )
+            )
+            return
+
+
+        # the docs of the completed segments of a segmented output file are
+        #     skipped in the input rather than replayed: only the docs of
+        #     its current segment are (see SegmentedOutputFile)
+        first_doc_index = 0
+        if isinstance(self._output_file, SegmentedOutputFile):
+            first_doc_index = self._output_file.get_n_docs_in_completed_segments()
+        if 0 < first_doc_index:
+            if not self._is_streaming:
+                assert (
+                    self._output_file.get_output_doc_at_index(first_doc_index - 1).get_id()
+                    == self._input_file.get_input_doc_at_index(first_doc_index - 1).get_id()
+                )
+            self._input_file.skip_input_docs(first_doc_index)
+            self._monitor.post_bulk_update(
+                **self._output_file.get_completed_segments_totals()
+            )
+            self._logger.info(
+                dedent(
+                    '''\
+                    document.document_batch_iterator:
+                    DocumentBatchIterator.__init__:
+                    skipped the {0} docs of the completed segments
+                    of the output file'''
+                ).replace('\n', ' ').format(
+                    first_doc_index
+                )
+            )
+
         doc_batch = None
-        end_doc_batch_index = -1
+        end_doc_batch_index = first_doc_index - 1
+        committed_doc_id_hashes = []
         
-        doc_index = -1
-        for doc_index in range(self._output_file.get_file_len_in_docs()):
+        doc_index = first_doc_index - 1
+        for doc_index in range(first_doc_index, self._output_file.get_file_len_in_docs()):
             
             output_doc = self._output_file.get_output_doc_at_index(doc_index)
             assert isinstance(output_doc, Document)
             
-            assert self._input_file.has_next_input_doc()
-            input_doc = self._input_file.get_next_input_doc()
-            assert isinstance(input_doc, Document)
-            
-            assert output_doc.get_id() == input_doc.get_id()
+            if self._is_streaming:
+                committed_doc_id_hashes.append(
+                    StreamingInputFile.hash_doc_id(output_doc.get_id())
+                )
+            else:
+                assert self._input_file.has_next_input_doc()
+                input_doc = self._input_file.get_next_input_doc()
+                assert isinstance(input_doc, Document)
+                
+                assert output_doc.get_id() == input_doc.get_id()
             
             
             begin_datetime = output_doc.get_begin_doc_batch_datetime()
@@ -172,14 +568,15 @@ class DocumentBatchIterator:
                 )
             )
             
-            self._input_file.set_next_input_doc_index(end_doc_batch_index + 1)
+            if not self._is_streaming:
+                self._input_file.set_next_input_doc_index(end_doc_batch_index + 1)
             
         else: # The last doc in the output file does end a doc batch as expected
 
             assert doc_batch is None
 
-            if -1 < doc_index: # if the output file contains more than zero
-                               # document results
+            if first_doc_index <= doc_index: # if the output file contains more than zero
+                                             # document results to replay
                 assert isinstance(end_datetime, datetime.datetime)
 
             assert end_doc_batch_index == doc_index
@@ -187,7 +584,15 @@ class DocumentBatchIterator:
         
         self._output_file.delete_output_docs_after_index(end_doc_batch_index)
 
-        if (
+        if self._is_streaming:
+            # the docs after the last complete doc batch were deleted and
+            #     are processed again when they are read
+            self._input_file.skip_doc_id_hashes(
+                committed_doc_id_hashes[:end_doc_batch_index+1-first_doc_index]
+            )
+            del committed_doc_id_hashes
+            self._output_file.open_for_appending()
+        elif (
             self._output_file.get_file_len_in_docs()
             < self._input_file.get_file_len_in_docs()
         ):
@@ -1,165 +1,365 @@
 from __future__ import annotations
+import logging
 from logging import Logger
 from datetime import datetime
 from textwrap import dedent
 from time import sleep
 import math
+import time
+import json
+import os
+from collections import deque
+import heapq
 
 
+from .latency_histogram import LatencyHistogram
 from ..io.input_file import InputFile
+from ..io.streaming_input_file import StreamingInputFile
+from ..validation import Validation
+from ..resource_usage import ResourceUsage
 
 
 class DocumentBatchMonitor():
+    
+    _MIN_BATCH_N_SECS = 1e-6
+    
+    # stages of processing a doc batch: fetching the docs from the input
+    #     file, the user's processor, json serialization of the docs,
+    #     writing them to the output file, and this monitor's update
+    _STAGES = ['fetch', 'process', 'serialize', 'write', 'monitor']
+    
+    # per-doc latencies are bucketed by doc length in chars so that
+    #     superlinear scaling of the processor with doc length shows up
+    #     as latencies growing faster than the bucket bounds
+    _DOC_LEN_BUCKET_BOUNDS = [100, 1000, 10000, 100000]
+    
+    @staticmethod
+    def _get_doc_len_bucket_names() -> list[str]:
+        return [
+            'lt_{0}'.format(bound)
+            for bound in DocumentBatchMonitor._DOC_LEN_BUCKET_BOUNDS
+        ] + [
+            'ge_{0}'.format(DocumentBatchMonitor._DOC_LEN_BUCKET_BOUNDS[-1])
+        ]
+    
+    @staticmethod
+    def _get_doc_len_bucket_name(len_in_chars : int) -> str:
+        for bound in DocumentBatchMonitor._DOC_LEN_BUCKET_BOUNDS:
+            if len_in_chars < bound:
+                return 'lt_{0}'.format(bound)
+        return 'ge_{0}'.format(DocumentBatchMonitor._DOC_LEN_BUCKET_BOUNDS[-1])
 
     def __init__(
         self                                    : DocumentBatchMonitor,
         logger                                  : Logger               = None, # required
-        input_file                              : InputFile            = None, # required
-        time_budget_in_hours                    : int                  = 24    # optional
+        input_file                              : InputFile | StreamingInputFile = None, # required
+        time_budget_in_hours                    : int                  = 24,   # optional
+        metrics_jsonl_file_path                 : str                  = None, # optional
+        metrics_prom_file_path                  : str                  = None, # optional
+        log_every_n_batches                     : int                  = 1,    # optional
+        log_every_n_secs                        : float                = None, # optional
+        rate_window_n_batches                   : int                  = 16,   # optional
+        rate_ewma_alpha                         : float                = 0.2,  # optional
+        slow_doc_top_k                          : int                  = 5,    # optional
+        trace_memory_allocations                : bool                 = False # optional
     ) -> DocumentBatchMonitor:
-        assert isinstance(input_file, InputFile)
+        assert isinstance(input_file, (InputFile, StreamingInputFile))
         assert isinstance(logger, Logger)
         assert isinstance(time_budget_in_hours, int)
         assert 0 < time_budget_in_hours
+        assert (
+            isinstance(metrics_jsonl_file_path, str)
+            or metrics_jsonl_file_path is None
+        )
+        assert (
+            isinstance(metrics_prom_file_path, str)
+            or metrics_prom_file_path is None
+        )
+        assert isinstance(log_every_n_batches, int)
+        assert 0 < log_every_n_batches
+        assert (
+            isinstance(log_every_n_secs, (int, float))
+            or log_every_n_secs is None
+        )
+        assert isinstance(rate_window_n_batches, int)
+        assert 0 < rate_window_n_batches
+        assert isinstance(rate_ewma_alpha, float)
+        assert 0.0 < rate_ewma_alpha and rate_ewma_alpha <= 1.0
+        assert isinstance(slow_doc_top_k, int)
+        assert 0 <= slow_doc_top_k
+        assert isinstance(trace_memory_allocations, bool)
+        
+        self._input_file              = input_file
+        self._logger                  = logger
+        self._time_budget_in_hours    = time_budget_in_hours
+        self._metrics_jsonl_file_path = metrics_jsonl_file_path
+        self._metrics_prom_file_path  = metrics_prom_file_path
+        self._log_every_n_batches     = log_every_n_batches
+        self._log_every_n_secs        = log_every_n_secs
+        self._rate_ewma_alpha         = rate_ewma_alpha
+        self._slow_doc_top_k          = slow_doc_top_k
         
-        self._input_file           = input_file
-        self._logger               = logger
-        self._time_budget_in_hours = time_budget_in_hours
+        self._last_progress_summary_time = None
+        
+        # the values of the most recent doc batch for its progress summary,
+        #     which may be logged only when the iteration stops
+        self._last_progress_summary           = None
+        self._is_last_progress_summary_logged = False
+        
+        # the time budget applies to the current process, e.g. one batch
+        #     scheduler job, so it is measured from the creation of the monitor
+        self._begin_perf_counter = time.perf_counter()
         
         self._n_docs  = 0
         self._n_sents = 0
         self._n_words = 0
         self._n_chars = 0
-        self._n_secs  = 0
+        self._n_secs  = 0.0
         self._index   = 0
+        
+        # (n_docs, n_chars, n_secs) of the most recent doc batches, for the windowed
+        #     char rate, and exponentially weighted n_chars and n_secs, for
+        #     the ewma char rate; both react to changes in throughput,
+        #     unlike the average over the entire run
+        self._rate_window      = deque(maxlen=rate_window_n_batches)
+        self._ewma_n_chars     = None
+        self._ewma_n_secs      = None
+        
+        self._stage_n_secs = {stage : 0.0 for stage in DocumentBatchMonitor._STAGES}
+        # the monitor stage of a doc batch ends after its metrics are
+        #     reported, so the duration of the previous update is reported
+        self._last_monitor_n_secs = 0.0
+        
+        # per-doc latencies reported by DocumentBatch.time_doc: histograms
+        #     since doc processing began, and a min-heap of the
+        #     (n_secs, doc id, len_in_chars) of the slowest docs since
+        #     the last progress summary
+        self._doc_len_bucket_to_latency_histogram = dict()
+        self._slowest_docs = []
+        
+        # memory and cpu usage at the previous monitor update; the cpu time
+        #     between updates relative to the wall time tells cpu-bound
+        #     from i/o-bound runs
+        if trace_memory_allocations:
+            ResourceUsage.start_tracing_allocations()
+        self._last_resource_snapshot = ResourceUsage.get_snapshot()
+        
+        self._n_cache_lookups = 0
+        self._n_cache_hits    = 0
 
 
     def get_current_doc_batch_index(
         self : DocumentBatchMonitor
     ) -> int:
 
-        assert isinstance(self._index, int)
-        assert 0 <= self._index
+        if Validation.full:
+            assert isinstance(self._index, int)
+            assert 0 <= self._index
 
         return self._index
 
 
-    def post_batch_update(
-        self          : DocumentBatchMonitor,
-        batch_n_docs  : int,
-        batch_n_sents : int,
-        batch_n_words : int,
-        batch_n_chars : int,
-        batch_n_secs  : int
-    ) -> None:
-        
-        METHOD_NAME = 'document.document_batch_monitor: ' \
-            + 'DocumentBatchMonitor.post_batch_update:'
-        
-        ########################################################################
-        #### validate method invocation preconditions
-        
-        assert isinstance(self._input_file, InputFile)
-        assert isinstance(self._logger, Logger)
-        assert isinstance(self._time_budget_in_hours, int)
-        assert 0 < self._time_budget_in_hours
-        
-        assert isinstance(self._n_docs, int)
-        assert 0 <= self._n_docs
-        assert isinstance(self._n_sents, int)
-        assert 0 <= self._n_sents
-        assert isinstance(self._n_words, int)
-        assert 0 <= self._n_words
-        assert isinstance(self._n_chars, int)
-        assert 0 <= self._n_chars
-        assert isinstance(self._n_secs, int)
-        assert 0 <= self._n_secs
-        assert isinstance(self._index, int)
-        assert 0 <= self._index
-        
-        
-        ########################################################################
-        #### validate method invocation arguments
-
-        assert isinstance(batch_n_docs, int)
-        assert 0 < batch_n_docs
-        assert isinstance(batch_n_sents, int)
-        assert 0 < batch_n_sents
-        assert isinstance(batch_n_words, int)
-        assert 0 < batch_n_words
-        assert isinstance(batch_n_chars, int)
-        assert 0 < batch_n_chars
-        assert isinstance(batch_n_secs, int)
-        assert 0 < batch_n_secs
+    def _is_progress_summary_due(
+        self : DocumentBatchMonitor
+    ) -> bool:
+        # The progress summary is logged for the first doc batch, for the
+        # last one by log_final_progress_summary, and in between for every
+        # log_every_n_batches-th doc batch or, if log_every_n_secs is set,
+        # whenever at least that many seconds have passed since the last
+        # summary
         
+        now = time.monotonic()
         
+        if self._last_progress_summary_time is None:
+            # the first doc batch, or the first one after post_bulk_update
+            is_due = True
+        elif self._log_every_n_secs is not None:
+            is_due = \
+                self._log_every_n_secs <= now - self._last_progress_summary_time
+        else:
+            is_due = 0 == self._index % self._log_every_n_batches
         
-        #######################################################################
-        #### update accumulators
+        if is_due:
+            self._last_progress_summary_time = now
         
-        self._n_docs  += batch_n_docs
-        self._n_sents += batch_n_sents
-        self._n_words += batch_n_words
-        self._n_chars += batch_n_chars
-        self._n_secs  += batch_n_secs
-        
-        
-
-        #######################################################################
-        #### calcuate progress statistics
-
-        total_hours   = math.floor(self._n_secs / 60 / 60)
-        total_minutes = math.floor(self._n_secs / 60) - (total_hours * 60)
-        total_seconds = self._n_secs - (total_hours * 60 * 60) - (total_minutes * 60)
+        return is_due
     
-        batch_minutes = math.floor(batch_n_secs / 60)
-        batch_seconds = batch_n_secs - (batch_minutes * 60)
     
-        total_doc_rate  = self._n_docs  / self._n_secs
-        total_sent_rate = self._n_sents / self._n_secs
-        total_word_rate = self._n_words / self._n_secs
-        total_char_rate = self._n_chars / self._n_secs
-        
-        batch_doc_rate  = batch_n_docs  / batch_n_secs
-        batch_sent_rate = batch_n_sents / batch_n_secs
-        batch_word_rate = batch_n_words / batch_n_secs
-        batch_char_rate = batch_n_chars / batch_n_secs
-        
-        
+    def _write_metrics_record(
+        self   : DocumentBatchMonitor,
+        record : dict
+    ) -> None:
         
+        # one json line per doc batch
+        if self._metrics_jsonl_file_path is not None:
+            with open(self._metrics_jsonl_file_path, 'a') as metrics_file:
+                metrics_file.write(json.dumps(record) + '\n')
         
-        time_budget_in_seconds = self._time_budget_in_hours * 60 * 60
+        # prometheus text format, as read by the node exporter textfile
+        #     collector; the file is replaced atomically so that a scrape
+        #     never sees a partially written file
+        if self._metrics_prom_file_path is not None:
+            lines = []
+            for key, value in record.items():
+                if value is None:
+                    continue
+                metric_name = 'document_batcher_' + key
+                lines.append('# TYPE {0} gauge'.format(metric_name))
+                lines.append('{0} {1}'.format(metric_name, float(value)))
+            tmp_file_path = self._metrics_prom_file_path + '.tmp'
+            with open(tmp_file_path, 'w') as metrics_file:
+                metrics_file.write('\n'.join(lines) + '\n')
+            os.replace(tmp_file_path, self._metrics_prom_file_path)
+    
+    
+    def _get_doc_latency_metrics(
+        self : DocumentBatchMonitor
+    ) -> dict:
         
-        fraction_of_time_budget_consumed = self._n_secs / time_budget_in_seconds
+        doc_latency_metrics = dict()
         
+        for doc_len_bucket_name in DocumentBatchMonitor._get_doc_len_bucket_names():
+            if doc_len_bucket_name not in self._doc_len_bucket_to_latency_histogram:
+                continue
+            latency_histogram = \
+                self._doc_len_bucket_to_latency_histogram[doc_len_bucket_name]
+            prefix = 'doc_latency_chars_{0}'.format(doc_len_bucket_name)
+            doc_latency_metrics[prefix + '_count'] = latency_histogram.get_count()
+            doc_latency_metrics[prefix + '_p50']   = latency_histogram.get_quantile(0.50)
+            doc_latency_metrics[prefix + '_p90']   = latency_histogram.get_quantile(0.90)
+            doc_latency_metrics[prefix + '_p99']   = latency_histogram.get_quantile(0.99)
+            doc_latency_metrics[prefix + '_max']   = latency_histogram.get_max()
         
-        assert isinstance(self._input_file.get_file_len_in_chars(), int)
-        assert 0 < self._input_file.get_file_len_in_chars()
+        return doc_latency_metrics
+    
+    
+    def _log_doc_latencies(
+        self        : DocumentBatchMonitor,
+        METHOD_NAME : str
+    ) -> None:
         
-        num_chars_remaining = self._input_file.get_file_len_in_chars() - self._n_chars
+        for doc_len_bucket_name in DocumentBatchMonitor._get_doc_len_bucket_names():
+            if doc_len_bucket_name not in self._doc_len_bucket_to_latency_histogram:
+                continue
+            latency_histogram = \
+                self._doc_len_bucket_to_latency_histogram[doc_len_bucket_name]
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    since doc processing began,
+                    the per-doc latency for the {1} docs of length {2} chars
+                    is p50 {3:.4f}s, p90 {4:.4f}s, p99 {5:.4f}s, max {6:.4f}s'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    latency_histogram.get_count(),
+                    doc_len_bucket_name.replace('lt_', 'under ').replace('ge_', 'at least '),
+                    latency_histogram.get_quantile(0.50),
+                    latency_histogram.get_quantile(0.90),
+                    latency_histogram.get_quantile(0.99),
+                    latency_histogram.get_max()
+                )
+            )
         
-        estimated_time_remaining_in_seconds = num_chars_remaining / total_char_rate
+        if 0 < len(self._slowest_docs):
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    the slowest docs since the last progress summary
+                    (doc id: seconds, length in chars) are {1}'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    ', '.join(
+                        '{0}: {1:.4f}s, {2} chars'.format(doc_id, n_secs, len_in_chars)
+                        for n_secs, doc_id, len_in_chars
+                        in sorted(self._slowest_docs, reverse=True)
+                    )
+                )
+            )
+            self._slowest_docs = []
+    
+    
+    def get_remaining_time_budget_in_secs(
+        self : DocumentBatchMonitor
+    ) -> float:
         
-        estimated_remaining_hours   = math.floor(estimated_time_remaining_in_seconds / 60 / 60)
-        estimated_remaining_minutes = math.floor(estimated_time_remaining_in_seconds / 60) - (estimated_remaining_hours * 60)
-        estimated_remaining_seconds = estimated_time_remaining_in_seconds - (estimated_remaining_hours * 60 * 60) - (estimated_remaining_minutes * 60)
+        return (
+            self._time_budget_in_hours * 60 * 60
+            - (time.perf_counter() - self._begin_perf_counter)
+        )
+    
+    
+    def get_predicted_batch_n_secs(
+        self   : DocumentBatchMonitor,
+        n_docs : int
+    ) -> float | None:
         
-        estimated_total_hours   = total_hours   + estimated_remaining_hours
-        estimated_total_minutes = total_minutes + estimated_remaining_minutes
-        estimated_total_seconds = total_seconds + estimated_remaining_seconds
+        # predicted from the secs per doc of the most recent doc batches;
+        #     None if no doc batch has been reported yet
+        if 0 == len(self._rate_window):
+            return None
+        return n_docs * (
+            sum(n_secs for _, _, n_secs in self._rate_window)
+            / sum(n_docs for n_docs, _, _ in self._rate_window)
+        )
+    
+    
+    def get_recent_batch_stats(
+        self : DocumentBatchMonitor
+    ) -> list[tuple[int, int, float]]:
         
-        assert isinstance(self._time_budget_in_hours, int)
-        assert 0 < self._time_budget_in_hours
-        assert 'time_budget_in_seconds' in locals()
-         
-        estimated_total_time_in_seconds = self._n_secs + estimated_time_remaining_in_seconds
+        # (n_docs, n_chars, n_secs) of the most recent doc batches,
+        #     oldest first
+        return list(self._rate_window)
+    
     
-        estimated_fraction_of_time_budget_needed = estimated_total_time_in_seconds / time_budget_in_seconds
+    def _log_progress_summary(self : DocumentBatchMonitor) -> None:
         
+        # the progress summary of the most recent doc batch, from the
+        #     values that post_batch_update computed for it; the estimates
+        #     are None if the length of the input is unknown
         
+        summary = self._last_progress_summary
         
-        ########################################################################
-        #### log progress statistics
+        doc_batch_index                          = summary['doc_batch_index']
+        METHOD_NAME                              = summary['METHOD_NAME']
+        batch_minutes                            = summary['batch_minutes']
+        batch_seconds                            = summary['batch_seconds']
+        batch_n_docs                             = summary['batch_n_docs']
+        batch_n_sents                            = summary['batch_n_sents']
+        batch_n_words                            = summary['batch_n_words']
+        batch_n_chars                            = summary['batch_n_chars']
+        batch_doc_rate                           = summary['batch_doc_rate']
+        batch_sent_rate                          = summary['batch_sent_rate']
+        batch_word_rate                          = summary['batch_word_rate']
+        batch_char_rate                          = summary['batch_char_rate']
+        total_hours                              = summary['total_hours']
+        total_minutes                            = summary['total_minutes']
+        total_seconds                            = summary['total_seconds']
+        fraction_of_time_budget_consumed         = summary['fraction_of_time_budget_consumed']
+        is_input_len_known                       = summary['is_input_len_known']
+        total_doc_rate                           = summary['total_doc_rate']
+        total_sent_rate                          = summary['total_sent_rate']
+        total_word_rate                          = summary['total_word_rate']
+        total_char_rate                          = summary['total_char_rate']
+        window_char_rate                         = summary['window_char_rate']
+        ewma_char_rate                           = summary['ewma_char_rate']
+        ewma_estimated_time_remaining_in_seconds = summary['ewma_estimated_time_remaining_in_seconds']
+        estimated_remaining_hours                = summary['estimated_remaining_hours']
+        estimated_remaining_minutes              = summary['estimated_remaining_minutes']
+        estimated_remaining_seconds              = summary['estimated_remaining_seconds']
+        estimated_total_hours                    = summary['estimated_total_hours']
+        estimated_total_minutes                  = summary['estimated_total_minutes']
+        estimated_total_seconds                  = summary['estimated_total_seconds']
+        estimated_fraction_of_time_budget_needed = summary['estimated_fraction_of_time_budget_needed']
+        batch_stage_n_secs                       = summary['batch_stage_n_secs']
+        resource_snapshot                        = summary['resource_snapshot']
+        batch_user_cpu_secs                      = summary['batch_user_cpu_secs']
+        batch_system_cpu_secs                    = summary['batch_system_cpu_secs']
+        batch_cpu_utilization                    = summary['batch_cpu_utilization']
+        batch_n_cache_hits                       = summary['batch_n_cache_hits']
+        batch_n_cache_lookups                    = summary['batch_n_cache_lookups']
         
         self._logger.info(
             dedent(
@@ -168,14 +368,14 @@ class DocumentBatchMonitor():
                 doc processing progress information follows for doc batch index {1}'''
             ).replace('\n', ' ').format(
                 METHOD_NAME,
-                self._index
+                doc_batch_index
             )
         )
         self._logger.info(
             dedent(
                 '''\
                 {0}
-                the last doc batch took {1} minutes {2} seconds'''
+                the last doc batch took {1} minutes {2:.3f} seconds'''
             ).replace('\n', ' ').format(
                 METHOD_NAME,
                 batch_minutes,
@@ -242,12 +442,12 @@ class DocumentBatchMonitor():
                 batch_char_rate
             )
         )
-    
+
         self._logger.info(
             dedent(
                 '''\
                 {0}
-                since doc processing began, {1} hours {2} minutes {3} seconds
+                since doc processing began, {1} hours {2} minutes {3:.3f} seconds
                 have elapsed'''
             ).replace('\n', ' ').format(
                 METHOD_NAME,
@@ -257,7 +457,6 @@ class DocumentBatchMonitor():
             )
         )
 
-        assert 'fraction_of_time_budget_consumed' in locals()
         self._logger.info(
             dedent(
                 '''\
@@ -271,59 +470,76 @@ class DocumentBatchMonitor():
                 self._time_budget_in_hours
             )
         )
-    
-        self._logger.info(
-            dedent(
-                '''\
-                {0}
-                since doc processing began,
-                {1} (of {2}) docs  have been processed: {3}'''
-            ).replace('\n', ' ').format(
-                METHOD_NAME,
-                self._n_docs,
-                self._input_file.get_file_len_in_docs(),
-                self._n_docs / self._input_file.get_file_len_in_docs()
+
+        if is_input_len_known:
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    since doc processing began,
+                    {1} (of {2}) docs  have been processed: {3}'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    self._n_docs,
+                    self._input_file.get_file_len_in_docs(),
+                    self._n_docs / self._input_file.get_file_len_in_docs()
+                )
             )
-        )
-        self._logger.info(
-            dedent(
-                '''\
-                {0}
-                since doc processing began,
-                {1} (of {2}) sents have been processed: {3}'''
-            ).replace('\n', ' ').format(
-                METHOD_NAME,
-                self._n_sents,
-                self._input_file.get_file_len_in_sents(),
-                self._n_sents / self._input_file.get_file_len_in_sents()
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    since doc processing began,
+                    {1} (of {2}) sents have been processed: {3}'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    self._n_sents,
+                    self._input_file.get_file_len_in_sents(),
+                    self._n_sents / self._input_file.get_file_len_in_sents()
+                )
             )
-        )
-        self._logger.info(
-            dedent(
-                '''\
-                {0}
-                since doc processing began,
-                {1} (of {2}) words have been processed: {3}'''
-            ).replace('\n', ' ').format(
-                METHOD_NAME,
-                self._n_words,
-                self._input_file.get_file_len_in_words(),
-                self._n_words / self._input_file.get_file_len_in_words()
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    since doc processing began,
+                    {1} (of {2}) words have been processed: {3}'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    self._n_words,
+                    self._input_file.get_file_len_in_words(),
+                    self._n_words / self._input_file.get_file_len_in_words()
+                )
             )
-        )
-        self._logger.info(
-            dedent(
-                '''\
-                {0}
-                since doc processing began,
-                {1} (of {2}) chars have been processed: {3}'''
-            ).replace('\n', ' ').format(
-                METHOD_NAME,
-                self._n_chars,
-                self._input_file.get_file_len_in_chars(),
-                self._n_chars / self._input_file.get_file_len_in_chars()
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    since doc processing began,
+                    {1} (of {2}) chars have been processed: {3}'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    self._n_chars,
+                    self._input_file.get_file_len_in_chars(),
+                    self._n_chars / self._input_file.get_file_len_in_chars()
+                )
+            )
+        else:
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    since doc processing began,
+                    {1} docs containing {2} sents, {3} words, and {4} chars
+                    have been processed from the input stream'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    self._n_docs,
+                    self._n_sents,
+                    self._n_words,
+                    self._n_chars
+                )
             )
-        )
 
         self._logger.info(
             dedent(
@@ -369,64 +585,547 @@ class DocumentBatchMonitor():
                 total_char_rate
             )
         )
-        
-        assert 'estimated_remaining_hours'   in locals()
-        assert 'estimated_remaining_minutes' in locals()
-        assert 'estimated_remaining_seconds' in locals()
-    
+        if is_input_len_known:
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    over the last {1} doc batches,
+                    the char parsing rate is {2:.4f} char/s,
+                    and its exponentially weighted moving average is {3:.4f} char/s,
+                    at which rate {4:.0f} seconds remain'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    len(self._rate_window),
+                    window_char_rate,
+                    ewma_char_rate,
+                    ewma_estimated_time_remaining_in_seconds
+                )
+            )
+
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    at the char parsing rate over the last doc batches,
+                    {1} hours {2} minutes {3} seconds
+                    remain until all the docs have been processed'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    estimated_remaining_hours,
+                    estimated_remaining_minutes,
+                    math.ceil(estimated_remaining_seconds)
+                )
+            )
+
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    at the char parsing rate over the last doc batches,
+                    {1} hours {2} minutes {3} seconds
+                    will be the total time used to process
+                    all the docs'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    estimated_total_hours,
+                    estimated_total_minutes,
+                    math.ceil(estimated_total_seconds)
+                )
+            )
+
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    at the char parsing rate over the last doc batches,
+                    {1:.4} will be the total fraction
+                    of the time budget of {2} hours
+                    needed to process all the docs'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    estimated_fraction_of_time_budget_needed,
+                    self._time_budget_in_hours
+                )
+            )
+        else:
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    over the last {1} doc batches,
+                    the char parsing rate is {2:.4f} char/s,
+                    and its exponentially weighted moving average is {3:.4f} char/s'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    len(self._rate_window),
+                    window_char_rate,
+                    ewma_char_rate
+                )
+            )
+
+        if batch_stage_n_secs is not None:
+            total_stage_n_secs = sum(self._stage_n_secs.values())
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    time per stage in the last doc batch: {1};
+                    since doc processing began: {2}'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    ', '.join(
+                        '{0} {1:.3f}s'.format(stage, batch_stage_n_secs[stage])
+                        for stage in DocumentBatchMonitor._STAGES
+                    ),
+                    ', '.join(
+                        '{0} {1:.3f}s ({2:.1%})'.format(
+                            stage,
+                            self._stage_n_secs[stage],
+                            self._stage_n_secs[stage] / total_stage_n_secs
+                            if 0 < total_stage_n_secs else 0.0
+                        )
+                        for stage in DocumentBatchMonitor._STAGES
+                    )
+                )
+            )
+
+        self._log_doc_latencies(METHOD_NAME)
+
         self._logger.info(
             dedent(
                 '''\
                 {0}
-                at the current average char parsing rate,
-                {1} hours {2} minutes {3} seconds
-                remain until all the docs have been processed'''
+                rss is {1:.1f} MiB, peak rss is {2:.1f} MiB;
+                since the last doc batch, {3} user and {4} system cpu seconds
+                were used, a cpu utilization of {5}'''
             ).replace('\n', ' ').format(
                 METHOD_NAME,
-                estimated_remaining_hours,
-                estimated_remaining_minutes,
-                math.ceil(estimated_remaining_seconds)
+                ResourceUsage.to_mib(resource_snapshot['rss_bytes']),
+                ResourceUsage.to_mib(resource_snapshot['peak_rss_bytes']),
+                'n/a' if batch_user_cpu_secs is None else '{0:.3f}'.format(batch_user_cpu_secs),
+                'n/a' if batch_system_cpu_secs is None else '{0:.3f}'.format(batch_system_cpu_secs),
+                'n/a' if batch_cpu_utilization is None else '{0:.2f}'.format(batch_cpu_utilization)
             )
         )
+        for top_allocator in ResourceUsage.get_top_allocators():
+            self._logger.info(
+                '{0} top allocator: {1}'.format(
+                    METHOD_NAME,
+                    top_allocator
+                )
+            )
+
+        if 0 < self._n_cache_lookups:
+            self._logger.info(
+                dedent(
+                    '''\
+                    {0}
+                    result cache hit rate:
+                    {1} (of {2}) docs in the last doc batch,
+                    {3} (of {4}) docs since doc processing began: {5:.4f}'''
+                ).replace('\n', ' ').format(
+                    METHOD_NAME,
+                    batch_n_cache_hits,
+                    batch_n_cache_lookups,
+                    self._n_cache_hits,
+                    self._n_cache_lookups,
+                    self._n_cache_hits / self._n_cache_lookups
+                )
+            )
         
-        assert 'estimated_total_hours'   in locals()
-        assert 'estimated_total_minutes' in locals()
-        assert 'estimated_total_seconds' in locals()
+        self._is_last_progress_summary_logged = True
     
-        self._logger.info(
-            dedent(
-                '''\
-                {0}
-                at the current average char parsing rate,
-                {1} hours {2} minutes {3} seconds
-                will be the total time used to process
-                all the docs'''
-            ).replace('\n', ' ').format(
-                METHOD_NAME,
-                estimated_total_hours,
-                estimated_total_minutes,
-                math.ceil(estimated_total_seconds)
-            )
+    
+    def log_final_progress_summary(self : DocumentBatchMonitor) -> None:
+        
+        # called by the doc batch iterators when they stop, so that the
+        #     summary of the last doc batch is logged even if the throttling
+        #     skipped it; the length of the input cannot tell which doc batch
+        #     is the last one for a stream or for a range of a work queue
+        
+        if (
+            self._last_progress_summary is not None
+            and not self._is_last_progress_summary_logged
+            and self._logger.isEnabledFor(logging.INFO)
+        ):
+            self._log_progress_summary()
+    
+    
+    def post_bulk_update(
+        self          : DocumentBatchMonitor,
+        n_doc_batches : int,
+        n_docs        : int,
+        n_sents       : int,
+        n_words       : int,
+        n_chars       : int,
+        n_secs        : float
+    ) -> None:
+        
+        # doc batches that are accounted for at once rather than replayed
+        #     one by one, i.e. the completed segments of a
+        #     SegmentedOutputFile: only the totals and the doc batch index
+        #     are updated, and nothing is logged or written to the metrics
+        
+        if Validation.boundary:
+            assert isinstance(n_doc_batches, int)
+            assert 0 <= n_doc_batches
+            assert isinstance(n_docs, int)
+            assert 0 <= n_docs
+            assert isinstance(n_sents, int)
+            assert 0 <= n_sents
+            assert isinstance(n_words, int)
+            assert 0 <= n_words
+            assert isinstance(n_chars, int)
+            assert 0 <= n_chars
+            assert isinstance(n_secs, float)
+            assert 0.0 <= n_secs
+        
+        self._n_docs  += n_docs
+        self._n_sents += n_sents
+        self._n_words += n_words
+        self._n_chars += n_chars
+        self._n_secs  += max(
+            n_secs,
+            n_doc_batches * DocumentBatchMonitor._MIN_BATCH_N_SECS
         )
+        self._index   += n_doc_batches
+    
     
-        assert 'estimated_fraction_of_time_budget_needed' in locals()
+    def post_batch_update(
+        self          : DocumentBatchMonitor,
+        batch_n_docs  : int,
+        batch_n_sents : int,
+        batch_n_words : int,
+        batch_n_chars : int,
+        batch_n_secs  : float,
+        batch_n_cache_lookups : int = 0,
+        batch_n_cache_hits    : int = 0,
+        batch_stage_n_secs    : dict = None,
+        batch_doc_latencies   : list = None,
+        is_replayed           : bool = False
+    ) -> None:
+        
+        # a doc batch replayed from the output file on resume updates the
+        #     totals and the doc batch index, but it was logged and written
+        #     to the metrics by the run that processed it, so it is neither
+        #     logged nor written to the metrics again
+        
+        monitor_begin = time.perf_counter()
+        
+        METHOD_NAME = 'document.document_batch_monitor: ' \
+            + 'DocumentBatchMonitor.post_batch_update:'
+        
+        ########################################################################
+        #### validate method invocation preconditions
+        
+        if Validation.full:
+            assert isinstance(self._input_file, (InputFile, StreamingInputFile))
+            assert isinstance(self._logger, Logger)
+            assert isinstance(self._time_budget_in_hours, int)
+            assert 0 < self._time_budget_in_hours
             
-        self._logger.info(
-            dedent(
-                '''\
-                {0}
-                at the current average char parsing rate,
-                {1:.4} will be the total fraction
-                of the time budget of {2} hours
-                needed to process all the docs'''
-            ).replace('\n', ' ').format(
-                METHOD_NAME,
-                estimated_fraction_of_time_budget_needed,
-                self._time_budget_in_hours
+            assert isinstance(self._n_docs, int)
+            assert 0 <= self._n_docs
+            assert isinstance(self._n_sents, int)
+            assert 0 <= self._n_sents
+            assert isinstance(self._n_words, int)
+            assert 0 <= self._n_words
+            assert isinstance(self._n_chars, int)
+            assert 0 <= self._n_chars
+            assert isinstance(self._n_secs, float)
+            assert 0.0 <= self._n_secs
+            assert isinstance(self._index, int)
+            assert 0 <= self._index
+        
+        
+        ########################################################################
+        #### validate method invocation arguments
+
+        if Validation.boundary:
+            assert isinstance(batch_n_docs, int)
+            assert 0 < batch_n_docs
+            assert isinstance(batch_n_sents, int)
+            assert 0 < batch_n_sents
+            assert isinstance(batch_n_words, int)
+            assert 0 < batch_n_words
+            assert isinstance(batch_n_chars, int)
+            assert 0 < batch_n_chars
+            assert isinstance(batch_n_secs, (int, float))
+            assert 0 <= batch_n_secs
+            assert isinstance(batch_n_cache_lookups, int)
+            assert 0 <= batch_n_cache_lookups
+            assert isinstance(batch_n_cache_hits, int)
+            assert 0 <= batch_n_cache_hits
+            assert batch_n_cache_hits <= batch_n_cache_lookups
+            assert (
+                isinstance(batch_stage_n_secs, dict)
+                or batch_stage_n_secs is None
+            )
+            assert (
+                isinstance(batch_doc_latencies, list)
+                or batch_doc_latencies is None
             )
+            assert isinstance(is_replayed, bool)
+        
+        
+        
+        #######################################################################
+        #### update accumulators
+        
+        # a doc batch replayed from the output file may have a begin and end
+        #     datetime that are equal at datetime (microsecond) resolution
+        batch_n_secs = max(
+            float(batch_n_secs),
+            DocumentBatchMonitor._MIN_BATCH_N_SECS
         )
+        
+        self._n_docs  += batch_n_docs
+        self._n_sents += batch_n_sents
+        self._n_words += batch_n_words
+        self._n_chars += batch_n_chars
+        self._n_secs  += batch_n_secs
+        
+        self._n_cache_lookups += batch_n_cache_lookups
+        self._n_cache_hits    += batch_n_cache_hits
+        
+        if batch_stage_n_secs is not None:
+            batch_stage_n_secs = dict(
+                batch_stage_n_secs,
+                monitor = self._last_monitor_n_secs
+            )
+            for stage in DocumentBatchMonitor._STAGES:
+                self._stage_n_secs[stage] += batch_stage_n_secs[stage]
+        
+        for doc_id, len_in_chars, n_secs in (batch_doc_latencies or []):
+            doc_len_bucket_name = \
+                DocumentBatchMonitor._get_doc_len_bucket_name(len_in_chars)
+            if doc_len_bucket_name not in self._doc_len_bucket_to_latency_histogram:
+                self._doc_len_bucket_to_latency_histogram[doc_len_bucket_name] = \
+                    LatencyHistogram()
+            self._doc_len_bucket_to_latency_histogram[doc_len_bucket_name].add(n_secs)
+            if 0 < self._slow_doc_top_k:
+                heapq.heappush(self._slowest_docs, (n_secs, doc_id, len_in_chars))
+                if self._slow_doc_top_k < len(self._slowest_docs):
+                    heapq.heappop(self._slowest_docs)
+        
+        resource_snapshot = ResourceUsage.get_snapshot()
+        batch_user_cpu_secs, batch_system_cpu_secs = \
+            ResourceUsage.get_cpu_secs_between(
+                self._last_resource_snapshot,
+                resource_snapshot
+            )
+        if batch_user_cpu_secs is None:
+            batch_cpu_utilization = None
+        else:
+            batch_cpu_utilization = \
+                (batch_user_cpu_secs + batch_system_cpu_secs) / max(
+                    resource_snapshot['wall_secs']
+                    - self._last_resource_snapshot['wall_secs'],
+                    DocumentBatchMonitor._MIN_BATCH_N_SECS
+                )
+        self._last_resource_snapshot = resource_snapshot
+        
+        self._rate_window.append((batch_n_docs, batch_n_chars, batch_n_secs))
+        
+        if self._ewma_n_chars is None:
+            self._ewma_n_chars = float(batch_n_chars)
+            self._ewma_n_secs  = batch_n_secs
+        else:
+            self._ewma_n_chars += \
+                self._rate_ewma_alpha * (batch_n_chars - self._ewma_n_chars)
+            self._ewma_n_secs  += \
+                self._rate_ewma_alpha * (batch_n_secs  - self._ewma_n_secs)
+        
+        
+
+        #######################################################################
+        #### calcuate progress statistics
 
+        total_hours   = math.floor(self._n_secs / 60 / 60)
+        total_minutes = math.floor(self._n_secs / 60) - (total_hours * 60)
+        total_seconds = self._n_secs - (total_hours * 60 * 60) - (total_minutes * 60)
+    
+        batch_minutes = math.floor(batch_n_secs / 60)
+        batch_seconds = batch_n_secs - (batch_minutes * 60)
+    
+        total_doc_rate  = self._n_docs  / self._n_secs
+        total_sent_rate = self._n_sents / self._n_secs
+        total_word_rate = self._n_words / self._n_secs
+        total_char_rate = self._n_chars / self._n_secs
+        
+        batch_doc_rate  = batch_n_docs  / batch_n_secs
+        batch_sent_rate = batch_n_sents / batch_n_secs
+        batch_word_rate = batch_n_words / batch_n_secs
+        batch_char_rate = batch_n_chars / batch_n_secs
+        
+        window_char_rate = \
+            sum(n_chars for _, n_chars, _ in self._rate_window) \
+            / sum(n_secs for _, _, n_secs in self._rate_window)
+        ewma_char_rate = self._ewma_n_chars / self._ewma_n_secs
+        
+        
+        
+        
+        time_budget_in_seconds = self._time_budget_in_hours * 60 * 60
+        
+        fraction_of_time_budget_consumed = self._n_secs / time_budget_in_seconds
+        
+        
+        # the length of a stream is unknown, so is the time remaining
+        is_input_len_known = self._input_file.get_file_len_in_chars() is not None
+        
+        if is_input_len_known:
+            
+            if Validation.full:
+                assert isinstance(self._input_file.get_file_len_in_chars(), int)
+                assert 0 < self._input_file.get_file_len_in_chars()
+            
+            num_chars_remaining = self._input_file.get_file_len_in_chars() - self._n_chars
+            
+            # the windowed rate is used for the remaining time estimate so that
+            #     the estimate follows the recent throughput
+            estimated_time_remaining_in_seconds = num_chars_remaining / window_char_rate
+            
+            ewma_estimated_time_remaining_in_seconds = num_chars_remaining / ewma_char_rate
+            
+            estimated_remaining_hours   = math.floor(estimated_time_remaining_in_seconds / 60 / 60)
+            estimated_remaining_minutes = math.floor(estimated_time_remaining_in_seconds / 60) - (estimated_remaining_hours * 60)
+            estimated_remaining_seconds = estimated_time_remaining_in_seconds - (estimated_remaining_hours * 60 * 60) - (estimated_remaining_minutes * 60)
+            
+            estimated_total_hours   = total_hours   + estimated_remaining_hours
+            estimated_total_minutes = total_minutes + estimated_remaining_minutes
+            estimated_total_seconds = total_seconds + estimated_remaining_seconds
+            
+            if Validation.full:
+                assert isinstance(self._time_budget_in_hours, int)
+                assert 0 < self._time_budget_in_hours
+                 
+            estimated_total_time_in_seconds = self._n_secs + estimated_time_remaining_in_seconds
+        
+            estimated_fraction_of_time_budget_needed = estimated_total_time_in_seconds / time_budget_in_seconds
+        
+        else:
+            
+            estimated_time_remaining_in_seconds      = None
+            ewma_estimated_time_remaining_in_seconds = None
+            estimated_fraction_of_time_budget_needed = None
+        
+        
+        
+        ########################################################################
+        #### write the structured metrics record for this doc batch
+        
+        if not is_replayed and (
+            self._metrics_jsonl_file_path is not None
+            or self._metrics_prom_file_path is not None
+        ):
+            self._write_metrics_record({
+                'timestamp'                                : time.time(),
+                'doc_batch_index'                          : self._index,
+                'batch_n_docs'                             : batch_n_docs,
+                'batch_n_sents'                            : batch_n_sents,
+                'batch_n_words'                            : batch_n_words,
+                'batch_n_chars'                            : batch_n_chars,
+                'batch_n_secs'                             : batch_n_secs,
+                'batch_doc_rate'                           : batch_doc_rate,
+                'batch_char_rate'                          : batch_char_rate,
+                'total_n_docs'                             : self._n_docs,
+                'total_n_sents'                            : self._n_sents,
+                'total_n_words'                            : self._n_words,
+                'total_n_chars'                            : self._n_chars,
+                'total_n_secs'                             : self._n_secs,
+                'total_doc_rate'                           : total_doc_rate,
+                'total_char_rate'                          : total_char_rate,
+                'window_char_rate'                         : window_char_rate,
+                'ewma_char_rate'                           : ewma_char_rate,
+                'file_len_in_docs'                         : self._input_file.get_file_len_in_docs(),
+                'file_len_in_chars'                        : self._input_file.get_file_len_in_chars(),
+                'fraction_of_chars_processed'              : (
+                    self._n_chars / self._input_file.get_file_len_in_chars()
+                    if is_input_len_known else None
+                ),
+                'estimated_remaining_secs'                 : estimated_time_remaining_in_seconds,
+                'ewma_estimated_remaining_secs'            : ewma_estimated_time_remaining_in_seconds,
+                'fraction_of_time_budget_consumed'         : fraction_of_time_budget_consumed,
+                'estimated_fraction_of_time_budget_needed' : estimated_fraction_of_time_budget_needed,
+                'total_n_cache_lookups'                    : self._n_cache_lookups,
+                'total_n_cache_hits'                       : self._n_cache_hits,
+                **{
+                    'batch_{0}_n_secs'.format(stage) : (
+                        batch_stage_n_secs[stage]
+                        if batch_stage_n_secs is not None else None
+                    )
+                    for stage in DocumentBatchMonitor._STAGES
+                },
+                **{
+                    'total_{0}_n_secs'.format(stage) : self._stage_n_secs[stage]
+                    for stage in DocumentBatchMonitor._STAGES
+                },
+                'rss_bytes'                                : resource_snapshot['rss_bytes'],
+                'peak_rss_bytes'                           : resource_snapshot['peak_rss_bytes'],
+                'batch_user_cpu_secs'                      : batch_user_cpu_secs,
+                'batch_system_cpu_secs'                    : batch_system_cpu_secs,
+                'batch_cpu_utilization'                    : batch_cpu_utilization,
+                'total_user_cpu_secs'                      : resource_snapshot['user_cpu_secs'],
+                'total_system_cpu_secs'                    : resource_snapshot['system_cpu_secs'],
+                **self._get_doc_latency_metrics()
+            })
+        
+        
+        ########################################################################
+        #### log progress statistics, throttled to every
+        ####     log_every_n_batches doc batches or log_every_n_secs seconds;
+        ####     none of the messages is built if info is not enabled
+        
+        if not is_replayed and self._logger.isEnabledFor(logging.INFO):
+            self._last_progress_summary = {
+                'doc_batch_index'                          : self._index,
+                'METHOD_NAME'                              : METHOD_NAME,
+                'batch_minutes'                            : batch_minutes,
+                'batch_seconds'                            : batch_seconds,
+                'batch_n_docs'                             : batch_n_docs,
+                'batch_n_sents'                            : batch_n_sents,
+                'batch_n_words'                            : batch_n_words,
+                'batch_n_chars'                            : batch_n_chars,
+                'batch_doc_rate'                           : batch_doc_rate,
+                'batch_sent_rate'                          : batch_sent_rate,
+                'batch_word_rate'                          : batch_word_rate,
+                'batch_char_rate'                          : batch_char_rate,
+                'total_hours'                              : total_hours,
+                'total_minutes'                            : total_minutes,
+                'total_seconds'                            : total_seconds,
+                'fraction_of_time_budget_consumed'         : fraction_of_time_budget_consumed,
+                'is_input_len_known'                       : is_input_len_known,
+                'total_doc_rate'                           : total_doc_rate,
+                'total_sent_rate'                          : total_sent_rate,
+                'total_word_rate'                          : total_word_rate,
+                'total_char_rate'                          : total_char_rate,
+                'window_char_rate'                         : window_char_rate,
+                'ewma_char_rate'                           : ewma_char_rate,
+                'ewma_estimated_time_remaining_in_seconds' : ewma_estimated_time_remaining_in_seconds,
+                'estimated_remaining_hours'                : estimated_remaining_hours if is_input_len_known else None,
+                'estimated_remaining_minutes'              : estimated_remaining_minutes if is_input_len_known else None,
+                'estimated_remaining_seconds'              : estimated_remaining_seconds if is_input_len_known else None,
+                'estimated_total_hours'                    : estimated_total_hours if is_input_len_known else None,
+                'estimated_total_minutes'                  : estimated_total_minutes if is_input_len_known else None,
+                'estimated_total_seconds'                  : estimated_total_seconds if is_input_len_known else None,
+                'estimated_fraction_of_time_budget_needed' : estimated_fraction_of_time_budget_needed,
+                'batch_stage_n_secs'                       : batch_stage_n_secs,
+                'resource_snapshot'                        : resource_snapshot,
+                'batch_user_cpu_secs'                      : batch_user_cpu_secs,
+                'batch_system_cpu_secs'                    : batch_system_cpu_secs,
+                'batch_cpu_utilization'                    : batch_cpu_utilization,
+                'batch_n_cache_hits'                       : batch_n_cache_hits,
+                'batch_n_cache_lookups'                    : batch_n_cache_lookups
+            }
+            self._is_last_progress_summary_logged = False
+            if self._is_progress_summary_due():
+                self._log_progress_summary()
+        
         self._index += 1
+        
+        self._last_monitor_n_secs = time.perf_counter() - monitor_begin
     
 
 
@@ -0,0 +1,140 @@
+from __future__ import annotations
+from logging import Logger
+from textwrap import dedent
+
+from .document_batch_monitor import DocumentBatchMonitor
+
+
+class DocumentBatchSizeController:
+
+    #######################################################
+    #### chooses the size of the next doc batch from the
+    ####     durations of the most recent doc batches as
+    ####     reported to the DocumentBatchMonitor
+    ####
+    #### with a target_batch_n_secs, the size converges on
+    ####     the number of docs that the recent secs per doc
+    ####     predict to take that long; without one, the size
+    ####     hill-climbs on the char rate of the last doc batch;
+    ####     in both modes a single adjustment changes the size
+    ####     by at most a factor of _MAX_STEP_FACTOR and the
+    ####     size stays within [min_doc_batch_size, max_doc_batch_size]
+
+    _MAX_STEP_FACTOR = 2.0
+
+    _HILL_CLIMB_STEP_FACTOR = 1.25
+
+    # relative drop of the char rate below which it is considered noise
+    _HILL_CLIMB_TOLERANCE = 0.02
+
+    def __init__(
+        self                : DocumentBatchSizeController,
+        logger              : Logger = None, # required
+        min_doc_batch_size  : int    = 1,    # optional
+        max_doc_batch_size  : int    = 4096, # optional
+        target_batch_n_secs : float  = None  # optional
+    ) -> DocumentBatchSizeController:
+        assert isinstance(logger, Logger)
+        assert isinstance(min_doc_batch_size, int)
+        assert 0 < min_doc_batch_size
+        assert isinstance(max_doc_batch_size, int)
+        assert min_doc_batch_size <= max_doc_batch_size
+        assert (
+            target_batch_n_secs is None
+            or (
+                isinstance(target_batch_n_secs, (int, float))
+                and 0 < target_batch_n_secs
+            )
+        )
+
+        self._logger              = logger              ; del logger
+        self._min_doc_batch_size  = min_doc_batch_size  ; del min_doc_batch_size
+        self._max_doc_batch_size  = max_doc_batch_size  ; del max_doc_batch_size
+        self._target_batch_n_secs = target_batch_n_secs ; del target_batch_n_secs
+
+        # hill-climbing state
+        self._last_char_rate = None
+        self._direction      = 1
+
+
+    def _clamp(
+        self           : DocumentBatchSizeController,
+        doc_batch_size : float,
+        current        : int
+    ) -> int:
+        doc_batch_size = min(
+            max(doc_batch_size, current / DocumentBatchSizeController._MAX_STEP_FACTOR),
+            current * DocumentBatchSizeController._MAX_STEP_FACTOR
+        )
+        return min(
+            max(round(doc_batch_size), self._min_doc_batch_size),
+            self._max_doc_batch_size
+        )
+
+
+    def get_next_doc_batch_size(
+        self           : DocumentBatchSizeController,
+        current        : int,
+        monitor        : DocumentBatchMonitor
+    ) -> int:
+        assert isinstance(current, int)
+        assert 0 < current
+        assert isinstance(monitor, DocumentBatchMonitor)
+
+        recent_batch_stats = monitor.get_recent_batch_stats()
+
+        if 0 == len(recent_batch_stats):
+            return min(max(current, self._min_doc_batch_size), self._max_doc_batch_size)
+
+        if self._target_batch_n_secs is not None:
+
+            n_docs = sum(n_docs for n_docs, _, _ in recent_batch_stats)
+            n_secs = sum(n_secs for _, _, n_secs in recent_batch_stats)
+            next_doc_batch_size = self._clamp(
+                self._target_batch_n_secs / (n_secs / n_docs),
+                current
+            )
+            reason = 'recent doc batches took {0:.4f} s per doc, target is {1:.4f} s per doc batch' \
+                .format(
+                    n_secs / n_docs,
+                    self._target_batch_n_secs
+                )
+
+        else:
+
+            _, n_chars, n_secs = recent_batch_stats[-1]
+            char_rate = n_chars / n_secs
+            if (
+                self._last_char_rate is not None
+                and char_rate < self._last_char_rate * (1 - DocumentBatchSizeController._HILL_CLIMB_TOLERANCE)
+            ):
+                self._direction = -self._direction
+            self._last_char_rate = char_rate
+            next_doc_batch_size = self._clamp(
+                current * DocumentBatchSizeController._HILL_CLIMB_STEP_FACTOR ** self._direction,
+                current
+            )
+            if next_doc_batch_size == current:
+                # keep moving at least one doc so that the climb does not stall
+                #     on a size that rounds back to itself
+                next_doc_batch_size = min(
+                    max(current + self._direction, self._min_doc_batch_size),
+                    self._max_doc_batch_size
+                )
+            reason = 'the last doc batch ran at {0:.4f} chars/s'.format(char_rate)
+
+        if next_doc_batch_size != current:
+            self._logger.info(
+                dedent(
+                    '''\
+                    document.document_batch_size_controller:
+                    DocumentBatchSizeController.get_next_doc_batch_size:
+                    adjusting the doc batch size from {0} to {1} docs: {2}'''
+                ).replace('\n', ' ').format(
+                    current,
+                    next_doc_batch_size,
+                    reason
+                )
+            )
+
+        return next_doc_batch_size
@@ -0,0 +1,76 @@
+from __future__ import annotations
+import math
+
+
+class LatencyHistogram:
+
+    #######################################################
+    #### histogram of latencies with logarithmically spaced
+    ####     bins, so that quantiles can be estimated in
+    ####     constant memory with a bounded relative error;
+    ####     consecutive bin bounds differ by a factor of
+    ####     2**(1/_BINS_PER_OCTAVE), i.e. about 19%
+
+    _MIN_N_SECS = 1e-6
+
+    _BINS_PER_OCTAVE = 4
+
+    def __init__(self : LatencyHistogram) -> LatencyHistogram:
+        self._bin_to_count = dict()
+        self._count        = 0
+        self._sum_n_secs   = 0.0
+        self._max_n_secs   = 0.0
+
+    def _get_bin(
+        self   : LatencyHistogram,
+        n_secs : float
+    ) -> int:
+        return math.floor(
+            LatencyHistogram._BINS_PER_OCTAVE
+            * math.log2(max(n_secs, LatencyHistogram._MIN_N_SECS) / LatencyHistogram._MIN_N_SECS)
+        )
+
+    def _get_bin_upper_bound(
+        self : LatencyHistogram,
+        bin  : int
+    ) -> float:
+        return LatencyHistogram._MIN_N_SECS * 2 ** (
+            (bin + 1) / LatencyHistogram._BINS_PER_OCTAVE
+        )
+
+    def add(
+        self   : LatencyHistogram,
+        n_secs : float
+    ) -> None:
+        assert 0.0 <= n_secs
+        bin = self._get_bin(n_secs)
+        self._bin_to_count[bin] = self._bin_to_count.get(bin, 0) + 1
+        self._count      += 1
+        self._sum_n_secs += n_secs
+        self._max_n_secs  = max(self._max_n_secs, n_secs)
+
+    def get_count(self : LatencyHistogram) -> int:
+        return self._count
+
+    def get_mean(self : LatencyHistogram) -> float:
+        assert 0 < self._count
+        return self._sum_n_secs / self._count
+
+    def get_max(self : LatencyHistogram) -> float:
+        return self._max_n_secs
+
+    def get_quantile(
+        self     : LatencyHistogram,
+        quantile : float
+    ) -> float:
+        # returns the upper bound of the bin containing the quantile,
+        #     capped at the exact maximum
+        assert 0 < self._count
+        assert 0.0 <= quantile and quantile <= 1.0
+        rank = max(1, math.ceil(quantile * self._count))
+        cumulative_count = 0
+        for bin in sorted(self._bin_to_count):
+            cumulative_count += self._bin_to_count[bin]
+            if rank <= cumulative_count:
+                return min(self._get_bin_upper_bound(bin), self._max_n_secs)
+        return self._max_n_secs
@@ -0,0 +1,95 @@
+from __future__ import annotations
+from typing import Any
+
+from .document import Document
+from ..validation import Validation
+
+
+class SentenceBatch:
+
+    #######################################################
+    #### a batch of sents, possibly from several docs and
+    ####     several doc batches, handed out by
+    ####     SentenceBatchIterator; the processor returns one
+    ####     result per sent with set_sent_results
+
+    def __init__(self : SentenceBatch) -> SentenceBatch:
+
+        # (doc, sent index in the doc, sent) of each sent in the batch
+        self._sents = []
+
+        # the per-doc result lists the results are written to, and the
+        #     pending doc batches they belong to (see SentenceBatchIterator)
+        self._sent_result_lists = []
+        self._pending_doc_batches = []
+
+        self._done = False
+
+
+    def append_sent(
+        self              : SentenceBatch,
+        doc               : Document,
+        sent_index        : int,
+        sent_result_list  : list,
+        pending_doc_batch : dict
+    ) -> None:
+
+        if Validation.boundary:
+            assert self._done is False
+        if Validation.full:
+            assert isinstance(doc, Document)
+            assert 0 <= sent_index and sent_index < doc.get_len_in_sents()
+
+        self._sents.append(
+            (doc, sent_index, doc.get_list_of_sents()[sent_index])
+        )
+        self._sent_result_lists.append(sent_result_list)
+        self._pending_doc_batches.append(pending_doc_batch)
+
+
+    def get_list_of_sents(self : SentenceBatch) -> list[str]:
+        return [sent for doc, sent_index, sent in self._sents]
+
+    def get_list_of_doc_ids(self : SentenceBatch) -> list[str]:
+        # the id of the doc of each sent
+        return [doc.get_id() for doc, sent_index, sent in self._sents]
+
+    def get_list_of_sent_indices(self : SentenceBatch) -> list[int]:
+        # the index of each sent within its doc
+        return [sent_index for doc, sent_index, sent in self._sents]
+
+    def get_len_in_sents(self : SentenceBatch) -> int:
+        return len(self._sents)
+
+
+    def set_sent_results(
+        self         : SentenceBatch,
+        sent_results : list[Any]
+    ) -> None:
+
+        # one json-serializable result per sent, in the order of
+        #     get_list_of_sents
+
+        if Validation.boundary:
+            assert self._done is False
+            assert len(sent_results) == len(self._sents), \
+                'got {0} sent results for a sent batch of {1} sents' \
+                .format(
+                    len(sent_results),
+                    len(self._sents)
+                )
+
+        for (doc, sent_index, sent), sent_result_list, pending_doc_batch, sent_result in zip(
+            self._sents,
+            self._sent_result_lists,
+            self._pending_doc_batches,
+            sent_results
+        ):
+            sent_result_list[sent_index] = sent_result
+            pending_doc_batch['n_sents_left'] -= 1
+
+        self._done = True
+
+
+    def is_done(self : SentenceBatch) -> bool:
+        return self._done
@@ -0,0 +1,257 @@
+from __future__ import annotations
+import collections
+import datetime
+from logging import Logger
+from textwrap import dedent
+from typing import Any, Callable
+
+from .document import Document
+from .document_batch import DocumentBatch
+from .document_batch_iterator import DocumentBatchIterator
+from .sentence_batch import SentenceBatch
+
+
+class SentenceBatchIterator:
+
+    # the sentence-level batching mode of DocumentBatchIterator: the sents of
+    #     consecutive docs, across doc batch boundaries, are packed into
+    #     sent batches of at most sent_batch_size sents and, optionally, at
+    #     most sent_batch_len_in_words words (a single longer sent gets a sent
+    #     batch of its own); the processor sets one result per sent, and once
+    #     every sent of every doc of a doc batch has its result, the per-sent
+    #     results of each doc are reduced to its predicted statistics and the
+    #     doc batch is written to the output file
+    #
+    # doc batches are thus only ever written whole and in order, so crash
+    #     recovery is that of DocumentBatchIterator: a doc batch whose sents
+    #     were only partly processed is not in the output file and is
+    #     processed again by the next run
+    #
+    # with a quarantine or graceful_stop, however, the doc batch iterator
+    #     requires every doc batch to be written before the next one is
+    #     fetched (see DocumentBatchIterator.is_look_ahead_allowed): the sents
+    #     are then not packed across doc batch boundaries, and a sent batch
+    #     ends with the last sent of its doc batch
+    #
+    # e.g.
+    #
+    #     for sent_batch in SentenceBatchIterator(
+    #         logger             = logger,
+    #         doc_batch_iterator = doc_batch_iterator,
+    #         sent_batch_size    = 256
+    #     ):
+    #         sent_batch.set_sent_results(model(sent_batch.get_list_of_sents()))
+
+    @staticmethod
+    def _reduce_sent_results(
+        doc          : Document,
+        sent_results : list[Any]
+    ) -> dict:
+        return {'sent_results' : sent_results}
+
+
+    def __iter__(
+        self : SentenceBatchIterator
+    ) -> SentenceBatchIterator:
+
+        return self
+
+
+    def __next__(
+        self : SentenceBatchIterator
+    ) -> SentenceBatch:
+
+        if self._sent_batch is not None:
+            assert self._sent_batch.is_done(), \
+                'set_sent_results must be called on every sent batch ' \
+                'before the next sent batch is requested'
+
+        self._write_completed_doc_batches()
+
+        self._sent_batch = SentenceBatch()
+        sent_batch_len_in_words = 0
+
+        while self._sent_batch.get_len_in_sents() < self._sent_batch_size:
+
+            if not self._has_next_sent():
+                break
+
+            pending_doc_batch = self._pending_doc_batches[-1]
+            doc = pending_doc_batch['docs'][self._doc_index]
+            sent_len_in_words = len(doc.get_list_of_sents()[self._sent_index].split())
+
+            if (
+                self._sent_batch_len_in_words is not None
+                and 0 < self._sent_batch.get_len_in_sents()
+                and self._sent_batch_len_in_words
+                    < sent_batch_len_in_words + sent_len_in_words
+            ):
+                break
+
+            self._sent_batch.append_sent(
+                doc,
+                self._sent_index,
+                pending_doc_batch['sent_results'][self._doc_index],
+                pending_doc_batch
+            )
+            sent_batch_len_in_words += sent_len_in_words
+            self._sent_index += 1
+
+        if 0 < self._sent_batch.get_len_in_sents():
+
+            return self._sent_batch
+
+        self._write_completed_doc_batches()
+        assert 0 == len(self._pending_doc_batches)
+
+        # the doc batch iterator was exhausted before the last doc batches
+        #     were written
+        self._doc_batch_iterator.log_final_progress_summary()
+
+        raise StopIteration
+
+
+    def _has_next_sent(
+        self : SentenceBatchIterator
+    ) -> bool:
+
+        # advances to the next sent to pack, fetching doc batches from the
+        #     doc batch iterator as needed
+
+        while True:
+
+            if 0 < len(self._pending_doc_batches):
+                pending_doc_batch = self._pending_doc_batches[-1]
+                while self._doc_index < len(pending_doc_batch['docs']):
+                    if (
+                        self._sent_index
+                        < pending_doc_batch['docs'][self._doc_index].get_len_in_sents()
+                    ):
+                        return True
+                    self._doc_index += 1
+                    self._sent_index = 0
+
+                if not self._is_look_ahead_allowed:
+                    # the sents of the doc batch fetched last are all packed:
+                    #     it must be written before the next one is fetched
+                    self._write_completed_doc_batches()
+                    if 0 < len(self._pending_doc_batches):
+                        return False
+
+            if self._doc_batches_exhausted:
+                return False
+
+            try:
+                doc_batch = next(self._doc_batch_iterator)
+            except StopIteration:
+                self._doc_batches_exhausted = True
+                return False
+
+            # the docs whose result is cached need no processing
+            docs = doc_batch.get_list_of_docs_to_process()
+            self._pending_doc_batches.append(
+                {
+                    'doc_batch'      : doc_batch,
+                    'begin_datetime' : datetime.datetime.now(datetime.timezone.utc),
+                    'docs'           : docs,
+                    'sent_results'   : [
+                        [None] * doc.get_len_in_sents() for doc in docs
+                    ],
+                    'n_sents_left'   : sum(doc.get_len_in_sents() for doc in docs)
+                }
+            )
+            self._doc_index  = 0
+            self._sent_index = 0
+
+
+    def _write_completed_doc_batches(
+        self : SentenceBatchIterator
+    ) -> None:
+
+        # a doc batch is complete once every one of its sents has a result,
+        #     and is then written, provided every doc batch before it has
+        #     been written
+
+        while (
+            0 < len(self._pending_doc_batches)
+            and 0 == self._pending_doc_batches[0]['n_sents_left']
+        ):
+            pending_doc_batch = self._pending_doc_batches.popleft()
+            doc_batch = pending_doc_batch['doc_batch']
+            assert isinstance(doc_batch, DocumentBatch)
+
+            for doc, sent_results in zip(
+                pending_doc_batch['docs'],
+                pending_doc_batch['sent_results']
+            ):
+                doc.set_predicted_statistics(
+                    self._reduce_sent_results(doc, sent_results)
+                )
+
+            doc_batch.set_begin_datetime(pending_doc_batch['begin_datetime'])
+            doc_batch.set_end_datetime(datetime.datetime.now(datetime.timezone.utc))
+            doc_batch.write_to_disk()
+
+            self._n_written_doc_batches += 1
+
+
+    def get_n_written_doc_batches(
+        self : SentenceBatchIterator
+    ) -> int:
+
+        return self._n_written_doc_batches
+
+
+    def __init__(
+        self                    : SentenceBatchIterator,
+        logger                  : Logger                = None, # required
+        doc_batch_iterator      : DocumentBatchIterator = None, # required
+        sent_batch_size         : int                   = 64,   # optional
+        sent_batch_len_in_words : int                   = None, # optional
+        reduce_sent_results     : Callable[[Document, list[Any]], dict] = None # optional
+    ) -> SentenceBatchIterator:
+        assert isinstance(logger, Logger)
+        assert isinstance(doc_batch_iterator, DocumentBatchIterator)
+        assert isinstance(sent_batch_size, int)
+        assert 0 < sent_batch_size
+        assert (
+            isinstance(sent_batch_len_in_words, int)
+            and 0 < sent_batch_len_in_words
+            or sent_batch_len_in_words is None
+        )
+        # reduce_sent_results(doc, sent_results) returns the predicted
+        #     statistics of a doc from the results of its sents; by default
+        #     they are {'sent_results' : sent_results}
+        if reduce_sent_results is None:
+            reduce_sent_results = SentenceBatchIterator._reduce_sent_results
+        assert callable(reduce_sent_results)
+
+        self._logger                  = logger                  ; del logger
+        self._doc_batch_iterator      = doc_batch_iterator      ; del doc_batch_iterator
+        self._sent_batch_size         = sent_batch_size         ; del sent_batch_size
+        self._sent_batch_len_in_words = sent_batch_len_in_words ; del sent_batch_len_in_words
+        self._reduce_sent_results     = reduce_sent_results     ; del reduce_sent_results
+
+        self._logger.debug(
+            dedent(
+                '''\
+                document.sentence_batch_iterator:
+                SentenceBatchIterator.__init__:
+                sent_batch_size: {0}: sent_batch_len_in_words: {1}'''
+            ).replace('\n', ' ').format(
+                self._sent_batch_size,
+                self._sent_batch_len_in_words
+            )
+        )
+
+        # doc batches handed out by the doc batch iterator and not yet
+        #     written, oldest first; sents are packed from the last one,
+        #     starting at self._doc_index and self._sent_index
+        self._pending_doc_batches   = collections.deque()
+        self._doc_index             = 0
+        self._sent_index            = 0
+        self._doc_batches_exhausted = False
+        self._is_look_ahead_allowed = \
+            self._doc_batch_iterator.is_look_ahead_allowed()
+        self._sent_batch            = None
+        self._n_written_doc_batches = 0
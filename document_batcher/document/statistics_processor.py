@@ -0,0 +1,266 @@
+from __future__ import annotations
+from collections import Counter
+
+try:
+    import numpy as np # optional: pip install document-batcher[numpy]
+except ImportError:
+    np = None
+
+from .document import Document
+from .document_batch import DocumentBatch
+from .document_batch_columns import DocumentBatchColumns
+from ..validation import Validation
+
+
+class StatisticsProcessor:
+
+    #######################################################
+    #### ready-made processor for the cheap corpus
+    ####     statistics most pipelines start with,
+    ####     computed for all docs of a doc batch at once:
+    ####
+    #### char_frequencies        : {char : count} of the
+    ####                           full text, as in the
+    ####                           readme example
+    #### token_frequencies       : {token : count} of the
+    ####                           whitespace-separated
+    ####                           tokens of the sents
+    #### sent_len_in_chars_distribution,
+    #### sent_len_in_words_distribution :
+    ####                           min, max, mean and a
+    ####                           histogram (over
+    ####                           get_sent_len_bin_edges)
+    ####                           of the sent lengths
+    ####
+    #### char frequencies are counted with numpy over the
+    ####     code points of the whole doc batch (see
+    ####     DocumentBatchColumns), or with Counter, which
+    ####     counts in c, if numpy is not installed; token
+    ####     frequencies are counted with Counter; the sent
+    ####     length distributions require numpy
+    ####
+    #### e.g. in place of the readme's per-char loop:
+    ####
+    ####     processor = StatisticsProcessor(['char_frequencies'])
+    ####     for doc_batch in doc_batch_iterator:
+    ####         processor.process(doc_batch)
+    ####         ...
+    ####         doc_batch.write_to_disk()
+
+    _STATISTICS = [
+        'char_frequencies',
+        'token_frequencies',
+        'sent_len_in_chars_distribution',
+        'sent_len_in_words_distribution'
+    ]
+
+    # the maximum unicode code point is below 2 ** 21
+    _CODE_POINT_N_BITS = 21
+
+    @staticmethod
+    def get_statistics() -> list[str]:
+        return StatisticsProcessor._STATISTICS.copy()
+
+    def __init__(
+        self                        : StatisticsProcessor,
+        statistics                  : list[str] = None, # optional
+        sent_len_in_chars_bin_edges : list[int] = None, # optional
+        sent_len_in_words_bin_edges : list[int] = None  # optional
+    ) -> StatisticsProcessor:
+        if statistics is None:
+            statistics = StatisticsProcessor.get_statistics()
+        assert isinstance(statistics, list)
+        assert 0 < len(statistics)
+        for statistic in statistics:
+            assert statistic in StatisticsProcessor._STATISTICS, \
+                'statistic is {0} but should be one of {1}' \
+                .format(
+                    statistic,
+                    StatisticsProcessor._STATISTICS
+                )
+        # histogram bin i counts the sents of length
+        #     bin_edges[i] <= len < bin_edges[i+1], and the last bin
+        #     the sents of length bin_edges[-1] and longer
+        if sent_len_in_chars_bin_edges is None:
+            sent_len_in_chars_bin_edges = [0, 16, 32, 64, 128, 256, 512, 1024, 2048]
+        if sent_len_in_words_bin_edges is None:
+            sent_len_in_words_bin_edges = [0, 4, 8, 16, 32, 64, 128, 256]
+        for bin_edges in [sent_len_in_chars_bin_edges, sent_len_in_words_bin_edges]:
+            assert isinstance(bin_edges, list)
+            assert 0 < len(bin_edges)
+            assert 0 == bin_edges[0]
+            assert bin_edges == sorted(set(bin_edges))
+        if (
+            'sent_len_in_chars_distribution' in statistics
+            or 'sent_len_in_words_distribution' in statistics
+        ) and np is None:
+            raise ImportError(
+                'numpy is required for the sent length distributions: '
+                'pip install numpy'
+            )
+
+        self._statistics = statistics ; del statistics
+        self._sent_len_bin_edges = {
+            'sent_len_in_chars_distribution' : sent_len_in_chars_bin_edges,
+            'sent_len_in_words_distribution' : sent_len_in_words_bin_edges
+        }
+        del sent_len_in_chars_bin_edges
+        del sent_len_in_words_bin_edges
+
+    def get_sent_len_bin_edges(
+        self      : StatisticsProcessor,
+        statistic : str
+    ) -> list[int]:
+        return self._sent_len_bin_edges[statistic].copy()
+
+
+    #######################################################
+    #### process a doc batch
+
+    def process(
+        self      : StatisticsProcessor,
+        doc_batch : DocumentBatch
+    ) -> None:
+        # sets the predicted statistics of the docs of the doc batch
+        #     that need processing (see get_list_of_docs_to_process)
+        if Validation.boundary:
+            assert isinstance(doc_batch, DocumentBatch)
+        docs = doc_batch.get_list_of_docs_to_process()
+        for doc, predicted_statistics in zip(docs, self.compute(docs)):
+            doc.set_predicted_statistics(predicted_statistics)
+
+    def compute(
+        self : StatisticsProcessor,
+        docs : list[Document]
+    ) -> list[dict]:
+        # the predicted statistics of each doc, without setting them
+        if Validation.boundary:
+            assert isinstance(docs, list)
+        list_of_predicted_statistics = [dict() for _ in docs]
+        if 0 == len(docs):
+            return list_of_predicted_statistics
+        columns = DocumentBatchColumns(docs) if np is not None else None
+        for statistic in self._statistics:
+            if 'char_frequencies' == statistic:
+                values = StatisticsProcessor._get_char_frequencies(docs, columns)
+            elif 'token_frequencies' == statistic:
+                values = StatisticsProcessor._get_token_frequencies(docs)
+            elif 'sent_len_in_chars_distribution' == statistic:
+                values = StatisticsProcessor._get_len_distributions(
+                    np.diff(columns.get_sent_offsets()),
+                    columns.get_doc_sent_offsets(),
+                    self._sent_len_bin_edges[statistic]
+                )
+            else:
+                assert 'sent_len_in_words_distribution' == statistic
+                values = StatisticsProcessor._get_len_distributions(
+                    np.fromiter(
+                        (
+                            len(sent.split())
+                            for doc in docs
+                            for sent in doc.get_list_of_sents()
+                        ),
+                        dtype = np.int64,
+                        count = int(columns.get_doc_sent_offsets()[-1])
+                    ),
+                    columns.get_doc_sent_offsets(),
+                    self._sent_len_bin_edges[statistic]
+                )
+            for predicted_statistics, value in zip(list_of_predicted_statistics, values):
+                predicted_statistics[statistic] = value
+        return list_of_predicted_statistics
+
+
+    #######################################################
+    #### statistics
+
+    @staticmethod
+    def _get_char_frequencies(
+        docs    : list[Document],
+        columns : DocumentBatchColumns | None
+    ) -> list[dict[str, int]]:
+
+        if columns is None:
+            return [dict(Counter(doc.get_full_text())) for doc in docs]
+
+        # count the distinct (doc index, code point) pairs of the doc batch
+        #     with a single sort; the pairs come out grouped by doc and
+        #     ordered by code point within each doc
+        n_bits = StatisticsProcessor._CODE_POINT_N_BITS
+        keys, counts = np.unique(
+            (columns.get_doc_index_per_char() << n_bits)
+                | columns.get_code_points().astype(np.int64),
+            return_counts = True
+        )
+        doc_key_offsets = np.searchsorted(
+            keys >> n_bits,
+            np.arange(len(docs) + 1)
+        ).tolist()
+        chars  = [chr(code_point) for code_point in (keys & ((1 << n_bits) - 1)).tolist()]
+        counts = counts.tolist()
+        return [
+            dict(
+                zip(
+                    chars[doc_key_offsets[doc_index]:doc_key_offsets[doc_index+1]],
+                    counts[doc_key_offsets[doc_index]:doc_key_offsets[doc_index+1]]
+                )
+            )
+            for doc_index in range(len(docs))
+        ]
+
+    @staticmethod
+    def _get_token_frequencies(
+        docs : list[Document]
+    ) -> list[dict[str, int]]:
+        token_frequencies = []
+        for doc in docs:
+            counter = Counter()
+            for sent in doc.get_list_of_sents():
+                counter.update(sent.split())
+            token_frequencies.append(dict(counter))
+        return token_frequencies
+
+    @staticmethod
+    def _get_len_distributions(
+        lens             : np.ndarray,
+        doc_sent_offsets : np.ndarray,
+        bin_edges        : list[int]
+    ) -> list[dict]:
+        # lens holds the length of every sent of the doc batch, and
+        #     doc_sent_offsets[i]:doc_sent_offsets[i+1] are the sents of doc i
+        n_docs = len(doc_sent_offsets) - 1
+        doc_len_in_sents = np.diff(doc_sent_offsets)
+        doc_index_per_sent = np.repeat(np.arange(n_docs, dtype=np.int64), doc_len_in_sents)
+
+        sums = np.bincount(doc_index_per_sent, weights=lens, minlength=n_docs)
+        histograms = np.bincount(
+            doc_index_per_sent * len(bin_edges)
+                + np.searchsorted(bin_edges, lens, side='right') - 1,
+            minlength = n_docs * len(bin_edges)
+        ).reshape(n_docs, len(bin_edges))
+
+        # reduceat is undefined for docs without sents
+        mins = np.zeros(n_docs, dtype=np.int64)
+        maxs = np.zeros(n_docs, dtype=np.int64)
+        has_sents = 0 < doc_len_in_sents
+        if has_sents.any():
+            mins[has_sents] = np.minimum.reduceat(lens, doc_sent_offsets[:-1][has_sents])
+            maxs[has_sents] = np.maximum.reduceat(lens, doc_sent_offsets[:-1][has_sents])
+
+        doc_len_in_sents = doc_len_in_sents.tolist()
+        sums       = sums.tolist()
+        mins       = mins.tolist()
+        maxs       = maxs.tolist()
+        histograms = histograms.tolist()
+        return [
+            {
+                'min'       : mins[doc_index] if 0 < doc_len_in_sents[doc_index] else None,
+                'max'       : maxs[doc_index] if 0 < doc_len_in_sents[doc_index] else None,
+                'mean'      : (
+                    sums[doc_index] / doc_len_in_sents[doc_index]
+                    if 0 < doc_len_in_sents[doc_index] else None
+                ),
+                'histogram' : histograms[doc_index]
+            }
+            for doc_index in range(n_docs)
+        ]
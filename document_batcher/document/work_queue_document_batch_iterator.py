@@ -0,0 +1,413 @@
+from __future__ import annotations
+import os
+import sys
+import shutil
+import time
+from logging import Logger
+from textwrap import dedent
+
+from .document import Document
+from .document_batch import DocumentBatch
+from .document_batch_monitor import DocumentBatchMonitor
+from ..io.input_file import InputFile
+from ..io.output_file import OutputFile
+from ..io.result_cache import ResultCache
+from ..io.work_queue import WorkQueue
+
+
+class WorkQueueDocumentBatchIterator:
+
+    # the coordination mode of DocumentBatchIterator: instead of one output
+    #     file for the whole input file, doc batches are drawn from ranges
+    #     leased from a WorkQueue shared by any number of workers, and each
+    #     range is written to its own output file; a range output file left
+    #     behind by a worker whose lease expired is resumed like an output
+    #     file by DocumentBatchIterator, i.e. truncated after its last
+    #     complete doc batch
+    #
+    # the lease is checked, and renewed if due, right before each doc batch
+    #     is written (and before a range is completed), so that at least
+    #     (1 - _HEARTBEAT_LEASE_FRACTION) of the lease remains for the write;
+    #     a doc batch still in progress when its lease is lost is dropped
+    #     by DocumentBatch.write_to_disk rather than appended to the output
+    #     file that another worker now writes; the check is bound to the
+    #     lease the doc batch was drawn from, not to the current one
+    #
+    # every doc batch must be written before the next one is requested: a
+    #     range is completed once its last doc batch is handed out, so a doc
+    #     batch that is still in progress then would be missing from its
+    #     range output file
+    #
+    # once every range is done, merge_range_output_files concatenates the
+    #     range output files into a single output file
+
+    # the lease is renewed whenever this fraction of it has elapsed
+    _HEARTBEAT_LEASE_FRACTION = 0.25
+
+    @staticmethod
+    def get_range_output_file_path(
+        output_file_path : str,
+        range_index      : int
+    ) -> str:
+        base, suffix = os.path.splitext(output_file_path)
+        return '{0}.range_{1:06d}{2}'.format(base, range_index, suffix)
+
+
+    @staticmethod
+    def merge_range_output_files(
+        logger           : Logger,
+        work_queue       : WorkQueue,
+        output_file_path : str
+    ) -> None:
+        assert isinstance(logger, Logger)
+        assert isinstance(work_queue, WorkQueue)
+        assert work_queue.is_done(), \
+            'the ranges of the work queue are not all done: {0}' \
+            .format(
+                work_queue.get_state_to_n_ranges()
+            )
+
+        # write to a temporary file first so that an interrupted merge
+        #     never leaves a partial output file
+        tmp_output_file_path = output_file_path + '.tmp'
+        with open(tmp_output_file_path, 'wb') as output_file:
+            for range_index in range(work_queue.get_n_ranges()):
+                if 0 < range_index:
+                    output_file.write(b'\n')
+                range_output_file_path = \
+                    WorkQueueDocumentBatchIterator.get_range_output_file_path(
+                        output_file_path,
+                        range_index
+                    )
+                with open(range_output_file_path, 'rb') as range_output_file:
+                    shutil.copyfileobj(range_output_file, output_file)
+        os.replace(tmp_output_file_path, output_file_path)
+
+        logger.info(
+            dedent(
+                '''\
+                document.work_queue_document_batch_iterator:
+                WorkQueueDocumentBatchIterator.merge_range_output_files:
+                merged {0} range output files into {1}'''
+            ).replace('\n', ' ').format(
+                work_queue.get_n_ranges(),
+                output_file_path
+            )
+        )
+
+
+    def __iter__(
+        self : WorkQueueDocumentBatchIterator
+    ) -> WorkQueueDocumentBatchIterator:
+
+        return self
+
+
+    def __next__(
+        self : WorkQueueDocumentBatchIterator
+    ) -> DocumentBatch:
+
+        if self._last_doc_batch is not None:
+            assert self._last_doc_batch.is_done(), \
+                'every doc batch must be written before the next doc batch ' \
+                'is requested from a work queue'
+
+        while True:
+
+            if self._range is not None:
+
+                range_index, begin_doc_index, end_doc_index = self._range
+
+                if self._next_doc_index < end_doc_index:
+
+                    if self._renew_lease():
+                        return self._get_next_doc_batch()
+
+                elif self._renew_lease():
+
+                    # every doc batch handed out for the range has been
+                    #     written by the user
+                    self._complete_range()
+
+            if not self._lease_next_range():
+
+                self._logger.info(
+                    dedent(
+                        '''\
+                        document.work_queue_document_batch_iterator:
+                        WorkQueueDocumentBatchIterator.__next__:
+                        no range left to lease: this worker completed {0} ranges:
+                        ranges by state: {1}'''
+                    ).replace('\n', ' ').format(
+                        self._n_completed_ranges,
+                        self._work_queue.get_state_to_n_ranges()
+                    )
+                )
+
+                self._monitor.log_final_progress_summary()
+
+                raise StopIteration
+
+
+    def _get_next_doc_batch(
+        self : WorkQueueDocumentBatchIterator
+    ) -> DocumentBatch:
+
+        leased_range = self._range
+        range_index, begin_doc_index, end_doc_index = leased_range
+
+        doc_batch = DocumentBatch(
+            monitor      = self._monitor,
+            output_file  = self._output_file,
+            result_cache = self._result_cache,
+            is_writable  = lambda: self._is_lease_held(leased_range)
+        )
+
+        for doc_index in range(
+            self._next_doc_index,
+            min(self._next_doc_index + self._doc_batch_size, end_doc_index)
+        ):
+            input_doc = self._input_file.get_input_doc_at_index(doc_index)
+            assert isinstance(input_doc, Document)
+            doc_batch.append_doc(input_doc)
+
+        self._next_doc_index += doc_batch.get_len_in_docs()
+
+        doc_batch.set_fetched()
+
+        self._last_doc_batch = doc_batch
+
+        return doc_batch
+
+
+    def _is_lease_held(
+        self         : WorkQueueDocumentBatchIterator,
+        leased_range : tuple[int, int, int]
+    ) -> bool:
+
+        # whether the lease that leased_range was drawn from is still held:
+        #     each lease gets a tuple of its own from WorkQueue.lease_range,
+        #     so a range leased again, even by this worker, fails the check
+        return self._range is leased_range and self._renew_lease()
+
+
+    def _renew_lease(
+        self : WorkQueueDocumentBatchIterator
+    ) -> bool:
+
+        # False if the range was already abandoned
+        if self._range is None:
+            return False
+
+        range_index, begin_doc_index, end_doc_index = self._range
+
+        if (
+            time.perf_counter() - self._heartbeat_perf_counter
+            < self._work_queue.get_lease_secs()
+                * WorkQueueDocumentBatchIterator._HEARTBEAT_LEASE_FRACTION
+        ):
+            return True
+
+        if self._work_queue.heartbeat(range_index):
+            self._heartbeat_perf_counter = time.perf_counter()
+            return True
+
+        # the lease expired and another worker has leased the range;
+        #     stop writing to its output file, which is not even flushed:
+        #     every doc batch written to it was flushed by write_to_disk,
+        #     and the other worker may already have truncated it
+        self._logger.warning(
+            dedent(
+                '''\
+                document.work_queue_document_batch_iterator:
+                WorkQueueDocumentBatchIterator._renew_lease:
+                lost the lease on range {0} to another worker:
+                abandoning the range; consider a longer lease'''
+            ).replace('\n', ' ').format(
+                range_index
+            )
+        )
+        self._output_file = None
+        self._range       = None
+
+        return False
+
+
+    def _complete_range(
+        self : WorkQueueDocumentBatchIterator
+    ) -> None:
+
+        range_index, begin_doc_index, end_doc_index = self._range
+
+        assert (
+            self._output_file.get_file_len_in_docs()
+            == end_doc_index - begin_doc_index
+        )
+
+        if not self._output_file.is_finalized():
+            self._output_file.write_cache_to_disk()
+
+        if self._work_queue.complete_range(range_index):
+            self._n_completed_ranges += 1
+        else:
+            self._logger.warning(
+                dedent(
+                    '''\
+                    document.work_queue_document_batch_iterator:
+                    WorkQueueDocumentBatchIterator._complete_range:
+                    finished range {0} after losing its lease to another worker'''
+                ).replace('\n', ' ').format(
+                    range_index
+                )
+            )
+
+        self._output_file = None
+        self._range       = None
+
+
+    def _lease_next_range(
+        self : WorkQueueDocumentBatchIterator
+    ) -> bool:
+
+        # returns False if there is no range left to lease
+
+        leased_range = self._work_queue.lease_range()
+        if leased_range is None:
+            return False
+
+        range_index, begin_doc_index, end_doc_index = leased_range
+
+        self._range                  = leased_range
+        self._heartbeat_perf_counter = time.perf_counter()
+        self._output_file = OutputFile(
+            logger                   = self._logger,
+            file_path                = WorkQueueDocumentBatchIterator.get_range_output_file_path(
+                self._output_file_path,
+                range_index
+            ),
+            predicted_statistics_key = self._predicted_statistics_key,
+            bounded_memory           = self._bounded_memory
+        )
+
+        self._logger.debug(
+            dedent(
+                '''\
+                document.work_queue_document_batch_iterator:
+                WorkQueueDocumentBatchIterator._lease_next_range:
+                leased range {0} (docs {1} to {2}),
+                of which {3} docs are already in its output file'''
+            ).replace('\n', ' ').format(
+                range_index,
+                begin_doc_index,
+                end_doc_index - 1,
+                self._output_file.get_file_len_in_docs()
+            )
+        )
+
+        # resume the output file of a range whose previous lease expired:
+        #     keep the docs up to the last complete doc batch
+        end_doc_batch_index = -1
+        for doc_index in range(self._output_file.get_file_len_in_docs()):
+
+            output_doc = self._output_file.get_output_doc_at_index(doc_index)
+
+            if (
+                end_doc_index <= begin_doc_index + doc_index
+                or output_doc.get_id()
+                    != self._input_file.get_input_doc_at_index(begin_doc_index + doc_index).get_id()
+            ):
+                self._logger.critical(
+                    dedent(
+                        '''\
+                        document.work_queue_document_batch_iterator:
+                        WorkQueueDocumentBatchIterator._lease_next_range:
+                        the output file of range {0} does not match the input file
+                        at doc {1} of the range: was the range written
+                        for a different input file or range length?'''
+                    ).replace('\n', ' ').format(
+                        range_index,
+                        doc_index
+                    )
+                )
+                sys.exit(-1)
+
+            if 'not last doc in doc batch' != output_doc.get_end_doc_batch_datetime():
+                end_doc_batch_index = doc_index
+
+        if self._output_file.is_finalized():
+            assert end_doc_batch_index + 1 == end_doc_index - begin_doc_index
+        else:
+            if end_doc_batch_index + 1 < self._output_file.get_file_len_in_docs():
+                self._logger.warning(
+                    dedent(
+                        '''\
+                        document.work_queue_document_batch_iterator:
+                        WorkQueueDocumentBatchIterator._lease_next_range:
+                        the output file of range {0} ends with an incomplete doc batch:
+                        truncating it after doc {1} of the range'''
+                    ).replace('\n', ' ').format(
+                        range_index,
+                        end_doc_batch_index
+                    )
+                )
+            self._output_file.delete_output_docs_after_index(end_doc_batch_index)
+            if end_doc_batch_index + 1 < end_doc_index - begin_doc_index:
+                self._output_file.open_for_appending()
+
+        self._next_doc_index = begin_doc_index + end_doc_batch_index + 1
+
+        return True
+
+
+    def __init__(
+        self                     : WorkQueueDocumentBatchIterator,
+        logger                   : Logger               = None,  # required
+        input_file               : InputFile            = None,  # required
+        work_queue               : WorkQueue            = None,  # required
+        output_file_path         : str                  = None,  # required
+        predicted_statistics_key : str                  = None,  # required
+        monitor                  : DocumentBatchMonitor = None,  # optional
+        doc_batch_size           : int                  = 8,     # optional
+        result_cache             : ResultCache          = None,  # optional
+        bounded_memory           : bool                 = False  # optional
+    ) -> WorkQueueDocumentBatchIterator:
+        assert isinstance(logger, Logger)
+        assert isinstance(input_file, InputFile)
+        assert isinstance(work_queue, WorkQueue)
+        assert isinstance(output_file_path, str)
+        assert isinstance(predicted_statistics_key, str)
+        if monitor is None:
+            monitor = DocumentBatchMonitor(
+                logger     = logger,
+                input_file = input_file
+            )
+        else:
+            assert isinstance(monitor, DocumentBatchMonitor)
+        assert isinstance(doc_batch_size, int)
+        assert 0 < doc_batch_size
+        assert (
+            isinstance(result_cache, ResultCache)
+            or result_cache is None
+        )
+        assert isinstance(bounded_memory, bool)
+
+        self._logger                   = logger                   ; del logger
+        self._input_file               = input_file               ; del input_file
+        self._work_queue               = work_queue               ; del work_queue
+        self._output_file_path         = output_file_path         ; del output_file_path
+        self._predicted_statistics_key = predicted_statistics_key ; del predicted_statistics_key
+        self._monitor                  = monitor                  ; del monitor
+        self._doc_batch_size           = doc_batch_size           ; del doc_batch_size
+        self._result_cache             = result_cache             ; del result_cache
+        self._bounded_memory           = bounded_memory           ; del bounded_memory
+
+        # (range_index, begin_doc_index, end_doc_index) of the leased range
+        #     and the output file it is written to
+        self._range                  = None
+        self._output_file            = None
+        self._next_doc_index         = None
+        self._heartbeat_perf_counter = None
+        self._n_completed_ranges     = 0
+
+        # the doc batch handed out last
+        self._last_doc_batch = None
@@ -0,0 +1,479 @@
+from __future__ import annotations
+import os
+import sys
+import mmap
+import struct
+import shutil
+from textwrap import dedent
+from logging import Logger
+from typing import Iterable
+
+from ..document.document import Document
+
+
+class InputCache:
+
+    #######################################################
+    #### on-disk layout
+    ####
+    #### the cache file consists of a fixed-width header,
+    ####     a table of fixed-width doc records, a table of
+    ####     fixed-width truncation records, a table of
+    ####     fixed-width sent records, and a single blob of
+    ####     utf-8 text; the records hold byte offsets into
+    ####     the blob, so the file can be memory-mapped and
+    ####     a doc is only decoded, from slices of the blob,
+    ####     when it is accessed
+    ####
+    #### a sent that occurs verbatim in the full text of
+    ####     its doc, which is the common case, points into
+    ####     the doc's full text instead of being stored
+    ####     a second time
+    ####
+    #### the sents are stored untruncated, so that one cache
+    ####     serves any max sent len: the truncation records
+    ####     list the docs by the length of their longest
+    ####     sent, longest first, so the docs that a max sent
+    ####     len truncates are a prefix of the table, and only
+    ####     those are decoded when the cache is opened, to
+    ####     recount their lengths
+
+    _MAGIC = b'DBINCH03'
+
+    # magic, file_len_in_docs, file_len_in_sents,
+    #     file_len_in_words, file_len_in_chars,
+    #     all of the untruncated sents
+    _HEADER_STRUCT = struct.Struct('<8sQQQQ')
+
+    # doc id byte offset, doc id byte length,
+    #     full text byte offset, full text byte length,
+    #     index of first sent record, len_in_sents,
+    #     len_in_words, len_in_chars,
+    #     index of the doc id json key, padding
+    _DOC_RECORD_STRUCT = struct.Struct('<QIQIQIIIB3x')
+
+    # len in chars of the longest sent of the doc, doc index
+    _TRUNCATION_RECORD_STRUCT = struct.Struct('<QQ')
+
+    # sent byte offset, sent byte length
+    _SENT_RECORD_STRUCT = struct.Struct('<QI')
+
+
+    #######################################################
+    #### write the cache for a stream of untruncated input
+    ####     docs; only the fixed-width records are held in
+    ####     memory, the blob is written to a temporary file
+    ####     as the docs arrive
+
+    @staticmethod
+    def write_to_disk(
+        cache_file_path : str,
+        docs            : Iterable[Document]
+    ) -> tuple[int, int, int, int]:
+        # returns file_len_in_docs, file_len_in_sents,
+        #     file_len_in_words and file_len_in_chars
+        assert isinstance(cache_file_path, str)
+
+        doc_records  = bytearray()
+        sent_records = bytearray()
+        max_sent_lens_in_chars = []
+        n_docs  = 0
+        n_sents = 0
+        n_words = 0
+        n_chars = 0
+
+        # the temporary files are per process, so that a process that
+        #     builds the cache without holding the lock cannot clobber them
+        tmp_blob_file_path  = '{0}.{1}.blob.tmp'.format(cache_file_path, os.getpid())
+        tmp_cache_file_path = '{0}.{1}.tmp'.format(cache_file_path, os.getpid())
+        with open(tmp_blob_file_path, 'wb') as blob_file:
+            blob_len = 0
+            for doc in docs:
+                assert 0 == doc.get_n_truncated_sents()
+                id_bytes   = doc.get_id().encode('utf-8')
+                text_bytes = doc.get_full_text().encode('utf-8')
+                id_offset   = blob_len
+                text_offset = blob_len + len(id_bytes)
+                blob_file.write(id_bytes)
+                blob_file.write(text_bytes)
+                blob_len += len(id_bytes) + len(text_bytes)
+
+                text_cursor = 0
+                for sent in doc.get_list_of_sents():
+                    sent_bytes = sent.encode('utf-8')
+                    sent_index = text_bytes.find(sent_bytes, text_cursor)
+                    if -1 == sent_index:
+                        sent_index = text_bytes.find(sent_bytes)
+                    if -1 == sent_index:
+                        sent_offset = blob_len
+                        blob_file.write(sent_bytes)
+                        blob_len += len(sent_bytes)
+                    else:
+                        sent_offset = text_offset + sent_index
+                        text_cursor = sent_index + len(sent_bytes)
+                    sent_records += InputCache._SENT_RECORD_STRUCT.pack(
+                        sent_offset,
+                        len(sent_bytes)
+                    )
+
+                doc_records += InputCache._DOC_RECORD_STRUCT.pack(
+                    id_offset,
+                    len(id_bytes),
+                    text_offset,
+                    len(text_bytes),
+                    n_sents,
+                    doc.get_len_in_sents(),
+                    doc.get_len_in_words(),
+                    doc.get_len_in_chars(),
+                    doc.get_id_key_index()
+                )
+                max_sent_lens_in_chars.append(
+                    max(len(sent) for sent in doc.get_list_of_sents())
+                )
+                n_docs  += 1
+                n_sents += doc.get_len_in_sents()
+                n_words += doc.get_len_in_words()
+                n_chars += doc.get_len_in_chars()
+        assert 0 < n_docs
+
+        truncation_records = bytearray()
+        for doc_index in sorted(
+            range(n_docs),
+            key = lambda doc_index: -max_sent_lens_in_chars[doc_index]
+        ):
+            truncation_records += InputCache._TRUNCATION_RECORD_STRUCT.pack(
+                max_sent_lens_in_chars[doc_index],
+                doc_index
+            )
+        del max_sent_lens_in_chars
+
+        # write to a temporary file first so that an interrupted write
+        #     never leaves a truncated cache next to the input file
+        with open(tmp_cache_file_path, 'wb') as cache_file:
+            cache_file.write(
+                InputCache._HEADER_STRUCT.pack(
+                    InputCache._MAGIC,
+                    n_docs,
+                    n_sents,
+                    n_words,
+                    n_chars
+                )
+            )
+            cache_file.write(doc_records)
+            cache_file.write(truncation_records)
+            cache_file.write(sent_records)
+            with open(tmp_blob_file_path, 'rb') as blob_file:
+                shutil.copyfileobj(blob_file, cache_file)
+            cache_file.flush()
+            os.fsync(cache_file.fileno())
+        os.remove(tmp_blob_file_path)
+        os.replace(tmp_cache_file_path, cache_file_path)
+
+        return n_docs, n_sents, n_words, n_chars
+
+
+    #######################################################
+    #### read only the header, e.g. to report the length
+    ####     of an input file without mapping its cache
+
+    @staticmethod
+    def read_header(
+        cache_file_path : str
+    ) -> tuple[int, int, int, int] | None:
+        # returns file_len_in_docs, file_len_in_sents, file_len_in_words
+        #     and file_len_in_chars of the untruncated sents, or None if
+        #     there is no cache file in the current format
+        if not os.path.isfile(cache_file_path):
+            return None
+        with open(cache_file_path, 'rb') as cache_file:
+            header_bytes = cache_file.read(InputCache._HEADER_STRUCT.size)
+        if len(header_bytes) < InputCache._HEADER_STRUCT.size:
+            return None
+        magic, *header = InputCache._HEADER_STRUCT.unpack(header_bytes)
+        if InputCache._MAGIC != magic:
+            return None
+        return tuple(header)
+
+
+    #######################################################
+    #### constructor; memory-maps the cache file and
+    ####     decodes only the docs with a sent longer than
+    ####     the max sent len; the mapping is shared and
+    ####     read-only, so all processes on a node that open
+    ####     the same cache file share its pages in the page
+    ####     cache (or in memory, for a file in /dev/shm)
+
+    def __init__(
+        self                  : InputCache,
+        logger                : Logger = None, # required
+        cache_file_path       : str    = None, # required
+        max_sent_len_in_chars : int    = None  # required
+    ) -> InputCache:
+        assert isinstance(logger, Logger)
+        assert os.path.isfile(cache_file_path)
+        assert isinstance(max_sent_len_in_chars, int)
+        assert 0 < max_sent_len_in_chars
+
+        self._logger                = logger                ; del logger
+        self._cache_file_path       = cache_file_path       ; del cache_file_path
+        self._max_sent_len_in_chars = max_sent_len_in_chars ; del max_sent_len_in_chars
+
+        with open(self._cache_file_path, 'rb') as cache_file:
+            self._mmap = mmap.mmap(
+                cache_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        self._buffer = memoryview(self._mmap)
+
+        (
+            magic,
+            self._file_len_in_docs,
+            self._file_len_in_sents,
+            self._file_len_in_words,
+            self._file_len_in_chars
+        ) = InputCache._HEADER_STRUCT.unpack_from(self._buffer, 0)
+
+        self._doc_records_offset        = InputCache._HEADER_STRUCT.size
+        self._truncation_records_offset = (
+            self._doc_records_offset
+            + self._file_len_in_docs * InputCache._DOC_RECORD_STRUCT.size
+        )
+        self._sent_records_offset = (
+            self._truncation_records_offset
+            + self._file_len_in_docs * InputCache._TRUNCATION_RECORD_STRUCT.size
+        )
+        self._blob_offset = (
+            self._sent_records_offset
+            + self._file_len_in_sents * InputCache._SENT_RECORD_STRUCT.size
+        )
+
+        if (
+            InputCache._MAGIC != magic
+            or len(self._buffer) < self._blob_offset
+        ):
+            self._logger.critical(
+                dedent(
+                    '''\
+                    io.input_cache: InputCache.__init__:
+                    the cache file {0} is corrupted or has an unknown format:
+                    delete it and rerun to regenerate it'''
+                ).replace('\n', ' ').format(
+                    self._cache_file_path
+                )
+            )
+            sys.exit(-1)
+
+        self._truncate()
+
+
+    #######################################################
+    #### apply the max sent len: recount the lengths of the
+    ####     docs it truncates, and the file lengths
+
+    def _get_truncation_record_at_index(
+        self         : InputCache,
+        record_index : int
+    ) -> tuple[int, int]:
+        return InputCache._TRUNCATION_RECORD_STRUCT.unpack_from(
+            self._buffer,
+            self._truncation_records_offset
+            + record_index * InputCache._TRUNCATION_RECORD_STRUCT.size
+        )
+
+    def _truncate(self : InputCache) -> None:
+        # binary search for the number of docs with a sent longer than
+        #     the max sent len, which come first in the truncation records
+        n_truncated_docs = 0
+        end_record_index = self._file_len_in_docs
+        while n_truncated_docs < end_record_index:
+            record_index = (n_truncated_docs + end_record_index) // 2
+            max_sent_len_in_chars, _ = self._get_truncation_record_at_index(record_index)
+            if self._max_sent_len_in_chars < max_sent_len_in_chars:
+                n_truncated_docs = record_index + 1
+            else:
+                end_record_index = record_index
+
+        # len_in_words and len_in_chars of the truncated docs, by doc index
+        self._truncated_doc_lens = dict()
+        self._n_truncated_sents  = 0
+        for record_index in range(n_truncated_docs):
+            _, doc_index = self._get_truncation_record_at_index(record_index)
+            len_in_words = 0
+            len_in_chars = 0
+            for sent in self._get_list_of_sents_at_index(doc_index):
+                if self._max_sent_len_in_chars < len(sent):
+                    self._n_truncated_sents += 1
+                    sent = sent[:self._max_sent_len_in_chars]
+                len_in_words += len(sent.split())
+                len_in_chars += len(sent)
+            (
+                _,
+                _,
+                untruncated_len_in_words,
+                untruncated_len_in_chars
+            ) = self._get_record_lens_at_index(doc_index)
+            self._file_len_in_words -= untruncated_len_in_words - len_in_words
+            self._file_len_in_chars -= untruncated_len_in_chars - len_in_chars
+            self._truncated_doc_lens[doc_index] = (len_in_words, len_in_chars)
+
+
+    #######################################################
+    #### file length statistics, read from the header and
+    ####     adjusted for the max sent len
+
+    def get_max_sent_len_in_chars(self : InputCache) -> int:
+        return self._max_sent_len_in_chars
+
+    def get_n_truncated_sents(self : InputCache) -> int:
+        return self._n_truncated_sents
+
+    def get_n_truncated_docs(self : InputCache) -> int:
+        return len(self._truncated_doc_lens)
+
+    def get_file_len_in_docs(self : InputCache) -> int:
+        return self._file_len_in_docs
+
+    def get_file_len_in_sents(self : InputCache) -> int:
+        return self._file_len_in_sents
+
+    def get_file_len_in_words(self : InputCache) -> int:
+        return self._file_len_in_words
+
+    def get_file_len_in_chars(self : InputCache) -> int:
+        return self._file_len_in_chars
+
+
+    #######################################################
+    #### lazily decoded docs; the input cache behaves like
+    ####     a read-only list of Document objects
+
+    def _get_str(
+        self        : InputCache,
+        byte_offset : int,
+        byte_len    : int
+    ) -> str:
+        begin = self._blob_offset + byte_offset
+        return str(self._buffer[begin:begin+byte_len], 'utf-8')
+
+    def _get_doc_record_at_index(
+        self      : InputCache,
+        doc_index : int
+    ) -> tuple:
+        return InputCache._DOC_RECORD_STRUCT.unpack_from(
+            self._buffer,
+            self._doc_records_offset
+            + doc_index * InputCache._DOC_RECORD_STRUCT.size
+        )
+
+    def _get_record_lens_at_index(
+        self      : InputCache,
+        doc_index : int
+    ) -> tuple[int, int, int, int]:
+        # first sent index, len_in_sents, and the untruncated
+        #     len_in_words and len_in_chars of a doc
+        (
+            id_offset,
+            id_len,
+            text_offset,
+            text_len,
+            first_sent_index,
+            len_in_sents,
+            len_in_words,
+            len_in_chars,
+            id_key_index
+        ) = self._get_doc_record_at_index(doc_index)
+        return first_sent_index, len_in_sents, len_in_words, len_in_chars
+
+    def _get_list_of_sents_at_index(
+        self      : InputCache,
+        doc_index : int
+    ) -> list[str]:
+        # the untruncated sents of a doc
+        first_sent_index, len_in_sents, _, _ = self._get_record_lens_at_index(doc_index)
+        return [
+            self._get_str(*sent_record)
+            for sent_record in InputCache._SENT_RECORD_STRUCT.iter_unpack(
+                self._buffer[
+                    self._sent_records_offset
+                    + first_sent_index * InputCache._SENT_RECORD_STRUCT.size
+                    :
+                    self._sent_records_offset
+                    + (first_sent_index + len_in_sents) * InputCache._SENT_RECORD_STRUCT.size
+                ]
+            )
+        ]
+
+    def get_doc_metadata_at_index(
+        self      : InputCache,
+        doc_index : int
+    ) -> tuple[str, int, int, int]:
+        # the doc id, len_in_sents, len_in_words and len_in_chars of a doc,
+        #     without decoding its text or sents
+        (
+            id_offset,
+            id_len,
+            text_offset,
+            text_len,
+            first_sent_index,
+            len_in_sents,
+            len_in_words,
+            len_in_chars,
+            id_key_index
+        ) = self._get_doc_record_at_index(doc_index)
+        if doc_index in self._truncated_doc_lens:
+            len_in_words, len_in_chars = self._truncated_doc_lens[doc_index]
+        return (
+            self._get_str(id_offset, id_len),
+            len_in_sents,
+            len_in_words,
+            len_in_chars
+        )
+
+    def get_input_doc_at_index(
+        self      : InputCache,
+        doc_index : int
+    ) -> Document:
+        assert 0 <= doc_index and doc_index < self._file_len_in_docs, \
+            'doc_index is {0} but should be in the interval [0, {1}]' \
+            .format(
+                doc_index,
+                self._file_len_in_docs - 1
+            )
+        (
+            id_offset,
+            id_len,
+            text_offset,
+            text_len,
+            first_sent_index,
+            len_in_sents,
+            len_in_words,
+            len_in_chars,
+            id_key_index
+        ) = self._get_doc_record_at_index(doc_index)
+        return Document.from_input_cache(
+            logger                = self._logger,
+            id_key_index          = id_key_index,
+            doc_id                = self._get_str(id_offset, id_len),
+            full_text             = self._get_str(text_offset, text_len),
+            list_of_sents         = self._get_list_of_sents_at_index(doc_index),
+            len_in_words          = len_in_words,
+            len_in_chars          = len_in_chars,
+            max_sent_len_in_chars = self._max_sent_len_in_chars
+        )
+
+    def __len__(self : InputCache) -> int:
+        return self._file_len_in_docs
+
+    def __getitem__(
+        self      : InputCache,
+        doc_index : int
+    ) -> Document:
+        assert isinstance(doc_index, int)
+        return self.get_input_doc_at_index(doc_index)
+
+    def __iter__(self : InputCache):
+        for doc_index in range(self._file_len_in_docs):
+            yield self.get_input_doc_at_index(doc_index)
+
+    def close(self : InputCache) -> None:
+        self._buffer.release()
+        self._mmap.close()
@@ -1,11 +1,24 @@
 from __future__ import annotations
 import os
+import sys
 import json
+import logging
 from textwrap import dedent
 from logging import Logger
-import pickle
+import hashlib
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl # not available on windows
+except ImportError:
+    fcntl = None
 
 from ..document.document import Document
+from .input_cache import InputCache
+from .input_selection import InputSelection, SelectedInputDocs
+from ..validation import Validation
+from ..resource_usage import ResourceUsage
 
 
 class InputFile:
@@ -22,7 +35,8 @@ class InputFile:
         self._logger = logger
     
     def _get_logger(self : InputFile) -> Logger:
-        assert isinstance(self._logger, Logger)
+        if Validation.full:
+            assert isinstance(self._logger, Logger)
         return self._logger
     
     
@@ -41,16 +55,18 @@ class InputFile:
     def _get_file_path(
         self : InputFile
     ) -> None:
-        assert isinstance(self._file_path, str)
-        assert os.path.isfile(self._file_path)
+        if Validation.full:
+            assert isinstance(self._file_path, str)
+            assert os.path.isfile(self._file_path)
         return self._file_path
     
     
     #######################################################
     #### file path manipulations; cache file path
     
-    def get_file_path_without_suffix(self : OutputFile) -> str:
-        file_name = os.path.basename(self._get_file_path())
+    @staticmethod
+    def _get_file_path_without_suffix_of(file_path : str) -> str:
+        file_name = os.path.basename(file_path)
         suffix_index = file_name.rfind('.')
         if 0 < suffix_index: # we want to make the base file name have a length
                              # of at least one character
@@ -58,15 +74,125 @@ class InputFile:
         else:
             base = file_name
         return os.path.join(
-            os.path.dirname(self._get_file_path()),
+            os.path.dirname(file_path),
             base
         )
     
+    def get_file_path_without_suffix(self : OutputFile) -> str:
+        return InputFile._get_file_path_without_suffix_of(self._get_file_path())
+    
     def _get_cache_file_path(self : InputFile) -> str:
         return \
             self.get_file_path_without_suffix() \
             + '.input_file_cache_v1.pickle'
     
+    @staticmethod
+    def get_mmap_cache_file_path_of(
+        file_path      : str,
+        cache_dir_path : str | None = None,
+        version        : int        = 3
+    ) -> str:
+        # the cache file path of an input file, without constructing
+        #     the InputFile (which would load or build the cache);
+        #     version 2 is only used to remove the caches of earlier versions
+        assert version in [2, 3]
+        if cache_dir_path is None:
+            return \
+                InputFile._get_file_path_without_suffix_of(file_path) \
+                + '.input_file_cache_v{0}.mmap'.format(version)
+        # input files with the same name in different dirs
+        #     must not share a cache file
+        return os.path.join(
+            cache_dir_path,
+            '{0}.{1}.input_file_cache_v{2}.mmap'.format(
+                os.path.basename(
+                    InputFile._get_file_path_without_suffix_of(file_path)
+                ),
+                hashlib.blake2b(
+                    os.path.abspath(file_path).encode('utf-8'),
+                    digest_size = 8
+                ).hexdigest(),
+                version
+            )
+        )
+    
+    def _get_mmap_cache_file_path(self : InputFile) -> str:
+        return InputFile.get_mmap_cache_file_path_of(
+            self._get_file_path(),
+            self._get_cache_dir_path()
+        )
+    
+    def _remove_earlier_version_caches(self : InputFile) -> None:
+        # the v1 pickle and the v2 cache (with its lock file) are as large
+        #     as the input file and are never read again once the v3 cache
+        #     exists; a process that still has a v2 cache memory-mapped
+        #     keeps its copy until it unmaps it
+        v2_cache_file_path = InputFile.get_mmap_cache_file_path_of(
+            self._get_file_path(),
+            self._get_cache_dir_path(),
+            version = 2
+        )
+        for cache_file_path in [
+            self._get_cache_file_path(),
+            v2_cache_file_path,
+            v2_cache_file_path + '.lock'
+        ]:
+            try:
+                os.remove(cache_file_path)
+            except FileNotFoundError:
+                # not there, or removed by another process meanwhile
+                continue
+            self._get_logger().info(
+                dedent(
+                    '''\
+                    io.input_file: InputFile._remove_earlier_version_caches:
+                    removed {0}, a file of the input file cache of an earlier version,
+                    which is replaced by the v3 cache'''
+                ).replace('\n', ' ').format(
+                    cache_file_path
+                )
+                )
+    
+    
+    #######################################################
+    #### cache dir path; by default, the cache file is
+    ####     placed next to the input file; pointing it to
+    ####     a node-local dir such as /dev/shm lets all
+    ####     processes on a node share one copy in memory
+    
+    def _set_cache_dir_path(
+        self           : InputFile,
+        cache_dir_path : str | None
+    ) -> None:
+        assert not hasattr(self, '_cache_dir_path')
+        assert (
+            cache_dir_path is None
+            or os.path.isdir(cache_dir_path)
+        )
+        self._cache_dir_path = cache_dir_path
+    
+    def _get_cache_dir_path(self : InputFile) -> str | None:
+        return self._cache_dir_path
+    
+    
+    #######################################################
+    #### exclusive lock for building the v3 cache, so that
+    ####     when several processes start on the same input
+    ####     file at once, only the first builds the cache
+    ####     and the others wait for it and then attach to it
+    
+    @contextmanager
+    def _lock_mmap_cache(self : InputFile) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(self._get_mmap_cache_file_path() + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    
     
     #######################################################
     #### enforced maximum sentence length in characters
@@ -83,11 +209,19 @@ class InputFile:
     def _get_max_sent_len_in_chars(
         self : InputFile
     ) -> int:
-        assert isinstance(self._max_sent_len_in_chars, int)
-        assert 0 < self._max_sent_len_in_chars
+        if Validation.full:
+            assert isinstance(self._max_sent_len_in_chars, int)
+            assert 0 < self._max_sent_len_in_chars
         return self._max_sent_len_in_chars
     
     
+    _INITIALIZING_INPUT_DOC_MESSAGE = dedent(
+        '''\
+        io.input_file: InputFile.__init__:
+        initializing input doc {0} (of {1})'''
+    ).replace('\n', ' ')
+    
+    
     #######################################################
     #### constructor
     
@@ -96,11 +230,18 @@ class InputFile:
         logger                   : Logger     = None,                   # required
         file_path                : str        = None,                   # required
         max_sent_len_in_chars    : int        = 2048,                   # optional
+        cache_dir_path           : str        = None,                   # optional
+        selection                : InputSelection = None                # optional
     ) -> InputFile:
+        assert (
+            isinstance(selection, InputSelection)
+            or selection is None
+        )
         
         self._set_logger(logger)                                    ; del logger
         self._set_file_path(file_path)                              ; del file_path
         self._set_max_sent_len_in_chars(max_sent_len_in_chars)      ; del max_sent_len_in_chars
+        self._set_cache_dir_path(cache_dir_path)                    ; del cache_dir_path
         
         self._get_logger().debug(
             'io.input_file: InputFile.__init__: file_path: {0}'
@@ -112,140 +253,138 @@ class InputFile:
         
         #########################################
         ## load the cache file if it exists;
-        ## otherwise, build it
+        ## otherwise, build it;
+        ## the v3 cache is memory-mapped and its
+        ## docs are only decoded when they are
+        ## reached; it holds the untruncated sents,
+        ## so it is shared by every max sent len;
+        ## the v1 pickle and the v2 cache of earlier
+        ## versions, whose sents were truncated when
+        ## they were built, are not read: they are
+        ## rebuilt as a v3 cache and then removed
         
-        if (
-            os.path.isfile(self._get_cache_file_path())
-            and 0 == os.path.getsize(self._get_cache_file_path())
-        ):
-            os.remove(self._get_cache_file_path())
+        for cache_file_path in [
+            self._get_mmap_cache_file_path(),
+            self._get_cache_file_path()
+        ]:
+            if (
+                os.path.isfile(cache_file_path)
+                and 0 == os.path.getsize(cache_file_path)
+            ):
+                os.remove(cache_file_path)
         
         self._cache = {}
         
-        if os.path.isfile(self._get_cache_file_path()) is True:
-
-            self._get_logger().debug(
-                dedent(
-                    '''\
-                    io.input_file: InputFile.__init__:
-                    load input file cache: begin'''
-                ).replace('\n', ' ')
-            )
-            
-            with open(self._get_cache_file_path(), 'rb') as cache_file:
-                self._cache = pickle.load(cache_file)
-                del cache_file
-            assert isinstance(self._cache, dict)
-            assert 0 < len(self._cache)
+        if os.path.isfile(self._get_mmap_cache_file_path()) is True:
             
-            self._get_logger().debug(
-                dedent(
-                    '''\
-                    io.input_file: InputFile.__init__:
-                    load input file cache: end'''
-                ).replace('\n', ' ')
-            )
+            with ResourceUsage.log_phase(
+                self._get_logger(),
+                'io.input_file: InputFile.__init__: open input file cache'
+            ):
+                self._read_mmap_cache_from_disk()
             
         else:
             
-            assert os.path.isfile(self._get_cache_file_path()) is False
-            
-            self._get_logger().debug(
-                dedent(
-                    '''\
-                    io.input_file: InputFile.__init__:
-                    read the input file into memory: begin'''
-                ).replace('\n', ' ')
-            )
-            
-            doc_dicts = []
-            with open(self._get_file_path(), 'r') as file:
-                doc_dicts = [
-                    json.loads(doc_json_str)
-                    for doc_json_str
-                    in file.read().strip().splitlines()
-                ]
-            assert 0 < len(doc_dicts)
-            
-            self._get_logger().debug(
-                dedent(
-                    '''\
-                    io.input_file: InputFile.__init__:
-                    read the input file into memory: end'''
-                ).replace('\n', ' ')
-            )
-            
-            self._get_logger().debug(
-                dedent(
-                    '''\
-                    io.input_file: InputFile.__init__:
-                    generate input file cache: begin'''
-                ).replace('\n', ' ')
-            )
-            
-            self._cache['docs'] = []
-            self._cache['file_len_in_sents'] = 0
-            self._cache['file_len_in_words'] = 0
-            self._cache['file_len_in_chars'] = 0
-            
-            for doc_index, doc_dict in enumerate(doc_dicts):
+            with self._lock_mmap_cache():
                 
-                if (
-                    0 == doc_index
-                    or 0 == (doc_index+1)%100
-                    or doc_index+1 == len(doc_dicts)
-                ):
+                if os.path.isfile(self._get_mmap_cache_file_path()) is True:
+                    
+                    # built by another process while this one waited
                     self._get_logger().debug(
                         dedent(
                             '''\
                             io.input_file: InputFile.__init__:
-                            initializing input doc {0} (of {1})'''
-                        ).replace('\n', ' ').format(
-                            doc_index + 1,
-                            len(doc_dicts)
-                        )
+                            the input file cache was built by another process'''
+                        ).replace('\n', ' ')
                     )
-
-                doc = Document.from_input_doc_dict(
-                    logger                   = self._get_logger(),
-                    input_doc_dict           = doc_dict,
-                    max_sent_len_in_chars    = self._get_max_sent_len_in_chars()
-                )
-                
-                self._cache['docs'].append(doc)
-                
-                self._cache['file_len_in_sents'] += doc.get_len_in_sents()
-                self._cache['file_len_in_words'] += doc.get_len_in_words()
-                self._cache['file_len_in_chars'] += doc.get_len_in_chars()
                 
-            
-            self._get_logger().debug(
-                dedent(
-                    '''\
-                    io.input_file: InputFile.__init__:
-                    generate input file cache: end'''
-                ).replace('\n', ' ')
-            )
-            
-            self._get_logger().debug(
-                dedent(
-                    '''\
-                    io.input_file: InputFile.__init__:
-                    write input file cache to file: begin'''
-                ).replace('\n', ' ')
-            )
-            
-            with open(self._get_cache_file_path(), 'wb') as cache_file:
-                pickle.dump(self._cache, cache_file)
-                del cache_file
+                else:
+                    
+                    self._get_logger().debug(
+                        dedent(
+                            '''\
+                            io.input_file: InputFile.__init__:
+                            read the input file into memory: begin'''
+                        ).replace('\n', ' ')
+                    )
+                    
+                    doc_dicts = []
+                    with open(self._get_file_path(), 'r') as file:
+                        doc_dicts = [
+                            json.loads(doc_json_str)
+                            for doc_json_str
+                            in file.read().strip().splitlines()
+                        ]
+                    assert 0 < len(doc_dicts)
+                    
+                    self._get_logger().debug(
+                        dedent(
+                            '''\
+                            io.input_file: InputFile.__init__:
+                            read the input file into memory: end'''
+                        ).replace('\n', ' ')
+                    )
+                    
+                    self._get_logger().debug(
+                        dedent(
+                            '''\
+                            io.input_file: InputFile.__init__:
+                            generate input file cache: begin'''
+                        ).replace('\n', ' ')
+                    )
+                    
+                    is_debug_enabled = self._get_logger().isEnabledFor(logging.DEBUG)
+                    
+                    def generate_docs():
+                        for doc_index, doc_dict in enumerate(doc_dicts):
+                            
+                            if is_debug_enabled and (
+                                0 == doc_index
+                                or 0 == (doc_index+1)%100
+                                or doc_index+1 == len(doc_dicts)
+                            ):
+                                self._get_logger().debug(
+                                    InputFile._INITIALIZING_INPUT_DOC_MESSAGE.format(
+                                        doc_index + 1,
+                                        len(doc_dicts)
+                                    )
+                                )
 
-            self._get_logger().debug(
-                dedent(
-                    '''\
-                    io.input_file: InputFile.__init__:
-                    write input file cache to file: end'''
-                ).replace('\n', ' ')
-            )
+                            # the sents are truncated when the cache is read
+                            yield Document.from_input_doc_dict(
+                                logger                   = self._get_logger(),
+                                input_doc_dict           = doc_dict,
+                                max_sent_len_in_chars    = None
+                            )
+                    
+                    # the docs are written to the cache as they are generated
+                    #     rather than all being kept in memory
+                    with ResourceUsage.log_phase(
+                        self._get_logger(),
+                        'io.input_file: InputFile.__init__: generate and write input file cache'
+                    ):
+                        InputCache.write_to_disk(
+                            cache_file_path = self._get_mmap_cache_file_path(),
+                            docs            = generate_docs()
+                        )
+                    del doc_dicts
+                    
+                    self._get_logger().debug(
+                        dedent(
+                            '''\
+                            io.input_file: InputFile.__init__:
+                            generate input file cache: end'''
+                        ).replace('\n', ' ')
+                    )
+            
+            self._read_mmap_cache_from_disk()
+        
+        self._remove_earlier_version_caches()
+        
+        
+        if selection is not None:
+            self._select(selection)
+        del selection
 
 
         self._get_logger().debug(
@@ -276,6 +415,102 @@ class InputFile:
         self._next_doc_index = 0
     
     
+    #######################################################
+    #### memory-map the v3 cache; docs are decoded lazily
+    
+    def _read_mmap_cache_from_disk(self : InputFile) -> None:
+        input_cache = InputCache(
+            logger                = self._get_logger(),
+            cache_file_path       = self._get_mmap_cache_file_path(),
+            max_sent_len_in_chars = self._get_max_sent_len_in_chars()
+        )
+        if 0 < input_cache.get_n_truncated_sents():
+            self._get_logger().info(
+                dedent(
+                    '''\
+                    io.input_file: InputFile.__init__:
+                    {0} sents in {1} docs are truncated to {2} chars:
+                    the truncation threshold can be adjusted with the option
+                    "--max-sent-len-in-chars len"'''
+                ).replace('\n', ' ').format(
+                    input_cache.get_n_truncated_sents(),
+                    input_cache.get_n_truncated_docs(),
+                    self._get_max_sent_len_in_chars()
+                )
+            )
+        self._cache = dict()
+        self._cache['docs'] = input_cache
+        self._cache['file_len_in_sents'] = input_cache.get_file_len_in_sents()
+        self._cache['file_len_in_words'] = input_cache.get_file_len_in_words()
+        self._cache['file_len_in_chars'] = input_cache.get_file_len_in_chars()
+    
+    
+    #######################################################
+    #### restrict the input file to a selection of its docs;
+    ####     the cache itself is left as it is
+    
+    def _select(
+        self      : InputFile,
+        selection : InputSelection
+    ) -> None:
+        file_len_in_docs = self.get_file_len_in_docs()
+        
+        with ResourceUsage.log_phase(
+            self._get_logger(),
+            'io.input_file: InputFile.__init__: resolve selection'
+        ):
+            selected_docs = selection.select(self._cache['docs'])
+        
+        if 0 == len(selected_docs):
+            self._get_logger().critical(
+                dedent(
+                    '''\
+                    io.input_file: InputFile.__init__:
+                    the selection matches none of the {0} docs
+                    of the input file {1}'''
+                ).replace('\n', ' ').format(
+                    file_len_in_docs,
+                    self._get_file_path()
+                )
+            )
+            sys.exit(-1)
+        
+        self._cache = dict(self._cache)
+        self._cache['docs'] = selected_docs
+        (
+            self._cache['file_len_in_sents'],
+            self._cache['file_len_in_words'],
+            self._cache['file_len_in_chars']
+        ) = selected_docs.get_file_len_in_sents_words_chars()
+        
+        self._get_logger().info(
+            dedent(
+                '''\
+                io.input_file: InputFile.__init__:
+                selected {0} of the {1} docs of the input file'''
+            ).replace('\n', ' ').format(
+                len(selected_docs),
+                file_len_in_docs
+            )
+        )
+        if (
+            selection.get_doc_ids() is not None
+            and len(selected_docs) < len(selection.get_doc_ids())
+        ):
+            self._get_logger().warning(
+                dedent(
+                    '''\
+                    io.input_file: InputFile.__init__:
+                    {0} of the {1} selected doc ids
+                    were not selected: they are not in the input file
+                    or do not match the other criteria of the selection'''
+                ).replace('\n', ' ').format(
+                    len(selection.get_doc_ids()) - len(selected_docs),
+                    len(selection.get_doc_ids())
+                )
+            )
+    
+    
     #######################################################
     #### get file length statistics
     
@@ -283,18 +518,21 @@ class InputFile:
         return len(self._cache['docs'])
     
     def get_file_len_in_sents(self : InputFile) -> int:
-        assert isinstance(self._cache['file_len_in_sents'], int)
-        assert 0 <= self._cache['file_len_in_sents']
+        if Validation.full:
+            assert isinstance(self._cache['file_len_in_sents'], int)
+            assert 0 <= self._cache['file_len_in_sents']
         return self._cache['file_len_in_sents']
     
     def get_file_len_in_words(self : InputFile) -> int:
-        assert isinstance(self._cache['file_len_in_words'], int)
-        assert 0 <= self._cache['file_len_in_words']
+        if Validation.full:
+            assert isinstance(self._cache['file_len_in_words'], int)
+            assert 0 <= self._cache['file_len_in_words']
         return self._cache['file_len_in_words']
     
     def get_file_len_in_chars(self : InputFile) -> int:
-        assert isinstance(self._cache['file_len_in_chars'], int)
-        assert 0 <= self._cache['file_len_in_chars']
+        if Validation.full:
+            assert isinstance(self._cache['file_len_in_chars'], int)
+            assert 0 <= self._cache['file_len_in_chars']
         return self._cache['file_len_in_chars']
 
 
@@ -303,15 +541,50 @@ class InputFile:
     ####     which has already been loaded into the cache
     
     def get_next_input_doc(self : InputFile) -> Document:
-        assert 0 <= self._next_doc_index
-        assert self._next_doc_index < self.get_file_len_in_docs()
+        if Validation.full:
+            assert 0 <= self._next_doc_index
+            assert self._next_doc_index < self.get_file_len_in_docs()
         input_doc = self._cache['docs'][self._next_doc_index]
         self._next_doc_index += 1
         return input_doc
     
+    def get_input_doc_at_index(
+        self      : InputFile,
+        doc_index : int
+    ) -> Document:
+        # random access, independent of the next input doc index
+        assert 0 <= doc_index and doc_index < self.get_file_len_in_docs(), \
+            'doc_index is {0} but should be in the interval [0, {1}]' \
+            .format(
+                doc_index,
+                self.get_file_len_in_docs() - 1
+            )
+        return self._cache['docs'][doc_index]
+    
+    def get_doc_index_in_file(
+        self      : InputFile,
+        doc_index : int
+    ) -> int:
+        # the index of a (selected) doc among all docs of the input file
+        if isinstance(self._cache['docs'], SelectedInputDocs):
+            return self._cache['docs'].get_doc_index_in_file(doc_index)
+        return doc_index
+    
     def has_next_input_doc(self : InputFile) -> bool:
         return self._next_doc_index < self.get_file_len_in_docs()
     
+    def skip_input_docs(
+        self   : InputFile,
+        n_docs : int
+    ) -> None:
+        # skip the first n_docs docs, which are already in the completed
+        #     segments of a SegmentedOutputFile
+        assert 0 == self._next_doc_index, \
+            'the docs to skip must be set before the input file is read'
+        assert 0 <= n_docs
+        assert n_docs <= self.get_file_len_in_docs()
+        self._next_doc_index = n_docs
+    
     def set_next_input_doc_index(
         self      : InputFile,
         doc_index : int
@@ -0,0 +1,178 @@
+from __future__ import annotations
+from array import array
+from typing import Callable, Iterable, Iterator
+
+from ..document.document import Document
+from .input_cache import InputCache
+
+
+class InputSelection:
+
+    #######################################################
+    #### selects a subsequence of the docs of an input
+    ####     file, e.g. to rerun a list of failed doc ids,
+    ####     the docs under some length, or the first
+    ####     million docs, without writing a filtered copy
+    ####     of the input file
+    ####
+    #### doc_ids      : the docs with these ids
+    #### index_ranges : the docs whose index in the input
+    ####                file is in one of these
+    ####                [begin, end) ranges
+    #### predicate    : the docs for which
+    ####                predicate(len_in_sents, len_in_words,
+    ####                len_in_chars) is true
+    ####
+    #### a doc is selected if it matches every criterion
+    ####     given; the selection is resolved against the
+    ####     metadata in the input file cache, so unselected
+    ####     docs are never decoded, and the input file then
+    ####     behaves as if it held only the selected docs,
+    ####     in their original order (see SelectedInputDocs),
+    ####     so the output file and its resumption cover the
+    ####     selected docs only
+
+    @staticmethod
+    def read_doc_ids(file_path : str) -> set[str]:
+        # one doc id per line, e.g. the ids of a quarantine file
+        #     extracted with jq -r .document_id
+        with open(file_path, 'r') as doc_ids_file:
+            return {
+                line.strip()
+                for line in doc_ids_file
+                if 0 < len(line.strip())
+            }
+
+    def __init__(
+        self         : InputSelection,
+        doc_ids      : Iterable[str]                   = None, # optional
+        index_ranges : list[tuple[int, int]]           = None, # optional
+        predicate    : Callable[[int, int, int], bool] = None  # optional
+    ) -> InputSelection:
+        assert (
+            doc_ids is not None
+            or index_ranges is not None
+            or predicate is not None
+        ), 'a selection needs doc_ids, index_ranges or a predicate'
+        if doc_ids is not None:
+            doc_ids = set(doc_ids)
+            for doc_id in doc_ids:
+                assert isinstance(doc_id, str)
+        if index_ranges is not None:
+            assert isinstance(index_ranges, list)
+            for begin_doc_index, end_doc_index in index_ranges:
+                assert isinstance(begin_doc_index, int)
+                assert isinstance(end_doc_index, int)
+                assert 0 <= begin_doc_index
+                assert begin_doc_index <= end_doc_index
+        if predicate is not None:
+            assert callable(predicate)
+
+        self._doc_ids      = doc_ids      ; del doc_ids
+        self._index_ranges = index_ranges ; del index_ranges
+        self._predicate    = predicate    ; del predicate
+
+    def get_doc_ids(self : InputSelection) -> set[str] | None:
+        return self._doc_ids
+
+    def _get_candidate_doc_indices(
+        self             : InputSelection,
+        file_len_in_docs : int
+    ) -> Iterator[int]:
+        # the doc indices in the index ranges, in order and without
+        #     duplicates, so that docs outside of them are not even looked at;
+        #     the ranges are merged rather than expanded, so that memory
+        #     does not grow with the number of docs in them
+        if self._index_ranges is None:
+            yield from range(file_len_in_docs)
+            return
+        merged_end_doc_index = 0
+        for begin_doc_index, end_doc_index in sorted(self._index_ranges):
+            begin_doc_index = max(begin_doc_index, merged_end_doc_index)
+            end_doc_index   = min(end_doc_index, file_len_in_docs)
+            if begin_doc_index < end_doc_index:
+                yield from range(begin_doc_index, end_doc_index)
+                merged_end_doc_index = end_doc_index
+
+    def select(
+        self : InputSelection,
+        docs : InputCache
+    ) -> SelectedInputDocs:
+        assert isinstance(docs, InputCache)
+
+        # 8 bytes per selected doc rather than a python int
+        doc_indices = array('q')
+        if (
+            self._doc_ids is None
+            and self._predicate is None
+        ):
+            # only index ranges: no doc metadata needs to be looked at
+            doc_indices.extend(self._get_candidate_doc_indices(len(docs)))
+            return SelectedInputDocs(docs, doc_indices)
+        for doc_index in self._get_candidate_doc_indices(len(docs)):
+            doc_id, len_in_sents, len_in_words, len_in_chars = \
+                docs.get_doc_metadata_at_index(doc_index)
+            if (
+                self._doc_ids is not None
+                and doc_id not in self._doc_ids
+            ):
+                continue
+            if (
+                self._predicate is not None
+                and not self._predicate(len_in_sents, len_in_words, len_in_chars)
+            ):
+                continue
+            doc_indices.append(doc_index)
+
+        return SelectedInputDocs(docs, doc_indices)
+
+
+class SelectedInputDocs:
+
+    #######################################################
+    #### read-only list-like view of the selected docs of
+    ####     an input file cache
+
+    def __init__(
+        self        : SelectedInputDocs,
+        docs        : InputCache,
+        doc_indices : array
+    ) -> SelectedInputDocs:
+        assert isinstance(docs, InputCache)
+        assert isinstance(doc_indices, array)
+        self._docs        = docs        ; del docs
+        self._doc_indices = doc_indices ; del doc_indices
+
+    def get_doc_index_in_file(
+        self      : SelectedInputDocs,
+        doc_index : int
+    ) -> int:
+        return self._doc_indices[doc_index]
+
+    def get_file_len_in_sents_words_chars(
+        self : SelectedInputDocs
+    ) -> tuple[int, int, int]:
+        n_sents = 0
+        n_words = 0
+        n_chars = 0
+        for doc_index in self._doc_indices:
+            _, len_in_sents, len_in_words, len_in_chars = \
+                self._docs.get_doc_metadata_at_index(doc_index)
+            n_sents += len_in_sents
+            n_words += len_in_words
+            n_chars += len_in_chars
+        return n_sents, n_words, n_chars
+
+    def __len__(self : SelectedInputDocs) -> int:
+        return len(self._doc_indices)
+
+    def __getitem__(
+        self      : SelectedInputDocs,
+        doc_index : int
+    ) -> Document:
+        assert isinstance(doc_index, int)
+        return self._docs[self._doc_indices[doc_index]]
+
+    def __iter__(self : SelectedInputDocs):
+        for doc_index in self._doc_indices:
+            yield self._docs[doc_index]
@@ -0,0 +1,149 @@
+from __future__ import annotations
+import os
+from logging import Logger
+import json
+
+from ..document.document import Document
+from .output_index import OutputIndex
+
+
+class OutputDocRecords:
+
+    #######################################################
+    #### compact in-memory table of the docs in an output
+    ####     file that is still being written
+    ####
+    #### one fixed-width record per doc, in the same
+    ####     format as the records of an OutputIndex
+    ####     (doc id hash, byte span, lengths, doc batch
+    ####     boundary flags), is packed into a bytearray;
+    ####     the docs themselves are only kept on disk and
+    ####     are decoded from the output file when accessed,
+    ####     so memory usage does not depend on the size
+    ####     of the predicted statistics
+
+    def __init__(
+        self                     : OutputDocRecords,
+        logger                   : Logger = None, # required
+        output_file_path         : str    = None, # required
+        predicted_statistics_key : str    = None  # required
+    ) -> OutputDocRecords:
+        assert isinstance(logger, Logger)
+        assert isinstance(output_file_path, str)
+        assert isinstance(predicted_statistics_key, str)
+
+        self._logger                   = logger                   ; del logger
+        self._output_file_path         = output_file_path         ; del output_file_path
+        self._predicted_statistics_key = predicted_statistics_key ; del predicted_statistics_key
+
+        self._records = bytearray()
+        self._n_docs  = 0
+
+        # opened on the first access to a doc
+        self._output_file = None
+
+
+    #######################################################
+    #### append and truncate
+
+    def append(
+        self        : OutputDocRecords,
+        doc         : Document,
+        byte_offset : int,
+        byte_len    : int
+    ) -> None:
+        self._records += OutputIndex.pack_record(doc, byte_offset, byte_len)
+        self._n_docs += 1
+
+    def truncate(
+        self   : OutputDocRecords,
+        n_docs : int
+    ) -> None:
+        assert 0 <= n_docs and n_docs <= self._n_docs
+        del self._records[n_docs * OutputIndex.RECORD_SIZE:]
+        self._n_docs = n_docs
+
+    def get_records(self : OutputDocRecords) -> memoryview:
+        # a view rather than a copy, so that finalizing does not need twice
+        #     the memory of the records; the records cannot be appended to
+        #     or truncated until the view is released
+        return memoryview(self._records)
+
+
+    #######################################################
+    #### per-doc metadata
+
+    def _get_record_at_index(
+        self      : OutputDocRecords,
+        doc_index : int
+    ) -> tuple:
+        assert 0 <= doc_index and doc_index < self._n_docs, \
+            'doc_index is {0} but should be in the interval [0, {1}]' \
+            .format(
+                doc_index,
+                self._n_docs - 1
+            )
+        return OutputIndex.unpack_record_from(
+            self._records,
+            doc_index * OutputIndex.RECORD_SIZE
+        )
+
+    def get_id_hash_at_index(self : OutputDocRecords, doc_index : int) -> bytes:
+        return self._get_record_at_index(doc_index)[0]
+
+    def get_end_byte_offset_at_index(self : OutputDocRecords, doc_index : int) -> int:
+        # the length to truncate the output file to so that it ends with this doc
+        record = self._get_record_at_index(doc_index)
+        return record[1] + record[2]
+
+    def get_len_in_sents_at_index(self : OutputDocRecords, doc_index : int) -> int:
+        return self._get_record_at_index(doc_index)[3]
+
+    def get_len_in_words_at_index(self : OutputDocRecords, doc_index : int) -> int:
+        return self._get_record_at_index(doc_index)[4]
+
+    def get_len_in_chars_at_index(self : OutputDocRecords, doc_index : int) -> int:
+        return self._get_record_at_index(doc_index)[5]
+
+
+    #######################################################
+    #### docs decoded from the output file; the caller must
+    ####     flush pending writes before accessing a doc
+
+    def get_output_doc_at_index(
+        self      : OutputDocRecords,
+        doc_index : int
+    ) -> Document:
+        record = self._get_record_at_index(doc_index)
+        byte_offset = record[1]
+        byte_len    = record[2]
+        if self._output_file is None:
+            assert os.path.isfile(self._output_file_path)
+            self._output_file = open(self._output_file_path, 'rb')
+        self._output_file.seek(byte_offset)
+        return Document.from_output_doc_dict(
+            logger                   = self._logger,
+            predicted_statistics_key = self._predicted_statistics_key,
+            output_doc_dict          = json.loads(
+                self._output_file.read(byte_len)
+            )
+        )
+
+    def __len__(self : OutputDocRecords) -> int:
+        return self._n_docs
+
+    def __getitem__(
+        self      : OutputDocRecords,
+        doc_index : int
+    ) -> Document:
+        assert isinstance(doc_index, int)
+        return self.get_output_doc_at_index(doc_index)
+
+    def __iter__(self : OutputDocRecords):
+        for doc_index in range(self._n_docs):
+            yield self.get_output_doc_at_index(doc_index)
+
+    def close(self : OutputDocRecords) -> None:
+        if self._output_file is not None:
+            self._output_file.close()
+            self._output_file = None
@@ -1,13 +1,18 @@
 from __future__ import annotations
 import os
 import json
+import logging
 from textwrap import dedent
 from logging import Logger
-from itertools import count
 import pickle
+import time
 import _io
 
 from ..document.document import Document
+from .output_index import OutputIndex
+from .output_doc_records import OutputDocRecords
+from ..validation import Validation
+from ..resource_usage import ResourceUsage
 
 
 class OutputFile:
@@ -26,7 +31,8 @@ class OutputFile:
     def _get_logger(
         self : OutputFile
     ) -> Logger:
-        assert isinstance(self._logger, Logger)
+        if Validation.full:
+            assert isinstance(self._logger, Logger)
         return self._logger
     
     
@@ -42,7 +48,8 @@ class OutputFile:
         self._predicted_statistics_key = predicted_statistics_key
     
     def _get_predicted_statistics_key(self : OutputFile) -> str:
-        assert isinstance(self._predicted_statistics_key, str)
+        if Validation.full:
+            assert isinstance(self._predicted_statistics_key, str)
         return self._predicted_statistics_key
     
     
@@ -60,7 +67,8 @@ class OutputFile:
     def _get_file_path(
         self : OutputFile
     ) -> str:
-        assert isinstance(self._file_path, str)
+        if Validation.full:
+            assert isinstance(self._file_path, str)
         return self._file_path
     
     
@@ -76,15 +84,40 @@ class OutputFile:
         self._from_cache_force = from_cache_force
     
     def _is_from_cache_force(self : OutputFile) -> bool:
-        assert isinstance(self._from_cache_force, bool)
+        if Validation.full:
+            assert isinstance(self._from_cache_force, bool)
         return self._from_cache_force
     
     
+    #######################################################
+    ## bounded memory: keep only running counts and a
+    ##     compact record per doc (an OutputDocRecords)
+    ##     in memory instead of every Document, so that
+    ##     memory usage stays flat however long the run
+    
+    def _set_bounded_memory(
+        self           : OutputFile,
+        bounded_memory : bool
+    ) -> None:
+        assert not hasattr(self, '_bounded_memory')
+        assert isinstance(bounded_memory, bool)
+        self._bounded_memory = bounded_memory
+    
+    def _is_bounded_memory(self : OutputFile) -> bool:
+        if Validation.full:
+            assert isinstance(self._bounded_memory, bool)
+        return self._bounded_memory
+    
+    def is_bounded_memory(self : OutputFile) -> bool:
+        return self._is_bounded_memory()
+    
+    
     #######################################################
     ## file path manipulations; cache file path
     
-    def get_file_path_without_suffix(self : OutputFile) -> str:
-        file_name = os.path.basename(self._get_file_path())
+    @staticmethod
+    def _get_file_path_without_suffix_of(file_path : str) -> str:
+        file_name = os.path.basename(file_path)
         suffix_index = file_name.rfind('.')
         if 0 < suffix_index: # we want to make the base file name have a length
                              # of at least one character
@@ -92,15 +125,69 @@ class OutputFile:
         else:
             base = file_name
         return os.path.join(
-            os.path.dirname(self._get_file_path()),
+            os.path.dirname(file_path),
             base
         )
     
+    def get_file_path_without_suffix(self : OutputFile) -> str:
+        return OutputFile._get_file_path_without_suffix_of(self._get_file_path())
+    
     def _get_cache_file_path(self : OutputFile) -> str:
         return \
             self.get_file_path_without_suffix() \
             + '.output_file_cache_v1.pickle'
     
+    @staticmethod
+    def get_index_file_path_of(file_path : str) -> str:
+        return \
+            OutputFile._get_file_path_without_suffix_of(file_path) \
+            + '.output_file_cache_v2.index'
+    
+    def _get_index_file_path(self : OutputFile) -> str:
+        return OutputFile.get_index_file_path_of(self._get_file_path())
+    
+    @staticmethod
+    def get_progress_file_path_of(file_path : str) -> str:
+        return \
+            OutputFile._get_file_path_without_suffix_of(file_path) \
+            + '.output_file_progress.json'
+    
+    def _get_progress_file_path(self : OutputFile) -> str:
+        return OutputFile.get_progress_file_path_of(self._get_file_path())
+    
+    
+    #######################################################
+    ## progress file; while the output file is written, the
+    ##     length of a prefix of it is recorded, at most
+    ##     once per _PROGRESS_EVERY_N_SECS, so that the
+    ##     progress of a run can be reported by reading only
+    ##     this file and the part of the output file written
+    ##     after the prefix (see RunStatus), without loading
+    ##     the cache
+    
+    _PROGRESS_EVERY_N_SECS = 1.0
+    
+    def _write_progress_to_disk(self : OutputFile) -> None:
+        if Validation.full:
+            assert not self._is_read_only()
+            assert hasattr(self, '_file')
+        progress = {
+            'file_len_in_docs'  : self.get_file_len_in_docs(),
+            'file_len_in_sents' : self.get_file_len_in_sents(),
+            'file_len_in_words' : self.get_file_len_in_words(),
+            'file_len_in_chars' : self.get_file_len_in_chars(),
+            'file_len_in_bytes' : os.fstat(self._file.fileno()).st_size
+        }
+        tmp_file_path = self._get_progress_file_path() + '.tmp'
+        with open(tmp_file_path, 'w') as progress_file:
+            progress_file.write(json.dumps(progress) + '\n')
+        os.replace(tmp_file_path, self._get_progress_file_path())
+        self._progress_monotonic = time.monotonic()
+    
+    def _remove_progress(self : OutputFile) -> None:
+        if os.path.isfile(self._get_progress_file_path()):
+            os.remove(self._get_progress_file_path())
+    
     
     #######################################################
     ## output file cache
@@ -122,14 +209,20 @@ class OutputFile:
         self._read_only = read_only
     
     def _is_read_only(self : OutputFile) -> bool:
-        assert isinstance(self._read_only, bool)
+        if Validation.full:
+            assert isinstance(self._read_only, bool)
         return self._read_only
 
     def _remove_cache(self : OutputFile) -> None:
         assert self._cache_is_available_on_disk()
-        os.remove(self._get_cache_file_path())
-    
-    def _cache_is_available_on_disk(self : OutputFile) -> bool:
+        for cache_file_path in [
+            self._get_cache_file_path(),
+            self._get_index_file_path()
+        ]:
+            if os.path.isfile(cache_file_path):
+                os.remove(cache_file_path)
+    
+    def _pickle_is_available_on_disk(self : OutputFile) -> bool:
         if (
             os.path.isfile(self._get_cache_file_path())
             and 0 == os.path.getsize(self._get_cache_file_path())
@@ -139,14 +232,41 @@ class OutputFile:
         else:
             return os.path.isfile(self._get_cache_file_path())
     
+    def _index_is_available_on_disk(self : OutputFile) -> bool:
+        if (
+            os.path.isfile(self._get_index_file_path())
+            and 0 == os.path.getsize(self._get_index_file_path())
+        ):
+            os.remove(self._get_index_file_path())
+            return False
+        else:
+            return os.path.isfile(self._get_index_file_path())
+    
+    def _cache_is_available_on_disk(self : OutputFile) -> bool:
+        # the v2 index is the current format for finalized output files;
+        #     the v1 pickle is still read for output files finalized
+        #     by earlier versions
+        return (
+            self._index_is_available_on_disk()
+            or self._pickle_is_available_on_disk()
+        )
+    
     def _validate_cache(self : OutputFile) -> None:
-        if __debug__:
+        # only called when the cache is loaded, created or written
+        if Validation.boundary:
             assert hasattr(self, '_cache')
             assert isinstance(self._cache, dict)
             assert 4 == len(self._cache)
-            assert isinstance(self._cache['docs'], list)
-            for doc in self._cache['docs']:
-                assert isinstance(doc, Document)
+            if isinstance(self._cache['docs'], OutputIndex):
+                # do not decode the lazily loaded docs just to validate them
+                assert self._is_read_only()
+            elif isinstance(self._cache['docs'], OutputDocRecords):
+                assert self._is_bounded_memory()
+            else:
+                assert isinstance(self._cache['docs'], list)
+                for doc in self._cache['docs']:
+                    assert isinstance(doc, Document)
+            assert isinstance(self._cache['file_len_in_sents'], int)
             assert 0 <= self._cache['file_len_in_sents']
             assert isinstance(self._cache['file_len_in_words'], int)
             assert 0 <= self._cache['file_len_in_words']
@@ -156,7 +276,14 @@ class OutputFile:
     def _init_cache(self : OutputFile) -> None:
         assert not hasattr(self, '_cache')
         self._cache = dict()
-        self._cache['docs'] = list()
+        if self._is_bounded_memory():
+            self._cache['docs'] = OutputDocRecords(
+                logger                   = self._get_logger(),
+                output_file_path         = self._get_file_path(),
+                predicted_statistics_key = self._get_predicted_statistics_key()
+            )
+        else:
+            self._cache['docs'] = list()
         self._cache['file_len_in_sents'] = 0
         self._cache['file_len_in_words'] = 0
         self._cache['file_len_in_chars'] = 0
@@ -166,24 +293,75 @@ class OutputFile:
     def _read_cache_from_disk(self : OutputFile) -> None:
         assert not hasattr(self, '_cache')
         assert self._cache_is_available_on_disk()
+        if self._index_is_available_on_disk():
+            self._read_index_from_disk()
+            return
         cache_file = open(self._get_cache_file_path(), 'rb')
         self._cache = pickle.load(cache_file)
         cache_file.close()
         self._validate_cache()
         self._set_read_only(True)
     
+    def _read_index_from_disk(self : OutputFile) -> None:
+        # memory-map the index; docs are only decoded when accessed,
+        #     so opening a finalized output file is constant time
+        output_index = OutputIndex(
+            logger                   = self._get_logger(),
+            index_file_path          = self._get_index_file_path(),
+            output_file_path         = self._get_file_path(),
+            predicted_statistics_key = self._get_predicted_statistics_key()
+        )
+        self._cache = dict()
+        self._cache['docs'] = output_index
+        self._cache['file_len_in_sents'] = output_index.get_file_len_in_sents()
+        self._cache['file_len_in_words'] = output_index.get_file_len_in_words()
+        self._cache['file_len_in_chars'] = output_index.get_file_len_in_chars()
+        self._set_read_only(True)
+        self._validate_cache()
+    
     def write_cache_to_disk(self : OutputFile) -> None:
         assert not self._is_read_only()
         self._validate_cache()
         assert not self._cache_is_available_on_disk()
-        cache_file = open(self._get_cache_file_path(), 'wb')
-        pickle.dump(self._cache, cache_file)
-        cache_file.close()
-        self._set_read_only(True)
+        self._set_read_only(True) # closes (and thereby flushes) the output file
+        with ResourceUsage.log_phase(
+            self._get_logger(),
+            'io.output_file: OutputFile.write_cache_to_disk: write the cache'
+        ):
+            if self._is_bounded_memory():
+                # the records already hold the byte span of every doc,
+                #     so the output file need not be scanned again
+                with self._cache['docs'].get_records() as records:
+                    OutputIndex.write_records_to_disk(
+                        index_file_path   = self._get_index_file_path(),
+                        records           = records,
+                        file_len_in_docs  = self.get_file_len_in_docs(),
+                        file_len_in_sents = self.get_file_len_in_sents(),
+                        file_len_in_words = self.get_file_len_in_words(),
+                        file_len_in_chars = self.get_file_len_in_chars()
+                    )
+                self._cache['docs'].close()
+            else:
+                OutputIndex.write_to_disk(
+                    index_file_path   = self._get_index_file_path(),
+                    output_file_path  = self._get_file_path(),
+                    list_of_docs      = self._cache['docs'],
+                    file_len_in_sents = self.get_file_len_in_sents(),
+                    file_len_in_words = self.get_file_len_in_words(),
+                    file_len_in_chars = self.get_file_len_in_chars()
+                )
+        # the index now holds the length of the output file
+        self._remove_progress()
+        # release the in-memory docs in favor of the lazily loaded ones
+        del self._cache
+        self._read_index_from_disk()
 
     def cache_exists(self : OutputFile) -> bool:
         return self._cache_is_available_on_disk()
     
+    def is_finalized(self : OutputFile) -> bool:
+        return self._is_read_only()
+    
     
     #######################################################
     ## update and get the length of the output file
@@ -195,40 +373,65 @@ class OutputFile:
         self    : OutputFile,
         n_sents : int
     ) -> None:
-        assert not self._is_read_only()
-        assert isinstance(n_sents, int)
+        if Validation.full:
+            assert not self._is_read_only()
+            assert isinstance(n_sents, int)
         self._cache['file_len_in_sents'] += n_sents
-        assert 0 <= self._cache['file_len_in_sents']
+        if Validation.full:
+            assert 0 <= self._cache['file_len_in_sents']
         
     def get_file_len_in_sents(self : OutputFile) -> int:
-        assert 0 <= self._cache['file_len_in_sents']
-        return self._file_len_in_sents
+        if Validation.full:
+            assert 0 <= self._cache['file_len_in_sents']
+        return self._cache['file_len_in_sents']
     
     def _file_len_in_words_plus_equals(
         self    : OutputFile,
         n_words : int
     ) -> None:
-        assert not self._is_read_only()
-        assert isinstance(n_words, int)
+        if Validation.full:
+            assert not self._is_read_only()
+            assert isinstance(n_words, int)
         self._cache['file_len_in_words'] += n_words
-        assert 0 <= self._cache['file_len_in_words']
+        if Validation.full:
+            assert 0 <= self._cache['file_len_in_words']
     
     def get_file_len_in_words(self : OutputFile) -> int:
-        assert 0 <= self._cache['file_len_in_words']
+        if Validation.full:
+            assert 0 <= self._cache['file_len_in_words']
         return self._cache['file_len_in_words']
     
     def _file_len_in_chars_plus_equals(
         self    : OutputFile,
         n_chars : int
     ) -> None:
-        assert not self._is_read_only()
-        assert isinstance(n_chars, int)
+        if Validation.full:
+            assert not self._is_read_only()
+            assert isinstance(n_chars, int)
         self._cache['file_len_in_chars'] += n_chars
-        assert 0 <= self._cache['file_len_in_chars']
+        if Validation.full:
+            assert 0 <= self._cache['file_len_in_chars']
 
     def get_file_len_in_chars(self : OutputFile) -> int:
-        assert 0 <= self._cache['file_len_in_chars']
+        if Validation.full:
+            assert 0 <= self._cache['file_len_in_chars']
         return self._cache['file_len_in_chars']
+
+    def get_file_len_in_bytes(self : OutputFile) -> int:
+        # including the docs that are appended but not yet flushed
+        if hasattr(self, '_file'):
+            return self._file.tell()
+        if os.path.isfile(self._get_file_path()):
+            return os.path.getsize(self._get_file_path())
+        return 0
+
+    
+    _INITIALIZING_OUTPUT_DOC_MESSAGE = dedent(
+        '''\
+        io.output_file: OutputFile.__init__:
+        initializing output doc {0}
+        (ending at byte {1} of {2})'''
+    ).replace('\n', ' ')
     
     
     #######################################################
@@ -239,18 +442,25 @@ class OutputFile:
         logger                   : Logger     = None,  # required
         file_path                : str        = None,  # required
         predicted_statistics_key : str        = None,  # required
-        from_cache_force         : bool       = False  # optional
+        from_cache_force         : bool       = False, # optional
+        bounded_memory           : bool       = False  # optional
     ) -> OutputFile:
         self._set_logger(logger)                                    ; del logger
         self._set_file_path(file_path)                              ; del file_path
         self._set_predicted_statistics_key(predicted_statistics_key); del predicted_statistics_key
         self._set_from_cache_force(from_cache_force)                ; del from_cache_force
+        self._set_bounded_memory(bounded_memory)                    ; del bounded_memory
         
         self._get_logger().debug(
             'io.output_file: OutputFile.__init__: file_path: {0}'
             .format(self._get_file_path())
         )
         
+        # time spent in append_output_doc since the last call to
+        #     pop_stage_n_secs, split into json serialization and file writes
+        self._serialize_n_secs = 0.0
+        self._write_n_secs     = 0.0
+        
         
         if (
             os.path.isfile(self._get_file_path())
@@ -274,11 +484,16 @@ class OutputFile:
                     '''\
                     io.output_file: OutputFile.__init__:
                     begin loading the cache,
-                    i.e. the serialized (pickled) version
-                    of already finalized output file'''
+                    i.e. the index (or, for output files finalized
+                    by earlier versions, the pickled version)
+                    of the already finalized output file'''
                 ).replace('\n', ' ')
             )
-            self._read_cache_from_disk()
+            with ResourceUsage.log_phase(
+                self._get_logger(),
+                'io.output_file: OutputFile.__init__: load the cache'
+            ):
+                self._read_cache_from_disk()
             self._get_logger().debug(
                 dedent(
                     '''\
@@ -305,68 +520,77 @@ class OutputFile:
                              #     exactly the first i+1 documents
                              #     (considering that the lists are zero-indexed)
                              #     with all subsequent documents discarded
-            if os.path.isfile(self._get_file_path()):
-                assert 0 < os.path.getsize(self._get_file_path())
+            if self._is_bounded_memory():
+                self._sizes = None # the byte spans are kept in the doc records instead
+            with ResourceUsage.log_phase(
+                self._get_logger(),
+                'io.output_file: OutputFile.__init__: load existing output file'
+            ):
+                if os.path.isfile(self._get_file_path()):
+                    assert 0 < os.path.getsize(self._get_file_path())
 
-                with open(self._get_file_path(), 'rt') as output_file_tmode:
-                    ndocs = output_file_tmode.read().count('\n') + 1
-                with open(self._get_file_path(), 'rb') as output_file_bmode:
-                    size = 0
-                    for doc_index in count():
-                        json_bytes = b''
-                        while True:
-                            read_byte = output_file_bmode.read(1)
-                            size += len(read_byte)
-                            if read_byte in [b'', '\n'.encode('utf-8')]:
-                                break
-                            assert 1 == len(read_byte)
-                            json_bytes += read_byte
-                        assert 0 < len(json_bytes)
-                        json_str = json_bytes.decode('utf-8')
-                        if (
-                            0 == doc_index
-                            or 0 == (doc_index+1)%100
-                            or doc_index+1 == ndocs
-                        ):
-                            self._get_logger().debug(
-                                dedent(
-                                    '''\
-                                    io.output_file: OutputFile.__init__:
-                                    initializing output doc {0} (of {1})'''
-                                ).replace('\n', ' ').format(
-                                    doc_index + 1,
-                                    ndocs
+                    # the output file is streamed line by line, and the docs
+                    #     are counted as they are read, so that with
+                    #     bounded_memory the memory use of a resume does not
+                    #     grow with the size of the output file; the last doc
+                    #     is not followed by a newline
+                    file_len_in_bytes = os.path.getsize(self._get_file_path())
+                    is_debug_enabled = self._get_logger().isEnabledFor(logging.DEBUG)
+                    with open(self._get_file_path(), 'rb') as output_file_bmode:
+                        size = 0
+                        for doc_index, line in enumerate(output_file_bmode):
+                            begin_size = size
+                            size += len(line)
+                            json_bytes = line[:-1] if line.endswith(b'\n') else line
+                            assert 0 < len(json_bytes)
+                            json_str = json_bytes.decode('utf-8')
+                            if is_debug_enabled and (
+                                0 == doc_index
+                                or 0 == (doc_index+1)%100
+                                or size == file_len_in_bytes
+                            ):
+                                self._get_logger().debug(
+                                    OutputFile._INITIALIZING_OUTPUT_DOC_MESSAGE.format(
+                                        doc_index + 1,
+                                        size,
+                                        file_len_in_bytes
+                                    )
                                 )
-                            )
-                        self._cache['docs'].append(
-                            Document.from_output_doc_dict(
+                            doc = Document.from_output_doc_dict(
                                 logger                   = self._get_logger(),
                                 output_doc_dict          = json.loads(json_str),
                                 predicted_statistics_key = self._get_predicted_statistics_key()
                             )
-                        )
-                        self._sizes.append(
-                            size if b'' == read_byte else
-                            size-1 if '\n'.encode('utf-8') == read_byte else
-                            None
-                        )
-                        if b'' == read_byte:
-                            assert b'' == output_file_bmode.read() # reconfirm we are at end of file
-                            break
-                    assert doc_index+1 == ndocs
-            
-            assert self.get_file_len_in_docs() == len(self._cache['docs'])
-            assert self.get_file_len_in_docs() == len(self._sizes)
-            
-            for doc, size in zip(self._cache['docs'], self._sizes):
-                assert isinstance(size, int)
-                assert 0 < size
-                self._file_len_in_sents_plus_equals(doc.get_len_in_sents())
-                self._file_len_in_words_plus_equals(doc.get_len_in_words())
-                self._file_len_in_chars_plus_equals(doc.get_len_in_chars())
+                            if self._is_bounded_memory():
+                                self._cache['docs'].append(
+                                    doc,
+                                    byte_offset = begin_size,
+                                    byte_len    = len(json_bytes)
+                                )
+                                self._file_len_in_sents_plus_equals(doc.get_len_in_sents())
+                                self._file_len_in_words_plus_equals(doc.get_len_in_words())
+                                self._file_len_in_chars_plus_equals(doc.get_len_in_chars())
+                                del doc
+                            else:
+                                self._cache['docs'].append(doc)
+                                self._sizes.append(begin_size + len(json_bytes))
+                        # a newline after the last doc would begin an empty doc
+                        assert not line.endswith(b'\n')
+                        assert size == file_len_in_bytes
             
-            assert self.get_file_len_in_docs() == len(self._cache['docs'])
-            assert self.get_file_len_in_docs() == len(self._sizes)
+            if not self._is_bounded_memory():
+                assert self.get_file_len_in_docs() == len(self._cache['docs'])
+                assert self.get_file_len_in_docs() == len(self._sizes)
+                
+                for doc, size in zip(self._cache['docs'], self._sizes):
+                    assert isinstance(size, int)
+                    assert 0 < size
+                    self._file_len_in_sents_plus_equals(doc.get_len_in_sents())
+                    self._file_len_in_words_plus_equals(doc.get_len_in_words())
+                    self._file_len_in_chars_plus_equals(doc.get_len_in_chars())
+                
+                assert self.get_file_len_in_docs() == len(self._cache['docs'])
+                assert self.get_file_len_in_docs() == len(self._sizes)
     
     
     #######################################################
@@ -377,6 +601,8 @@ class OutputFile:
         doc_index : int
     ) -> Document:
         if 0 <= doc_index and doc_index < self.get_file_len_in_docs():
+            if self._is_bounded_memory() and not self._is_read_only():
+                self.flush() # the doc is read back from the output file
             return self._cache['docs'][doc_index]
         else:
             assert False, \
@@ -403,7 +629,10 @@ class OutputFile:
         assert hasattr(self, '_sizes')  # check that the current method has not yet been called;
                                         #     (the _sizes attribute is deleted at the end
                                         #     of this method)
-        assert self.get_file_len_in_docs() == len(self._sizes)
+        assert (
+            self._is_bounded_memory()
+            or self.get_file_len_in_docs() == len(self._sizes)
+        )
         
         if -1 == doc_index:
             if os.path.isfile(self._get_file_path()):
@@ -418,7 +647,11 @@ class OutputFile:
             #sys.exit(-1)
             
             with open(self._get_file_path(), 'r+b') as output_file:
-                output_file.truncate(self._sizes[doc_index])
+                output_file.truncate(
+                    self._cache['docs'].get_end_byte_offset_at_index(doc_index)
+                    if self._is_bounded_memory() else
+                    self._sizes[doc_index]
+                )
                 del output_file
         elif self.get_file_len_in_docs() - 1 == doc_index:
             assert False, 'should have already returned'
@@ -431,17 +664,27 @@ class OutputFile:
                     self.get_file_len_in_docs() - 1
                 )
         
-        for doc in self._cache['docs'][doc_index+1:]:
-            self._file_len_in_sents_plus_equals(-doc.get_len_in_sents())
-            self._file_len_in_words_plus_equals(-doc.get_len_in_words())
-            self._file_len_in_chars_plus_equals(-doc.get_len_in_chars())
-        
-        self._cache['docs'] = self._cache['docs'][:doc_index+1]
-        self._sizes         = self._sizes[:doc_index+1]
+        if self._is_bounded_memory():
+            for deleted_doc_index in range(doc_index+1, self.get_file_len_in_docs()):
+                records = self._cache['docs']
+                self._file_len_in_sents_plus_equals(-records.get_len_in_sents_at_index(deleted_doc_index))
+                self._file_len_in_words_plus_equals(-records.get_len_in_words_at_index(deleted_doc_index))
+                self._file_len_in_chars_plus_equals(-records.get_len_in_chars_at_index(deleted_doc_index))
+            
+            self._cache['docs'].truncate(doc_index+1)
+        else:
+            for doc in self._cache['docs'][doc_index+1:]:
+                self._file_len_in_sents_plus_equals(-doc.get_len_in_sents())
+                self._file_len_in_words_plus_equals(-doc.get_len_in_words())
+                self._file_len_in_chars_plus_equals(-doc.get_len_in_chars())
+            
+            self._cache['docs'] = self._cache['docs'][:doc_index+1]
+            self._sizes         = self._sizes[:doc_index+1]
+            
+            assert self.get_file_len_in_docs() == len(self._sizes)
         
         assert self.get_file_len_in_docs() == doc_index + 1
         assert self.get_file_len_in_docs() == len(self._cache['docs'])
-        assert self.get_file_len_in_docs() == len(self._sizes)
         
         del self._sizes # the _sizes attribute is used only by this method
                         #     and this method must only be called once,
@@ -457,6 +700,35 @@ class OutputFile:
         if os.path.isfile(self._get_file_path()):
             os.chmod(self._get_file_path(), 0o600)
         self._file = open(self._get_file_path(), 'a')
+        if self._is_bounded_memory():
+            # byte offset of the end of the output file, for the doc records
+            self._file_len_in_bytes = \
+                os.path.getsize(self._get_file_path()) \
+                if os.path.isfile(self._get_file_path()) else 0
+        # a progress file left by an earlier run may cover docs that
+        #     delete_output_docs_after_index has since deleted
+        self._write_progress_to_disk()
+    
+    
+    #######################################################
+    ## flush the output file; with sync, also ask the os to
+    ##     write it to the storage device
+
+    def flush(
+        self : OutputFile,
+        sync : bool = False
+    ) -> None:
+        if not hasattr(self, '_file'):
+            return
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+        if (
+            sync
+            or OutputFile._PROGRESS_EVERY_N_SECS
+                <= time.monotonic() - self._progress_monotonic
+        ):
+            self._write_progress_to_disk()
     
     
     #######################################################
@@ -468,30 +740,61 @@ class OutputFile:
     ) -> None:
 
         # confirm that the output file is not yet finalized
-        assert not self._is_read_only()
+        if Validation.full:
+            assert not self._is_read_only()
         
         # confirm that the output file is ready to be written;
         #     i.e., the delete_output_docs_after_index
         #     method has already been called
-        assert hasattr(self, '_file')
-        assert isinstance(self._file, _io.TextIOWrapper)
-        assert 'a' == self._file.mode # 'a' for append
+        if Validation.full:
+            assert hasattr(self, '_file')
+            assert isinstance(self._file, _io.TextIOWrapper)
+            assert 'a' == self._file.mode # 'a' for append
         
         
+        serialize_begin = time.perf_counter()
         json_str = json.dumps(
             doc.get_output_dict(
                 predicted_statistics_key = self._get_predicted_statistics_key()
             )
         )
+        write_begin = time.perf_counter()
         if 0 < self._file.tell():
             json_str = '\n' + json_str
         
         self._file.write(json_str)
+        write_end = time.perf_counter()
+        
+        self._serialize_n_secs += write_begin - serialize_begin
+        self._write_n_secs     += write_end   - write_begin
         
-        self._cache['docs'].append(doc)
+        if self._is_bounded_memory():
+            # json.dumps escapes all non-ascii chars,
+            #     so the length in chars is the length in bytes
+            byte_len = len(json_str.lstrip('\n'))
+            self._cache['docs'].append(
+                doc,
+                byte_offset = self._file_len_in_bytes + len(json_str) - byte_len,
+                byte_len    = byte_len
+            )
+            self._file_len_in_bytes += len(json_str)
+        else:
+            self._cache['docs'].append(doc)
 
         self._file_len_in_sents_plus_equals(doc.get_len_in_sents())
         self._file_len_in_words_plus_equals(doc.get_len_in_words())
         self._file_len_in_chars_plus_equals(doc.get_len_in_chars())
         
+    
+    
+    #######################################################
+    ## time spent serializing and writing docs
 
+    def pop_stage_n_secs(self : OutputFile) -> dict:
+        stage_n_secs = {
+            'serialize' : self._serialize_n_secs,
+            'write'     : self._write_n_secs
+        }
+        self._serialize_n_secs = 0.0
+        self._write_n_secs     = 0.0
+        return stage_n_secs
@@ -0,0 +1,337 @@
+from __future__ import annotations
+import os
+import sys
+import mmap
+import struct
+import hashlib
+from textwrap import dedent
+from logging import Logger
+import json
+
+from ..document.document import Document
+
+
+class OutputIndex:
+
+    #######################################################
+    #### on-disk layout
+    ####
+    #### the index file consists of a fixed-width header
+    ####     followed by one fixed-width record per doc
+    ####     in the output file; the docs themselves are
+    ####     not duplicated in the index file but are
+    ####     sliced out of the memory-mapped output file
+    ####     (using the byte offset and byte length
+    ####     stored in each record) only when accessed
+
+    _MAGIC = b'DBOIDX01'
+
+    # magic, file_len_in_docs, file_len_in_sents,
+    #     file_len_in_words, file_len_in_chars
+    _HEADER_STRUCT = struct.Struct('<8sQQQQ')
+
+    # doc id hash, byte offset, byte length,
+    #     len_in_sents, len_in_words, len_in_chars,
+    #     doc batch boundary flags, padding
+    _RECORD_STRUCT = struct.Struct('<8sQIIIIB3x')
+
+    RECORD_SIZE = _RECORD_STRUCT.size
+
+    FLAG_BEGINS_DOC_BATCH = 0b01
+    FLAG_ENDS_DOC_BATCH   = 0b10
+
+    @staticmethod
+    def hash_doc_id(doc_id : str) -> bytes:
+        assert isinstance(doc_id, str)
+        return hashlib.blake2b(
+            doc_id.encode('utf-8'),
+            digest_size = 8
+        ).digest()
+
+    @staticmethod
+    def get_doc_flags(doc : Document) -> int:
+        assert isinstance(doc, Document)
+        flags = 0
+        if 'not first doc in doc batch' != doc.get_begin_doc_batch_datetime():
+            flags |= OutputIndex.FLAG_BEGINS_DOC_BATCH
+        if 'not last doc in doc batch' != doc.get_end_doc_batch_datetime():
+            flags |= OutputIndex.FLAG_ENDS_DOC_BATCH
+        return flags
+
+    @staticmethod
+    def pack_record(
+        doc         : Document,
+        byte_offset : int,
+        byte_len    : int
+    ) -> bytes:
+        return OutputIndex._RECORD_STRUCT.pack(
+            OutputIndex.hash_doc_id(doc.get_id()),
+            byte_offset,
+            byte_len,
+            doc.get_len_in_sents(),
+            doc.get_len_in_words(),
+            doc.get_len_in_chars(),
+            OutputIndex.get_doc_flags(doc)
+        )
+
+    @staticmethod
+    def unpack_record_from(
+        buffer        : bytes,
+        buffer_offset : int
+    ) -> tuple:
+        return OutputIndex._RECORD_STRUCT.unpack_from(buffer, buffer_offset)
+
+
+    #######################################################
+    #### write an index for an output file whose docs
+    ####     are all present in memory
+
+    @staticmethod
+    def write_to_disk(
+        index_file_path   : str,
+        output_file_path  : str,
+        list_of_docs      : list[Document],
+        file_len_in_sents : int,
+        file_len_in_words : int,
+        file_len_in_chars : int
+    ) -> None:
+        assert isinstance(index_file_path, str)
+        assert os.path.isfile(output_file_path)
+        assert 0 < len(list_of_docs)
+
+        # the output file is a json lines file without a trailing newline,
+        #     so the byte spans of the docs can be recovered
+        #     with a single sequential scan
+        byte_spans = []
+        with open(output_file_path, 'rb') as output_file:
+            byte_offset = 0
+            for line in output_file:
+                byte_len = len(line.rstrip(b'\n'))
+                byte_spans.append((byte_offset, byte_len))
+                byte_offset += len(line)
+        assert len(byte_spans) == len(list_of_docs)
+
+        records = b''.join(
+            OutputIndex.pack_record(doc, byte_offset, byte_len)
+            for doc, (byte_offset, byte_len) in zip(list_of_docs, byte_spans)
+        )
+        OutputIndex.write_records_to_disk(
+            index_file_path   = index_file_path,
+            records           = records,
+            file_len_in_docs  = len(list_of_docs),
+            file_len_in_sents = file_len_in_sents,
+            file_len_in_words = file_len_in_words,
+            file_len_in_chars = file_len_in_chars
+        )
+
+
+    #######################################################
+    #### write an index from already packed records, e.g.
+    ####     those of an OutputDocRecords
+
+    @staticmethod
+    def write_records_to_disk(
+        index_file_path   : str,
+        records           : bytes | memoryview,
+        file_len_in_docs  : int,
+        file_len_in_sents : int,
+        file_len_in_words : int,
+        file_len_in_chars : int
+    ) -> None:
+        assert isinstance(index_file_path, str)
+        assert 0 < file_len_in_docs
+        assert len(records) == file_len_in_docs * OutputIndex._RECORD_STRUCT.size
+
+        # write to a temporary file first so that an interrupted write
+        #     never leaves a truncated index next to the output file
+        tmp_index_file_path = index_file_path + '.tmp'
+        with open(tmp_index_file_path, 'wb') as index_file:
+            index_file.write(
+                OutputIndex._HEADER_STRUCT.pack(
+                    OutputIndex._MAGIC,
+                    file_len_in_docs,
+                    file_len_in_sents,
+                    file_len_in_words,
+                    file_len_in_chars
+                )
+            )
+            index_file.write(records)
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.replace(tmp_index_file_path, index_file_path)
+
+
+    #######################################################
+    #### read only the header, e.g. to report the length
+    ####     of a finalized output file without mapping it
+
+    @staticmethod
+    def read_header(
+        index_file_path : str
+    ) -> tuple[int, int, int, int] | None:
+        # returns file_len_in_docs, file_len_in_sents, file_len_in_words
+        #     and file_len_in_chars, or None if there is no index file
+        #     in the current format
+        if not os.path.isfile(index_file_path):
+            return None
+        with open(index_file_path, 'rb') as index_file:
+            header_bytes = index_file.read(OutputIndex._HEADER_STRUCT.size)
+        if len(header_bytes) < OutputIndex._HEADER_STRUCT.size:
+            return None
+        magic, *header = OutputIndex._HEADER_STRUCT.unpack(header_bytes)
+        if OutputIndex._MAGIC != magic:
+            return None
+        return tuple(header)
+
+
+    #######################################################
+    #### constructor; memory-maps the index file and the
+    ####     output file without decoding any docs
+
+    def __init__(
+        self                     : OutputIndex,
+        logger                   : Logger = None, # required
+        index_file_path          : str    = None, # required
+        output_file_path         : str    = None, # required
+        predicted_statistics_key : str    = None  # required
+    ) -> OutputIndex:
+        assert isinstance(logger, Logger)
+        assert os.path.isfile(index_file_path)
+        assert os.path.isfile(output_file_path)
+        assert isinstance(predicted_statistics_key, str)
+
+        self._logger                   = logger                   ; del logger
+        self._index_file_path          = index_file_path          ; del index_file_path
+        self._output_file_path         = output_file_path         ; del output_file_path
+        self._predicted_statistics_key = predicted_statistics_key ; del predicted_statistics_key
+
+        with open(self._index_file_path, 'rb') as index_file:
+            self._index_mmap = mmap.mmap(
+                index_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        with open(self._output_file_path, 'rb') as output_file:
+            self._output_mmap = mmap.mmap(
+                output_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        (
+            magic,
+            self._file_len_in_docs,
+            self._file_len_in_sents,
+            self._file_len_in_words,
+            self._file_len_in_chars
+        ) = OutputIndex._HEADER_STRUCT.unpack_from(self._index_mmap, 0)
+
+        if (
+            OutputIndex._MAGIC != magic
+            or len(self._index_mmap) != (
+                OutputIndex._HEADER_STRUCT.size
+                + self._file_len_in_docs * OutputIndex._RECORD_STRUCT.size
+            )
+        ):
+            self._logger.critical(
+                dedent(
+                    '''\
+                    io.output_index: OutputIndex.__init__:
+                    the index file {0} is corrupted or has an unknown format:
+                    delete it and rerun to regenerate it'''
+                ).replace('\n', ' ').format(
+                    self._index_file_path
+                )
+            )
+            sys.exit(-1)
+
+
+    #######################################################
+    #### file length statistics, read from the header
+
+    def get_file_len_in_docs(self : OutputIndex) -> int:
+        return self._file_len_in_docs
+
+    def get_file_len_in_sents(self : OutputIndex) -> int:
+        return self._file_len_in_sents
+
+    def get_file_len_in_words(self : OutputIndex) -> int:
+        return self._file_len_in_words
+
+    def get_file_len_in_chars(self : OutputIndex) -> int:
+        return self._file_len_in_chars
+
+
+    #######################################################
+    #### per-doc metadata, read from the fixed-width table
+    ####     without decoding the doc itself
+
+    def _get_record_at_index(
+        self      : OutputIndex,
+        doc_index : int
+    ) -> tuple:
+        assert 0 <= doc_index and doc_index < self._file_len_in_docs, \
+            'doc_index is {0} but should be in the interval [0, {1}]' \
+            .format(
+                doc_index,
+                self._file_len_in_docs - 1
+            )
+        return OutputIndex._RECORD_STRUCT.unpack_from(
+            self._index_mmap,
+            OutputIndex._HEADER_STRUCT.size
+            + doc_index * OutputIndex._RECORD_STRUCT.size
+        )
+
+    def get_id_hash_at_index(self : OutputIndex, doc_index : int) -> bytes:
+        return self._get_record_at_index(doc_index)[0]
+
+    def get_len_in_sents_at_index(self : OutputIndex, doc_index : int) -> int:
+        return self._get_record_at_index(doc_index)[3]
+
+    def get_len_in_words_at_index(self : OutputIndex, doc_index : int) -> int:
+        return self._get_record_at_index(doc_index)[4]
+
+    def get_len_in_chars_at_index(self : OutputIndex, doc_index : int) -> int:
+        return self._get_record_at_index(doc_index)[5]
+
+    def begins_doc_batch_at_index(self : OutputIndex, doc_index : int) -> bool:
+        flags = self._get_record_at_index(doc_index)[6]
+        return bool(flags & OutputIndex.FLAG_BEGINS_DOC_BATCH)
+
+    def ends_doc_batch_at_index(self : OutputIndex, doc_index : int) -> bool:
+        flags = self._get_record_at_index(doc_index)[6]
+        return bool(flags & OutputIndex.FLAG_ENDS_DOC_BATCH)
+
+
+    #######################################################
+    #### lazily decoded docs; the output index behaves like
+    ####     a read-only list of Document objects
+
+    def get_output_doc_at_index(
+        self      : OutputIndex,
+        doc_index : int
+    ) -> Document:
+        record = self._get_record_at_index(doc_index)
+        byte_offset = record[1]
+        byte_len    = record[2]
+        return Document.from_output_doc_dict(
+            logger                   = self._logger,
+            predicted_statistics_key = self._predicted_statistics_key,
+            output_doc_dict          = json.loads(
+                self._output_mmap[byte_offset:byte_offset+byte_len]
+            )
+        )
+
+    def __len__(self : OutputIndex) -> int:
+        return self._file_len_in_docs
+
+    def __getitem__(
+        self      : OutputIndex,
+        doc_index : int
+    ) -> Document:
+        assert isinstance(doc_index, int)
+        return self.get_output_doc_at_index(doc_index)
+
+    def __iter__(self : OutputIndex):
+        for doc_index in range(self._file_len_in_docs):
+            yield self.get_output_doc_at_index(doc_index)
+
+    def close(self : OutputIndex) -> None:
+        self._index_mmap.close()
+        self._output_mmap.close()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+import os
+import json
+import datetime
+from logging import Logger
+
+from ..document.document import Document
+
+
+class Quarantine:
+
+    #######################################################
+    #### poison docs, i.e. docs the processor fails on,
+    ####     are recorded in a json lines quarantine file
+    ####     and written to the output file with a
+    ####     placeholder result, so that the run moves on
+    ####
+    #### docs on which the processor raises are isolated
+    ####     within the doc batch by
+    ####     DocumentBatch.process_isolating_failures,
+    ####     which re-raises rather than quarantine when the
+    ####     failures are not doc-specific (e.g. every doc of
+    ####     the doc batch fails); a doc that is alone in its
+    ####     doc batch is, like a doc the process dies on,
+    ####     only quarantined when it fails a second time
+    ####     (see has_failed);
+    ####     docs on which the process crashes are isolated
+    ####     across restarts by DocumentBatchIterator, using
+    ####     the in-flight file, which records the doc batch
+    ####     handed out last: if a restarted run resumes at
+    ####     that same doc batch, the process died on it, so
+    ####     it is handed out again at half its size until it
+    ####     is down to the single poison doc; a doc is only
+    ####     quarantined after the process died on it twice,
+    ####     so that a run killed for another reason (e.g.
+    ####     preemption) with a doc batch size of one does
+    ####     not quarantine an innocent doc
+
+    _IN_FLIGHT_SUFFIX = '.in_flight'
+
+    def __init__(
+        self                             : Quarantine,
+        logger                           : Logger = None, # required
+        file_path                        : str    = None, # required
+        placeholder_predicted_statistics : dict   = None  # optional
+    ) -> Quarantine:
+        assert isinstance(logger, Logger)
+        assert isinstance(file_path, str)
+        if placeholder_predicted_statistics is None:
+            placeholder_predicted_statistics = {'quarantined' : True}
+        assert isinstance(placeholder_predicted_statistics, dict)
+
+        self._logger    = logger    ; del logger
+        self._file_path = file_path ; del file_path
+        self._placeholder_predicted_statistics = placeholder_predicted_statistics
+        del placeholder_predicted_statistics
+
+        self._n_docs = 0
+
+        # the docs that failed alone in their doc batch in this run
+        self._failed_doc_ids = set()
+
+        # the doc batch that was in flight when the previous run ended
+        self._crashed_in_flight = None
+        in_flight_file_path = self._file_path + Quarantine._IN_FLIGHT_SUFFIX
+        if os.path.isfile(in_flight_file_path):
+            with open(in_flight_file_path, 'r') as in_flight_file:
+                in_flight_str = in_flight_file.read().strip()
+            if 0 < len(in_flight_str):
+                in_flight = json.loads(in_flight_str)
+                self._crashed_in_flight = (
+                    in_flight['document_id'],
+                    in_flight['len_in_docs'],
+                    in_flight['is_retry']
+                )
+        self._in_flight_file = open(in_flight_file_path, 'w')
+
+
+    #######################################################
+    #### placeholder result of a quarantined doc
+
+    def get_placeholder_predicted_statistics(self : Quarantine) -> dict:
+        return dict(self._placeholder_predicted_statistics)
+
+
+    #######################################################
+    #### record a quarantined doc
+
+    def add(
+        self   : Quarantine,
+        doc    : Document,
+        reason : str
+    ) -> None:
+        assert isinstance(doc, Document)
+        assert isinstance(reason, str)
+        with open(self._file_path, 'a') as quarantine_file:
+            quarantine_file.write(
+                json.dumps({
+                    'document_id'  : doc.get_id(),
+                    'len_in_chars' : doc.get_len_in_chars(),
+                    'reason'       : reason,
+                    'datetime'     : datetime.datetime.now(datetime.timezone.utc).isoformat()
+                }) + '\n'
+            )
+        self._n_docs += 1
+        self._logger.warning(
+            'io.quarantine: Quarantine.add: quarantined doc {0}: {1}'
+            .format(
+                doc.get_id(),
+                reason
+            )
+        )
+
+    def get_n_docs(self : Quarantine) -> int:
+        # the number of docs quarantined by this run
+        return self._n_docs
+
+
+    #######################################################
+    #### docs that failed once
+
+    def record_failure(
+        self : Quarantine,
+        doc  : Document
+    ) -> None:
+        assert isinstance(doc, Document)
+        self._failed_doc_ids.add(doc.get_id())
+
+    def has_failed(
+        self : Quarantine,
+        doc  : Document
+    ) -> bool:
+        # whether the doc already failed alone in its doc batch, either in
+        #     this run or as the only doc in flight when the previous run
+        #     ended
+        assert isinstance(doc, Document)
+        return (
+            doc.get_id() in self._failed_doc_ids
+            or (
+                self._crashed_in_flight is not None
+                and doc.get_id() == self._crashed_in_flight[0]
+                and 1 == self._crashed_in_flight[1]
+            )
+        )
+
+
+    #######################################################
+    #### in-flight doc batch
+
+    def get_crashed_in_flight(self : Quarantine) -> tuple[str, int, bool] | None:
+        # the id of the first doc, the length in docs, and whether it was
+        #     handed out after a crash, of the doc batch that was in flight
+        #     when the previous run ended, if any
+        return self._crashed_in_flight
+
+    def set_in_flight(
+        self        : Quarantine,
+        doc_id      : str,
+        len_in_docs : int,
+        is_retry    : bool
+    ) -> None:
+        # overwritten for every doc batch; not fsynced, since it only needs
+        #     to survive the process, not the node
+        self._in_flight_file.seek(0)
+        self._in_flight_file.write(
+            json.dumps({
+                'document_id' : doc_id,
+                'len_in_docs' : len_in_docs,
+                'is_retry'    : is_retry
+            })
+        )
+        self._in_flight_file.truncate()
+        self._in_flight_file.flush()
+
+    def clear_in_flight(self : Quarantine) -> None:
+        # called when the run ends or stops early at a doc batch boundary
+        self._in_flight_file.seek(0)
+        self._in_flight_file.truncate()
+        self._in_flight_file.flush()
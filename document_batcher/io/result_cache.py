@@ -0,0 +1,116 @@
+from __future__ import annotations
+import json
+import sqlite3
+import hashlib
+from logging import Logger
+
+from ..document.document import Document
+
+
+class ResultCache:
+
+    #######################################################
+    #### persistent store of predicted statistics keyed by
+    ####     a hash of the doc text and the processor version,
+    ####     so that exact-duplicate docs (within a run or
+    ####     across runs) are processed only once
+
+    def __init__(
+        self              : ResultCache,
+        logger            : Logger = None, # required
+        file_path         : str    = None, # required
+        processor_version : str    = None  # required
+    ) -> ResultCache:
+        assert isinstance(logger, Logger)
+        assert isinstance(file_path, str)
+        assert isinstance(processor_version, str)
+
+        self._logger            = logger            ; del logger
+        self._file_path         = file_path         ; del file_path
+        self._processor_version = processor_version ; del processor_version
+
+        self._logger.debug(
+            'io.result_cache: ResultCache.__init__: file_path: {0}'
+            .format(
+                self._file_path
+            )
+        )
+
+        self._connection = sqlite3.connect(self._file_path)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'text_hash BLOB PRIMARY KEY, '
+            'predicted_statistics TEXT NOT NULL)'
+        )
+        self._connection.commit()
+
+
+    #######################################################
+    #### hash of the doc text; the processor version is
+    ####     part of the key so that results of different
+    ####     processor versions never collide
+
+    def get_text_hash(
+        self : ResultCache,
+        doc  : Document
+    ) -> bytes:
+        assert isinstance(doc, Document)
+        text_hasher = hashlib.blake2b(digest_size=16)
+        text_hasher.update(self._processor_version.encode('utf-8'))
+        text_hasher.update(b'\0')
+        text_hasher.update(doc.get_full_text().encode('utf-8'))
+        return text_hasher.digest()
+
+
+    #######################################################
+    #### look up and store predicted statistics
+
+    def get_predicted_statistics(
+        self      : ResultCache,
+        text_hash : bytes
+    ) -> dict | None:
+        assert isinstance(text_hash, bytes)
+        row = self._connection.execute(
+            'SELECT predicted_statistics FROM results WHERE text_hash = ?',
+            (text_hash,)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    @staticmethod
+    def _has_only_str_keys(value) -> bool:
+        if isinstance(value, dict):
+            return all(
+                isinstance(key, str) and ResultCache._has_only_str_keys(item)
+                for key, item in value.items()
+            )
+        if isinstance(value, (list, tuple)):
+            return all(ResultCache._has_only_str_keys(item) for item in value)
+        return True
+
+    def put_predicted_statistics(
+        self                 : ResultCache,
+        text_hash            : bytes,
+        predicted_statistics : dict
+    ) -> None:
+        # the predicted statistics are stored as json, so a result served
+        #     from the cache has lists where the processor set tuples; dict
+        #     keys other than str would silently become str, so they are
+        #     rejected rather than served differently from a fresh result
+        assert isinstance(text_hash, bytes)
+        assert isinstance(predicted_statistics, dict)
+        assert ResultCache._has_only_str_keys(predicted_statistics), \
+            'the predicted statistics stored in a result cache ' \
+            'must only have str dict keys'
+        self._connection.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?)',
+            (text_hash, json.dumps(predicted_statistics))
+        )
+
+    def commit(self : ResultCache) -> None:
+        self._connection.commit()
+
+    def close(self : ResultCache) -> None:
+        self._connection.commit()
+        self._connection.close()
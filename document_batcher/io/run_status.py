@@ -0,0 +1,415 @@
+from __future__ import annotations
+import os
+import json
+import datetime
+from logging import Logger
+
+from .input_cache import InputCache
+from .input_file import InputFile
+from .output_file import OutputFile
+from .output_index import OutputIndex
+from .segmented_output_file import SegmentedOutputFile
+
+
+class RunStatus:
+
+    #######################################################
+    #### the progress of a run, reported without loading
+    ####     the input or the output file cache, so that it
+    ####     takes well under a second on any size of run
+    ####     and can be polled from cron or a dashboard
+    ####
+    #### totals           : the header of the input file
+    ####                    cache, adjusted for the max sent
+    ####                    len (see InputCache), which
+    ####                    only decodes the truncated docs
+    #### done             : the header of the output index,
+    ####                    once the output file is
+    ####                    finalized; until then, the
+    ####                    progress file of the output file
+    ####                    (see OutputFile), plus a scan of
+    ####                    the few docs written after it
+    #### last doc batch,
+    #### rate and eta     : the doc batch datetimes of the
+    ####                    docs in the tail of the output
+    ####                    file
+    ####
+    #### only docs of complete doc batches are counted as
+    ####     done, as a doc batch that was only partly
+    ####     written is deleted when the run is resumed;
+    ####     with an InputSelection, the totals are still
+    ####     those of the whole input file
+    ####
+    #### for a SegmentedOutputFile, the docs of the
+    ####     completed segments are counted from the
+    ####     manifest, and only the current segment is
+    ####     read as above
+
+    def __init__(
+        self                  : RunStatus,
+        logger                : Logger = None,    # required
+        input_file_path       : str    = None,    # required
+        output_file_path      : str    = None,    # required
+        cache_dir_path        : str    = None,    # optional
+        max_sent_len_in_chars : int    = 2048,    # optional
+        tail_len_in_bytes     : int    = 1 << 20  # optional
+    ) -> RunStatus:
+        assert isinstance(logger, Logger)
+        assert isinstance(input_file_path, str)
+        assert isinstance(output_file_path, str)
+        assert (
+            isinstance(cache_dir_path, str)
+            or cache_dir_path is None
+        )
+        assert isinstance(max_sent_len_in_chars, int)
+        assert 0 < max_sent_len_in_chars
+        assert isinstance(tail_len_in_bytes, int)
+        assert 0 < tail_len_in_bytes
+
+        self._logger                = logger                ; del logger
+        self._input_file_path       = input_file_path       ; del input_file_path
+        self._output_file_path      = output_file_path      ; del output_file_path
+        self._cache_dir_path        = cache_dir_path        ; del cache_dir_path
+        self._max_sent_len_in_chars = max_sent_len_in_chars ; del max_sent_len_in_chars
+        self._tail_len_in_bytes     = tail_len_in_bytes     ; del tail_len_in_bytes
+
+
+    #######################################################
+    #### output docs; a line that does not parse is the
+    ####     last line, in the middle of being written
+
+    @staticmethod
+    def _parse_output_doc_line(line : bytes) -> dict | None:
+        try:
+            output_doc_dict = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(output_doc_dict, dict):
+            return None
+        return output_doc_dict
+
+    @staticmethod
+    def _get_datetime(datetime_str : str) -> datetime.datetime | None:
+        # None for 'not first doc in doc batch' and 'not last doc in doc batch';
+        #     a naive datetime, which Document accepts, is taken to be utc
+        try:
+            parsed_datetime = datetime.datetime.fromisoformat(datetime_str)
+        except (TypeError, ValueError):
+            return None
+        if parsed_datetime.tzinfo is None:
+            parsed_datetime = parsed_datetime.replace(tzinfo=datetime.timezone.utc)
+        return parsed_datetime
+
+
+    #######################################################
+    #### count the docs of the complete doc batches in the
+    ####     output file, from a byte offset to its end
+
+    def _scan_output_file(
+        self              : RunStatus,
+        output_file_path  : str,
+        begin_byte_offset : int
+    ) -> tuple[int, int, int, int, int]:
+        # returns n_docs, n_sents, n_words, n_chars and n_bytes_scanned
+        n_done    = [0, 0, 0, 0]
+        n_pending = [0, 0, 0, 0]
+        n_bytes_scanned = 0
+
+        with open(output_file_path, 'rb') as output_file:
+            output_file.seek(begin_byte_offset)
+            remainder = b''
+            while True:
+                chunk = output_file.read(1 << 20)
+                n_bytes_scanned += len(chunk)
+                lines = (remainder + chunk).split(b'\n')
+                # the output file has no trailing newline, so the last line
+                #     is only held back while there is more to read
+                remainder = lines.pop() if 0 < len(chunk) else b''
+                for line in lines:
+                    if 0 == len(line):
+                        continue
+                    output_doc_dict = RunStatus._parse_output_doc_line(line)
+                    if output_doc_dict is None:
+                        break
+                    n_pending[0] += 1
+                    n_pending[1] += output_doc_dict['len_in_sents']
+                    n_pending[2] += output_doc_dict['len_in_words']
+                    n_pending[3] += output_doc_dict['len_in_chars']
+                    if RunStatus._get_datetime(
+                        output_doc_dict['end_doc_batch_datetime']
+                    ) is not None:
+                        n_done    = [done + pending for done, pending in zip(n_done, n_pending)]
+                        n_pending = [0, 0, 0, 0]
+                if 0 == len(chunk):
+                    break
+
+        return (*n_done, n_bytes_scanned)
+
+
+    #######################################################
+    #### last doc batch and current rate, from the tail of
+    ####     the output file
+
+    def _read_output_file_tail(
+        self             : RunStatus,
+        output_file_path : str
+    ) -> dict:
+        file_len_in_bytes = os.path.getsize(output_file_path)
+        begin_byte_offset = max(0, file_len_in_bytes - self._tail_len_in_bytes)
+        with open(output_file_path, 'rb') as output_file:
+            output_file.seek(begin_byte_offset)
+            lines = output_file.read().split(b'\n')
+        if 0 < begin_byte_offset:
+            lines = lines[1:] # the first line is only a part of a doc
+
+        # (len_in_chars, begin datetime, end datetime) of each doc
+        tail_docs = []
+        for line in lines:
+            output_doc_dict = RunStatus._parse_output_doc_line(line)
+            if output_doc_dict is None:
+                continue
+            tail_docs.append(
+                (
+                    output_doc_dict['len_in_chars'],
+                    RunStatus._get_datetime(output_doc_dict['begin_doc_batch_datetime']),
+                    RunStatus._get_datetime(output_doc_dict['end_doc_batch_datetime'])
+                )
+            )
+
+        end_indices = [
+            doc_index
+            for doc_index, (_, _, end) in enumerate(tail_docs)
+            if end is not None
+        ]
+        tail = {
+            'last_doc_batch_end_datetime' : None,
+            'n_docs_per_sec'              : None,
+            'n_chars_per_sec'             : None
+        }
+        if 0 == len(end_indices):
+            return tail
+        last_end = tail_docs[end_indices[-1]][2]
+        tail['last_doc_batch_end_datetime'] = last_end
+
+        # the rate over the complete doc batches in the tail: from the end
+        #     of the first one to the end of the last one, which includes
+        #     the time spent between doc batches; with a single doc batch
+        #     in the tail, from its beginning to its end
+        if 1 < len(end_indices):
+            begin_doc_index = end_indices[0] + 1
+            begin = tail_docs[end_indices[0]][2]
+        else:
+            begin_doc_index = None
+            begin = None
+            for doc_index in range(end_indices[-1], -1, -1):
+                if tail_docs[doc_index][1] is not None:
+                    begin_doc_index = doc_index
+                    begin = tail_docs[doc_index][1]
+                    break
+            if begin is None:
+                return tail
+        n_secs = (last_end - begin).total_seconds()
+        if n_secs <= 0.0:
+            return tail
+        docs = tail_docs[begin_doc_index:end_indices[-1]+1]
+        tail['n_docs_per_sec']  = len(docs) / n_secs
+        tail['n_chars_per_sec'] = sum(len_in_chars for len_in_chars, _, _ in docs) / n_secs
+        return tail
+
+
+    #######################################################
+    #### the docs done in an output file, or in the
+    ####     current segment of a segmented output file
+
+    def _get_output_file_progress(
+        self             : RunStatus,
+        output_file_path : str
+    ) -> tuple[str, tuple[int, int, int, int], int]:
+        # returns the state, n_done and n_bytes_scanned
+        output_index_header = OutputIndex.read_header(
+            OutputFile.get_index_file_path_of(output_file_path)
+        )
+        n_bytes_scanned = 0
+        if not os.path.isfile(output_file_path):
+            state = 'not started'
+            n_done = (0, 0, 0, 0)
+        elif output_index_header is not None:
+            state = 'finalized'
+            n_done = output_index_header
+        else:
+            state = 'in progress'
+            progress = None
+            progress_file_path = OutputFile.get_progress_file_path_of(output_file_path)
+            if os.path.isfile(progress_file_path):
+                with open(progress_file_path, 'r') as progress_file:
+                    progress = json.load(progress_file)
+            if (
+                progress is None
+                or os.path.getsize(output_file_path) < progress['file_len_in_bytes']
+            ):
+                # no progress file, e.g. for a run started by an earlier
+                #     version, or one that the output file has since been
+                #     truncated below: scan the whole output file
+                progress = {
+                    'file_len_in_docs'  : 0,
+                    'file_len_in_sents' : 0,
+                    'file_len_in_words' : 0,
+                    'file_len_in_chars' : 0,
+                    'file_len_in_bytes' : 0
+                }
+            *n_scanned, n_bytes_scanned = self._scan_output_file(
+                output_file_path,
+                progress['file_len_in_bytes']
+            )
+            n_done = tuple(
+                n_in_progress + n
+                for n_in_progress, n in zip(
+                    [
+                        progress['file_len_in_docs'],
+                        progress['file_len_in_sents'],
+                        progress['file_len_in_words'],
+                        progress['file_len_in_chars']
+                    ],
+                    n_scanned
+                )
+            )
+        return state, n_done, n_bytes_scanned
+
+    def _get_segmented_output_file_progress(
+        self     : RunStatus,
+        manifest : dict
+    ) -> tuple[str, tuple[int, int, int, int], int, str | None]:
+        # returns the state, n_done, n_bytes_scanned and the path of the
+        #     segment to read the tail of
+        n_done = tuple(
+            sum(segment[key] for segment in manifest['segments'])
+            for key in ['n_docs', 'n_sents', 'n_words', 'n_chars']
+        )
+        n_bytes_scanned = 0
+        tail_file_path = (
+            os.path.join(
+                os.path.dirname(self._output_file_path),
+                manifest['segments'][-1]['file_name']
+            )
+            if 0 < len(manifest['segments']) else None
+        )
+        if manifest['finalized']:
+            return 'finalized', n_done, n_bytes_scanned, tail_file_path
+        segment_file_path = SegmentedOutputFile.get_segment_file_path_of(
+            self._output_file_path,
+            len(manifest['segments'])
+        )
+        if os.path.isfile(segment_file_path):
+            _, segment_n_done, n_bytes_scanned = \
+                self._get_output_file_progress(segment_file_path)
+            n_done = tuple(
+                n + segment_n
+                for n, segment_n in zip(n_done, segment_n_done)
+            )
+            tail_file_path = segment_file_path
+        return 'in progress', n_done, n_bytes_scanned, tail_file_path
+
+
+    #######################################################
+    #### status
+
+    def get_status(self : RunStatus) -> dict:
+        status = {
+            'input_file_path'  : self._input_file_path,
+            'output_file_path' : self._output_file_path
+        }
+
+        input_cache_file_path = InputFile.get_mmap_cache_file_path_of(
+            self._input_file_path,
+            self._cache_dir_path
+        )
+        if InputCache.read_header(input_cache_file_path) is None:
+            # the input file cache has not been built yet
+            status['n_docs_total']  = None
+            status['n_sents_total'] = None
+            status['n_words_total'] = None
+            status['n_chars_total'] = None
+        else:
+            input_cache = InputCache(
+                logger                = self._logger,
+                cache_file_path       = input_cache_file_path,
+                max_sent_len_in_chars = self._max_sent_len_in_chars
+            )
+            status['n_docs_total']  = input_cache.get_file_len_in_docs()
+            status['n_sents_total'] = input_cache.get_file_len_in_sents()
+            status['n_words_total'] = input_cache.get_file_len_in_words()
+            status['n_chars_total'] = input_cache.get_file_len_in_chars()
+            input_cache.close()
+
+        manifest = SegmentedOutputFile.read_manifest(self._output_file_path)
+        if (
+            manifest is None
+            and os.path.isfile(
+                SegmentedOutputFile.get_segment_file_path_of(self._output_file_path, 0)
+            )
+        ):
+            # the first segment is not yet completed
+            manifest = {
+                'segments'  : [],
+                'finalized' : False
+            }
+        if manifest is None:
+            status['state'], n_done, n_bytes_scanned = \
+                self._get_output_file_progress(self._output_file_path)
+            tail_file_path = (
+                self._output_file_path
+                if 'not started' != status['state'] else None
+            )
+        else:
+            status['state'], n_done, n_bytes_scanned, tail_file_path = \
+                self._get_segmented_output_file_progress(manifest)
+        (
+            status['n_docs_done'],
+            status['n_sents_done'],
+            status['n_words_done'],
+            status['n_chars_done']
+        ) = n_done
+        status['n_bytes_scanned'] = n_bytes_scanned
+
+        status['fraction_done'] = (
+            status['n_chars_done'] / status['n_chars_total']
+            if status['n_chars_total'] else None
+        )
+
+        if tail_file_path is None:
+            tail = {
+                'last_doc_batch_end_datetime' : None,
+                'n_docs_per_sec'              : None,
+                'n_chars_per_sec'             : None
+            }
+        else:
+            tail = self._read_output_file_tail(tail_file_path)
+        status.update(tail)
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        status['n_secs_since_last_doc_batch'] = (
+            (now - tail['last_doc_batch_end_datetime']).total_seconds()
+            if tail['last_doc_batch_end_datetime'] is not None else None
+        )
+        if 'finalized' == status['state']:
+            status['eta_n_secs'] = 0.0
+        elif (
+            status['n_chars_total'] is not None
+            and tail['n_chars_per_sec'] is not None
+        ):
+            status['eta_n_secs'] = max(
+                0,
+                status['n_chars_total'] - status['n_chars_done']
+            ) / tail['n_chars_per_sec']
+        else:
+            status['eta_n_secs'] = None
+        status['eta_datetime'] = (
+            now + datetime.timedelta(seconds=status['eta_n_secs'])
+            if status['eta_n_secs'] is not None else None
+        )
+
+        for key in ['last_doc_batch_end_datetime', 'eta_datetime']:
+            if status[key] is not None:
+                status[key] = status[key].isoformat()
+
+        return status
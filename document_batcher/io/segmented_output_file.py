@@ -0,0 +1,487 @@
+from __future__ import annotations
+import os
+import json
+import bisect
+import datetime
+from textwrap import dedent
+from logging import Logger
+
+from ..document.document import Document
+from .output_file import OutputFile
+from ..validation import Validation
+
+
+class SegmentedOutputFile:
+
+    #######################################################
+    #### an output file that is written as a sequence of
+    ####     segments, i.e. output files of their own, for
+    ####     DocumentBatchIterator
+    ####
+    #### the current segment is rolled over at the end of
+    ####     the doc batch with which it reaches
+    ####     segment_max_n_docs docs or segment_max_n_bytes
+    ####     bytes: it is finalized, which writes its index,
+    ####     and recorded in the manifest, a small json file
+    ####     with the file name and the lengths of every
+    ####     completed segment; a completed segment is never
+    ####     written again, so it can be shipped downstream,
+    ####     or read in parallel with the other segments,
+    ####     while the run continues
+    ####
+    #### a run is resumed from the manifest and the current
+    ####     segment only: the docs of the completed segments
+    ####     are neither loaded nor replayed (see
+    ####     DocumentBatchIterator), so resuming takes time
+    ####     in the size of one segment rather than in the
+    ####     size of the output
+    ####
+    #### the segments of output.jsonl are
+    ####     output.segment_00000.jsonl,
+    ####     output.segment_00001.jsonl, ... and the manifest
+    ####     is output.segments.json; concatenating the
+    ####     segments in the order of the manifest, with a
+    ####     newline between two segments, gives the output
+    ####     file that OutputFile would have written
+
+    @staticmethod
+    def get_segment_file_path_of(
+        file_path     : str,
+        segment_index : int
+    ) -> str:
+        base, suffix = os.path.splitext(file_path)
+        return '{0}.segment_{1:05d}{2}'.format(base, segment_index, suffix)
+
+    @staticmethod
+    def get_manifest_file_path_of(file_path : str) -> str:
+        return \
+            OutputFile._get_file_path_without_suffix_of(file_path) \
+            + '.segments.json'
+
+    @staticmethod
+    def read_manifest(file_path : str) -> dict | None:
+        # None if no segment has been completed yet
+        manifest_file_path = SegmentedOutputFile.get_manifest_file_path_of(file_path)
+        if not os.path.isfile(manifest_file_path):
+            return None
+        with open(manifest_file_path, 'r') as manifest_file:
+            return json.load(manifest_file)
+
+    def __init__(
+        self                     : SegmentedOutputFile,
+        logger                   : Logger = None,  # required
+        file_path                : str    = None,  # required
+        predicted_statistics_key : str    = None,  # required
+        bounded_memory           : bool   = False, # optional
+        segment_max_n_docs       : int    = None,  # optional
+        segment_max_n_bytes      : int    = None   # optional, but one of the two is required
+    ) -> SegmentedOutputFile:
+        assert isinstance(logger, Logger)
+        assert isinstance(file_path, str)
+        assert isinstance(predicted_statistics_key, str)
+        assert isinstance(bounded_memory, bool)
+        assert (
+            isinstance(segment_max_n_docs, int)
+            and 0 < segment_max_n_docs
+            or segment_max_n_docs is None
+        )
+        assert (
+            isinstance(segment_max_n_bytes, int)
+            and 0 < segment_max_n_bytes
+            or segment_max_n_bytes is None
+        )
+        assert (
+            segment_max_n_docs is not None
+            or segment_max_n_bytes is not None
+        ), 'segment_max_n_docs or segment_max_n_bytes is required'
+
+        self._logger                   = logger                   ; del logger
+        self._file_path                = file_path                ; del file_path
+        self._predicted_statistics_key = predicted_statistics_key ; del predicted_statistics_key
+        self._bounded_memory           = bounded_memory           ; del bounded_memory
+        self._segment_max_n_docs       = segment_max_n_docs       ; del segment_max_n_docs
+        self._segment_max_n_bytes      = segment_max_n_bytes      ; del segment_max_n_bytes
+
+        self._logger.debug(
+            dedent(
+                '''\
+                io.segmented_output_file: SegmentedOutputFile.__init__:
+                file_path: {0}: segment_max_n_docs: {1}:
+                segment_max_n_bytes: {2}'''
+            ).replace('\n', ' ').format(
+                self._file_path,
+                self._segment_max_n_docs,
+                self._segment_max_n_bytes
+            )
+        )
+
+        self._manifest = SegmentedOutputFile.read_manifest(self._file_path)
+        if self._manifest is None:
+            self._manifest = {
+                'segments'  : [],
+                'finalized' : False
+            }
+
+        # the completed segment that docs were last read from, opened lazily,
+        #     and the index after the last doc of each completed segment
+        self._completed_segment_index  = None
+        self._completed_segment        = None
+        self._segment_end_doc_indices  = []
+
+        # time spent writing docs to a segment that has since been rolled
+        #     over, for pop_stage_n_secs
+        self._carried_stage_n_secs = {
+            'serialize' : 0.0,
+            'write'     : 0.0
+        }
+
+        # the doc batches in the current segment, for its manifest entry
+        self._segment_n_secs          = 0.0
+        self._segment_n_doc_batches   = 0
+        self._segment_begin_datetime  = None
+        self._is_open_for_appending   = False
+
+        # the current segment, or None while it has no docs
+        self._segment = None
+        while not self._manifest['finalized']:
+            segment_file_path = self._get_segment_file_path(len(self._manifest['segments']))
+            if not os.path.isfile(segment_file_path):
+                break
+            self._segment = self._open_segment(len(self._manifest['segments']))
+            if 0 == self._segment.get_file_len_in_docs():
+                self._segment = None
+                break
+            if not self._segment.is_finalized():
+                break
+            # the run was interrupted after the segment was finalized but
+            #     before it was recorded in the manifest
+            self._logger.warning(
+                dedent(
+                    '''\
+                    io.segmented_output_file: SegmentedOutputFile.__init__:
+                    segment {0} is finalized but missing from the manifest:
+                    adding it'''
+                ).replace('\n', ' ').format(
+                    len(self._manifest['segments'])
+                )
+            )
+            self._count_doc_batches_in_segment()
+            self._complete_segment()
+
+        self._completed_lens = [
+            sum(segment[key] for segment in self._manifest['segments'])
+            for key in ['n_docs', 'n_sents', 'n_words', 'n_chars']
+        ]
+
+        self._logger.debug(
+            dedent(
+                '''\
+                io.segmented_output_file: SegmentedOutputFile.__init__:
+                {0} completed segments with {1} docs:
+                {2} docs in the current segment'''
+            ).replace('\n', ' ').format(
+                len(self._manifest['segments']),
+                self._completed_lens[0],
+                0 if self._segment is None else self._segment.get_file_len_in_docs()
+            )
+        )
+
+
+    #######################################################
+    #### segments and the manifest
+
+    def _get_segment_file_path(
+        self          : SegmentedOutputFile,
+        segment_index : int
+    ) -> str:
+        return SegmentedOutputFile.get_segment_file_path_of(
+            self._file_path,
+            segment_index
+        )
+
+    def _open_segment(
+        self          : SegmentedOutputFile,
+        segment_index : int
+    ) -> OutputFile:
+        return OutputFile(
+            logger                   = self._logger,
+            file_path                = self._get_segment_file_path(segment_index),
+            predicted_statistics_key = self._predicted_statistics_key,
+            bounded_memory           = self._bounded_memory
+        )
+
+    def _write_manifest_to_disk(self : SegmentedOutputFile) -> None:
+        manifest_file_path = SegmentedOutputFile.get_manifest_file_path_of(self._file_path)
+        tmp_file_path = manifest_file_path + '.tmp'
+        with open(tmp_file_path, 'w') as manifest_file:
+            manifest_file.write(json.dumps(self._manifest, indent=2) + '\n')
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(tmp_file_path, manifest_file_path)
+
+    def _count_doc_batches_in_segment(self : SegmentedOutputFile) -> None:
+        # the doc batches already in the current segment, e.g. when a run
+        #     is resumed; decodes every doc of the segment
+        self._segment_n_secs         = 0.0
+        self._segment_n_doc_batches  = 0
+        self._segment_begin_datetime = None
+        for doc_index in range(self._segment.get_file_len_in_docs()):
+            self._count_doc_batch(self._segment.get_output_doc_at_index(doc_index))
+
+    def _count_doc_batch(
+        self : SegmentedOutputFile,
+        doc  : Document
+    ) -> bool:
+        # returns whether doc is the last doc of its doc batch
+        begin_datetime = doc.get_begin_doc_batch_datetime()
+        if isinstance(begin_datetime, datetime.datetime):
+            self._segment_begin_datetime = begin_datetime
+        end_datetime = doc.get_end_doc_batch_datetime()
+        if not isinstance(end_datetime, datetime.datetime):
+            return False
+        if self._segment_begin_datetime is not None:
+            self._segment_n_secs += \
+                (end_datetime - self._segment_begin_datetime).total_seconds()
+        self._segment_n_doc_batches  += 1
+        self._segment_begin_datetime  = None
+        return True
+
+    def _is_segment_full(self : SegmentedOutputFile) -> bool:
+        return (
+            self._segment_max_n_docs is not None
+            and self._segment_max_n_docs <= self._segment.get_file_len_in_docs()
+            or self._segment_max_n_bytes is not None
+            and self._segment_max_n_bytes <= self._segment.get_file_len_in_bytes()
+        )
+
+    def _complete_segment(self : SegmentedOutputFile) -> None:
+        # finalize the current segment and record it in the manifest
+        if not self._segment.is_finalized():
+            stage_n_secs = self._segment.pop_stage_n_secs()
+            for stage in self._carried_stage_n_secs:
+                self._carried_stage_n_secs[stage] += stage_n_secs[stage]
+            self._segment.write_cache_to_disk()
+        segment_file_path = self._get_segment_file_path(len(self._manifest['segments']))
+        self._manifest['segments'].append({
+            'file_name'     : os.path.basename(segment_file_path),
+            'n_docs'        : self._segment.get_file_len_in_docs(),
+            'n_sents'       : self._segment.get_file_len_in_sents(),
+            'n_words'       : self._segment.get_file_len_in_words(),
+            'n_chars'       : self._segment.get_file_len_in_chars(),
+            'n_bytes'       : os.path.getsize(segment_file_path),
+            'n_secs'        : self._segment_n_secs,
+            'n_doc_batches' : self._segment_n_doc_batches
+        })
+        self._write_manifest_to_disk()
+        self._segment = None
+        self._segment_n_secs         = 0.0
+        self._segment_n_doc_batches  = 0
+        self._segment_begin_datetime = None
+
+    def _roll_over(self : SegmentedOutputFile) -> None:
+        segment_len_in_docs = self._segment.get_file_len_in_docs()
+        for key_index, n in enumerate([
+            segment_len_in_docs,
+            self._segment.get_file_len_in_sents(),
+            self._segment.get_file_len_in_words(),
+            self._segment.get_file_len_in_chars()
+        ]):
+            self._completed_lens[key_index] += n
+        self._complete_segment()
+        self._logger.info(
+            dedent(
+                '''\
+                io.segmented_output_file: SegmentedOutputFile.append_output_doc:
+                completed segment {0} with {1} docs
+                ({2} docs in all completed segments)'''
+            ).replace('\n', ' ').format(
+                len(self._manifest['segments']) - 1,
+                segment_len_in_docs,
+                self._completed_lens[0]
+            )
+        )
+
+    def get_n_docs_in_completed_segments(self : SegmentedOutputFile) -> int:
+        return self._completed_lens[0]
+
+    def get_completed_segments_totals(self : SegmentedOutputFile) -> dict:
+        # the lengths of the completed segments and the time spent on their
+        #     doc batches, so that the monitor can be brought up to date
+        #     without replaying their docs
+        return {
+            'n_doc_batches' : sum(segment['n_doc_batches'] for segment in self._manifest['segments']),
+            'n_docs'        : self._completed_lens[0],
+            'n_sents'       : self._completed_lens[1],
+            'n_words'       : self._completed_lens[2],
+            'n_chars'       : self._completed_lens[3],
+            'n_secs'        : float(sum(segment['n_secs'] for segment in self._manifest['segments']))
+        }
+
+    def is_bounded_memory(self : SegmentedOutputFile) -> bool:
+        return self._bounded_memory
+
+
+    #######################################################
+    #### finalize: the last segment is completed and the
+    ####     manifest is marked as finalized
+
+    def write_cache_to_disk(self : SegmentedOutputFile) -> None:
+        assert not self._manifest['finalized']
+        if self._segment is not None:
+            self._roll_over()
+        self._manifest['finalized'] = True
+        self._write_manifest_to_disk()
+        self._is_open_for_appending = False
+
+    def cache_exists(self : SegmentedOutputFile) -> bool:
+        return self._manifest['finalized']
+
+    def is_finalized(self : SegmentedOutputFile) -> bool:
+        return self._manifest['finalized']
+
+
+    #######################################################
+    #### the length of the output, over all segments
+
+    def get_file_len_in_docs(self : SegmentedOutputFile) -> int:
+        return self._completed_lens[0] + (
+            0 if self._segment is None else self._segment.get_file_len_in_docs()
+        )
+
+    def get_file_len_in_sents(self : SegmentedOutputFile) -> int:
+        return self._completed_lens[1] + (
+            0 if self._segment is None else self._segment.get_file_len_in_sents()
+        )
+
+    def get_file_len_in_words(self : SegmentedOutputFile) -> int:
+        return self._completed_lens[2] + (
+            0 if self._segment is None else self._segment.get_file_len_in_words()
+        )
+
+    def get_file_len_in_chars(self : SegmentedOutputFile) -> int:
+        return self._completed_lens[3] + (
+            0 if self._segment is None else self._segment.get_file_len_in_chars()
+        )
+
+
+    #######################################################
+    #### get a document by its index in the output; a doc
+    ####     of a completed segment is read through the
+    ####     index of that segment
+
+    def get_output_doc_at_index(
+        self      : SegmentedOutputFile,
+        doc_index : int
+    ) -> Document:
+        assert 0 <= doc_index and doc_index < self.get_file_len_in_docs(), \
+            'doc_index is {0} but should be in the interval [0, {1}]' \
+            .format(
+                doc_index,
+                self.get_file_len_in_docs() - 1
+            )
+        if self._completed_lens[0] <= doc_index:
+            return self._segment.get_output_doc_at_index(
+                doc_index - self._completed_lens[0]
+            )
+        for segment in self._manifest['segments'][len(self._segment_end_doc_indices):]:
+            self._segment_end_doc_indices.append(
+                segment['n_docs'] + (
+                    self._segment_end_doc_indices[-1]
+                    if 0 < len(self._segment_end_doc_indices) else 0
+                )
+            )
+        segment_index = bisect.bisect_right(self._segment_end_doc_indices, doc_index)
+        if segment_index != self._completed_segment_index:
+            self._completed_segment       = self._open_segment(segment_index)
+            self._completed_segment_index = segment_index
+            if Validation.boundary:
+                assert self._completed_segment.is_finalized()
+        return self._completed_segment.get_output_doc_at_index(
+            doc_index - (
+                self._segment_end_doc_indices[segment_index-1]
+                if 0 < segment_index else 0
+            )
+        )
+
+
+    #######################################################
+    #### resume: only the docs of the current segment can
+    ####     be deleted
+
+    def delete_output_docs_after_index(
+        self      : SegmentedOutputFile,
+        doc_index : int
+    ) -> None:
+        assert self._completed_lens[0] - 1 <= doc_index, \
+            'the docs of the completed segments cannot be deleted'
+        if self._segment is None:
+            assert self._completed_lens[0] - 1 == doc_index
+            return
+        self._segment.delete_output_docs_after_index(
+            doc_index - self._completed_lens[0]
+        )
+        if 0 == self._segment.get_file_len_in_docs():
+            # the segment file has been removed
+            self._segment = None
+
+    def open_for_appending(self : SegmentedOutputFile) -> None:
+        assert not self._manifest['finalized']
+        assert not self._is_open_for_appending
+        self._is_open_for_appending = True
+        if self._segment is not None:
+            self._segment.open_for_appending()
+            self._count_doc_batches_in_segment()
+
+
+    #######################################################
+    #### flush the current segment
+
+    def flush(
+        self : SegmentedOutputFile,
+        sync : bool = False
+    ) -> None:
+        if self._segment is not None:
+            self._segment.flush(sync=sync)
+
+
+    #######################################################
+    #### append a document to the current segment, which
+    ####     is rolled over at the end of a doc batch once
+    ####     it is full
+
+    def append_output_doc(
+        self : SegmentedOutputFile,
+        doc  : Document
+    ) -> None:
+        if Validation.full:
+            assert self._is_open_for_appending
+
+        if self._segment is None:
+            assert not os.path.isfile(
+                self._get_segment_file_path(len(self._manifest['segments']))
+            )
+            self._segment = self._open_segment(len(self._manifest['segments']))
+            self._segment.open_for_appending()
+
+        self._segment.append_output_doc(doc)
+
+        if (
+            self._count_doc_batch(doc)
+            and self._is_segment_full()
+        ):
+            self._roll_over()
+
+
+    #######################################################
+    #### time spent serializing and writing docs
+
+    def pop_stage_n_secs(self : SegmentedOutputFile) -> dict:
+        stage_n_secs = self._carried_stage_n_secs
+        if self._segment is not None:
+            for stage, n_secs in self._segment.pop_stage_n_secs().items():
+                stage_n_secs[stage] += n_secs
+        self._carried_stage_n_secs = {
+            'serialize' : 0.0,
+            'write'     : 0.0
+        }
+        return stage_n_secs
@@ -0,0 +1,375 @@
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import collections
+from textwrap import dedent
+from logging import Logger
+from typing import Iterable
+
+try:
+    import select
+except ImportError:
+    select = None
+
+from ..document.document import Document
+from .output_index import OutputIndex
+
+
+class StreamingInputFile:
+
+    #######################################################
+    #### an unbounded stream of jsonl input docs read from
+    ####     a file descriptor, e.g. stdin at the end of a
+    ####     zcat | jq pipeline or a named pipe fed by a
+    ####     database export, for DocumentBatchIterator
+    ####
+    #### unlike InputFile, nothing is cached: each doc is
+    ####     segmented as its line arrives, so memory is
+    ####     bounded by the doc batch (and the longest line)
+    ####     rather than by the input; the length of the
+    ####     stream is unknown, so get_file_len_in_* return
+    ####     None and the monitor reports throughput without
+    ####     a remaining time estimate
+    ####
+    #### with max_wait_in_secs, a doc batch is handed out
+    ####     before it is full when no further doc arrives
+    ####     within that many seconds, so that a slow stream
+    ####     does not hold back the docs already read
+    ####
+    #### a stream cannot be rewound, so a run is resumed by
+    ####     replaying the stream: the docs whose ids are
+    ####     already in the output file are skipped (see
+    ####     skip_doc_id_hashes), and the output file should
+    ####     be opened with bounded_memory so that its size
+    ####     does not bound the run either; the docs of the
+    ####     completed segments of a SegmentedOutputFile are
+    ####     skipped by their count instead (see
+    ####     skip_input_docs)
+
+    _READ_SIZE = 1 << 16
+
+    @staticmethod
+    def hash_doc_id(doc_id : str) -> bytes:
+        # the committed doc ids are held as short hashes
+        return OutputIndex.hash_doc_id(doc_id)
+
+    def __init__(
+        self                  : StreamingInputFile,
+        logger                : Logger = None,  # required
+        file_descriptor       : int    = 0,     # optional, stdin by default
+        max_sent_len_in_chars : int    = 2048,  # optional
+        max_wait_in_secs      : float  = None   # optional
+    ) -> StreamingInputFile:
+        assert isinstance(logger, Logger)
+        assert isinstance(file_descriptor, int)
+        assert 0 <= file_descriptor
+        assert isinstance(max_sent_len_in_chars, int)
+        assert 0 < max_sent_len_in_chars
+        assert (
+            isinstance(max_wait_in_secs, (int, float))
+            and 0 < max_wait_in_secs
+            or max_wait_in_secs is None
+        )
+
+        self._logger                = logger                ; del logger
+        self._file_descriptor       = file_descriptor       ; del file_descriptor
+        self._max_sent_len_in_chars = max_sent_len_in_chars ; del max_sent_len_in_chars
+        self._max_wait_in_secs      = max_wait_in_secs      ; del max_wait_in_secs
+
+        if (
+            self._max_wait_in_secs is not None
+            and (select is None or 'nt' == os.name)
+        ):
+            # select only supports sockets on windows
+            self._logger.warning(
+                dedent(
+                    '''\
+                    io.streaming_input_file: StreamingInputFile.__init__:
+                    max_wait_in_secs is not supported on this platform:
+                    doc batches are only handed out once they are full'''
+                ).replace('\n', ' ')
+            )
+            self._max_wait_in_secs = None
+
+        self._logger.debug(
+            dedent(
+                '''\
+                io.streaming_input_file: StreamingInputFile.__init__:
+                file_descriptor: {0}: max_wait_in_secs: {1}'''
+            ).replace('\n', ' ').format(
+                self._file_descriptor,
+                self._max_wait_in_secs
+            )
+        )
+
+        # bytes read from the stream and not yet consumed, from
+        #     self._buffer_begin on
+        self._buffer       = bytearray()
+        self._buffer_begin = 0
+        self._is_eof       = False
+
+        self._next_input_doc = None
+        self._n_lines        = 0
+        self._n_docs_read    = 0
+
+        # hashes of the doc ids to skip, with their counts
+        self._skip_doc_id_hash_counts = collections.Counter()
+        self._n_docs_to_skip          = 0
+        self._n_docs_skipped          = 0
+
+        self._n_truncated_sents = 0
+        self._n_truncated_docs  = 0
+
+
+    #######################################################
+    #### resume: skip the docs of the stream that are
+    ####     already in the output file; a hash is dropped
+    ####     once its doc has been skipped, so a stream that
+    ####     is replayed in the same order empties the set
+    ####     as it goes
+
+    def skip_doc_id_hashes(
+        self           : StreamingInputFile,
+        doc_id_hashes  : Iterable[bytes]
+    ) -> None:
+        assert 0 == self._n_lines, \
+            'the doc ids to skip must be set before the stream is read'
+        self._skip_doc_id_hash_counts.update(doc_id_hashes)
+        if 0 < len(self._skip_doc_id_hash_counts):
+            self._logger.info(
+                dedent(
+                    '''\
+                    io.streaming_input_file: StreamingInputFile.skip_doc_id_hashes:
+                    the {0} docs already in the output file
+                    are skipped when they are read from the stream'''
+                ).replace('\n', ' ').format(
+                    sum(self._skip_doc_id_hash_counts.values())
+                )
+            )
+
+
+    def skip_input_docs(
+        self   : StreamingInputFile,
+        n_docs : int
+    ) -> None:
+        # skip the first n_docs docs of the stream, which are already in
+        #     the completed segments of a SegmentedOutputFile; unlike the
+        #     skipped doc ids, this assumes that the stream is replayed in
+        #     the same order, but the skipped lines are not even parsed
+        assert 0 == self._n_lines, \
+            'the docs to skip must be set before the stream is read'
+        assert 0 <= n_docs
+        self._n_docs_to_skip = n_docs
+        if 0 < n_docs:
+            self._logger.info(
+                dedent(
+                    '''\
+                    io.streaming_input_file: StreamingInputFile.skip_input_docs:
+                    the first {0} docs of the stream are skipped
+                    as they are in the completed segments of the output'''
+                ).replace('\n', ' ').format(
+                    n_docs
+                )
+            )
+
+
+    #######################################################
+    #### line buffering on top of the file descriptor
+
+    def _find_line_end(self : StreamingInputFile) -> int:
+        return self._buffer.find(b'\n', self._buffer_begin)
+
+    def _fill_buffer(
+        self            : StreamingInputFile,
+        timeout_in_secs : float = None
+    ) -> bool:
+        # reads what the stream has, blocking for at most timeout_in_secs
+        #     if given; returns False on timeout
+        if timeout_in_secs is not None:
+            readable, _, _ = select.select(
+                [self._file_descriptor], [], [], max(0.0, timeout_in_secs)
+            )
+            if 0 == len(readable):
+                return False
+        # drop the consumed bytes before the buffer grows
+        if len(self._buffer) <= 2 * self._buffer_begin:
+            del self._buffer[:self._buffer_begin]
+            self._buffer_begin = 0
+        chunk = os.read(self._file_descriptor, StreamingInputFile._READ_SIZE)
+        if 0 == len(chunk):
+            self._is_eof = True
+        else:
+            self._buffer += chunk
+        return True
+
+    def _read_line(self : StreamingInputFile) -> bytes | None:
+        # the next line, blocking until it is complete, or None at the
+        #     end of the stream; the last line need not end with a newline
+        while True:
+            line_end = self._find_line_end()
+            if -1 != line_end:
+                line = bytes(self._buffer[self._buffer_begin:line_end])
+                self._buffer_begin = line_end + 1
+                return line
+            if self._is_eof:
+                if self._buffer_begin < len(self._buffer):
+                    line = bytes(self._buffer[self._buffer_begin:])
+                    self._buffer_begin = len(self._buffer)
+                    return line
+                return None
+            self._fill_buffer()
+
+    def is_next_input_doc_ready(self : StreamingInputFile) -> bool:
+        # whether a line is, or within max_wait_in_secs becomes, available
+        #     (or the stream ends), so that has_next_input_doc does not wait
+        #     for longer; always True without max_wait_in_secs
+        if (
+            self._max_wait_in_secs is None
+            or self._next_input_doc is not None
+        ):
+            return True
+        deadline = time.monotonic() + self._max_wait_in_secs
+        while (
+            -1 == self._find_line_end()
+            and not self._is_eof
+        ):
+            if not self._fill_buffer(deadline - time.monotonic()):
+                return False
+        return True
+
+
+    #######################################################
+    #### read documents from the stream
+
+    def has_next_input_doc(self : StreamingInputFile) -> bool:
+        # blocks until the next doc has arrived or the stream has ended
+        while self._next_input_doc is None:
+            line = self._read_line()
+            if line is None:
+                self._log_end_of_stream()
+                return False
+            self._n_lines += 1
+            if 0 == len(line.strip()):
+                continue
+            if 0 < self._n_docs_to_skip:
+                self._n_docs_to_skip -= 1
+                self._n_docs_skipped += 1
+                continue
+            try:
+                doc_dict = json.loads(line)
+            except ValueError as error:
+                self._logger.critical(
+                    dedent(
+                        '''\
+                        io.streaming_input_file: StreamingInputFile.has_next_input_doc:
+                        line {0} of the input stream is not valid json: {1}'''
+                    ).replace('\n', ' ').format(
+                        self._n_lines,
+                        error
+                    )
+                )
+                sys.exit(-1)
+            doc_id = Document.get_id_of_doc_dict(doc_dict)
+            if 0 < len(self._skip_doc_id_hash_counts) and doc_id is not None:
+                doc_id_hash = StreamingInputFile.hash_doc_id(doc_id)
+                if doc_id_hash in self._skip_doc_id_hash_counts:
+                    self._skip_doc_id_hash_counts[doc_id_hash] -= 1
+                    if 0 == self._skip_doc_id_hash_counts[doc_id_hash]:
+                        del self._skip_doc_id_hash_counts[doc_id_hash]
+                    self._n_docs_skipped += 1
+                    continue
+            self._next_input_doc = Document.from_input_doc_dict(
+                logger                = self._logger,
+                input_doc_dict        = doc_dict,
+                max_sent_len_in_chars = self._max_sent_len_in_chars
+            )
+            if 0 < self._next_input_doc.get_n_truncated_sents():
+                self._n_truncated_sents += self._next_input_doc.get_n_truncated_sents()
+                self._n_truncated_docs  += 1
+        return True
+
+    def get_next_input_doc(self : StreamingInputFile) -> Document:
+        assert self.has_next_input_doc()
+        input_doc = self._next_input_doc
+        self._next_input_doc = None
+        self._n_docs_read += 1
+        return input_doc
+
+    def get_n_docs_read(self : StreamingInputFile) -> int:
+        # not counting the skipped docs
+        return self._n_docs_read
+
+    def get_n_docs_skipped(self : StreamingInputFile) -> int:
+        return self._n_docs_skipped
+
+    def _log_end_of_stream(self : StreamingInputFile) -> None:
+        if hasattr(self, '_end_of_stream_logged'):
+            return
+        self._end_of_stream_logged = True
+        self._logger.info(
+            dedent(
+                '''\
+                io.streaming_input_file: StreamingInputFile.has_next_input_doc:
+                end of the input stream: {0} docs read, {1} docs skipped
+                as they were already in the output file'''
+            ).replace('\n', ' ').format(
+                self._n_docs_read,
+                self._n_docs_skipped
+            )
+        )
+        if 0 < self._n_truncated_sents:
+            self._logger.info(
+                dedent(
+                    '''\
+                    io.streaming_input_file: StreamingInputFile.has_next_input_doc:
+                    {0} sents in {1} docs were truncated to {2} chars:
+                    the truncation threshold can be adjusted with the option
+                    "--max-sent-len-in-chars len"'''
+                ).replace('\n', ' ').format(
+                    self._n_truncated_sents,
+                    self._n_truncated_docs,
+                    self._max_sent_len_in_chars
+                )
+            )
+        if 0 < self._n_docs_to_skip:
+            self._logger.warning(
+                dedent(
+                    '''\
+                    io.streaming_input_file: StreamingInputFile.has_next_input_doc:
+                    the input stream ended {0} docs before the end of the
+                    completed segments of the output: the stream that was
+                    resumed differs from the one the output was written from'''
+                ).replace('\n', ' ').format(
+                    self._n_docs_to_skip
+                )
+            )
+        if 0 < len(self._skip_doc_id_hash_counts):
+            self._logger.warning(
+                dedent(
+                    '''\
+                    io.streaming_input_file: StreamingInputFile.has_next_input_doc:
+                    {0} docs of the output file were not found in the
+                    input stream: the stream that was resumed differs from
+                    the one the output file was written from'''
+                ).replace('\n', ' ').format(
+                    sum(self._skip_doc_id_hash_counts.values())
+                )
+            )
+
+
+    #######################################################
+    #### file length statistics are unknown for a stream
+
+    def get_file_len_in_docs(self : StreamingInputFile) -> None:
+        return None
+
+    def get_file_len_in_sents(self : StreamingInputFile) -> None:
+        return None
+
+    def get_file_len_in_words(self : StreamingInputFile) -> None:
+        return None
+
+    def get_file_len_in_chars(self : StreamingInputFile) -> None:
+        return None
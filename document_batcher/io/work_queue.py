@@ -0,0 +1,265 @@
+from __future__ import annotations
+import os
+import sys
+import socket
+import sqlite3
+import time
+from textwrap import dedent
+from logging import Logger
+
+
+class WorkQueue:
+
+    #######################################################
+    #### work queue shared by any number of worker
+    ####     processes, possibly on different nodes
+    ####
+    #### the input file is split into ranges of consecutive
+    ####     docs; a worker leases a range, renews its lease
+    ####     with heartbeats while processing it, and marks
+    ####     it done when its output is complete; a range
+    ####     whose lease expired (because its worker died or
+    ####     stalled) can be leased again by any worker
+    ####
+    #### the queue is a sqlite database; every state change
+    ####     is a short immediate transaction, so workers
+    ####     serialize on the database lock only briefly;
+    ####     note that sqlite locking is only as reliable as
+    ####     the file locking of the storage it lives on
+
+    _STATES = ['pending', 'leased', 'done']
+
+    def __init__(
+        self              : WorkQueue,
+        logger            : Logger = None, # required
+        file_path         : str    = None, # required
+        file_len_in_docs  : int    = None, # required
+        range_len_in_docs : int    = 1024, # optional
+        lease_secs        : float  = 600,  # optional
+        worker_id         : str    = None  # optional
+    ) -> WorkQueue:
+        assert isinstance(logger, Logger)
+        assert isinstance(file_path, str)
+        assert isinstance(file_len_in_docs, int)
+        assert 0 < file_len_in_docs
+        assert isinstance(range_len_in_docs, int)
+        assert 0 < range_len_in_docs
+        assert 0 < lease_secs
+        if worker_id is None:
+            worker_id = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        assert isinstance(worker_id, str)
+
+        self._logger            = logger            ; del logger
+        self._file_path         = file_path         ; del file_path
+        self._file_len_in_docs  = file_len_in_docs  ; del file_len_in_docs
+        self._range_len_in_docs = range_len_in_docs ; del range_len_in_docs
+        self._lease_secs        = float(lease_secs) ; del lease_secs
+        self._worker_id         = worker_id         ; del worker_id
+
+        self._logger.debug(
+            'io.work_queue: WorkQueue.__init__: file_path: {0}: worker_id: {1}'
+            .format(
+                self._file_path,
+                self._worker_id
+            )
+        )
+
+        # autocommit mode; transactions are begun explicitly
+        self._connection = sqlite3.connect(
+            self._file_path,
+            timeout         = 60.0,
+            isolation_level = None
+        )
+
+        # the first worker creates the ranges; every later worker
+        #     checks that it splits the same input file the same way
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS meta ('
+                'key TEXT PRIMARY KEY, '
+                'value INTEGER NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS ranges ('
+                'range_index INTEGER PRIMARY KEY, '
+                'begin_doc_index INTEGER NOT NULL, '
+                'end_doc_index INTEGER NOT NULL, '
+                'state TEXT NOT NULL, '
+                'worker_id TEXT, '
+                'lease_expires_at REAL, '
+                'n_leases INTEGER NOT NULL)'
+            )
+            meta = dict(
+                self._connection.execute('SELECT key, value FROM meta').fetchall()
+            )
+            if 0 == len(meta):
+                self._connection.executemany(
+                    'INSERT INTO meta VALUES (?, ?)',
+                    [
+                        ('file_len_in_docs',  self._file_len_in_docs),
+                        ('range_len_in_docs', self._range_len_in_docs)
+                    ]
+                )
+                self._connection.executemany(
+                    'INSERT INTO ranges VALUES (?, ?, ?, ?, NULL, NULL, 0)',
+                    [
+                        (
+                            range_index,
+                            begin_doc_index,
+                            min(begin_doc_index + self._range_len_in_docs, self._file_len_in_docs),
+                            'pending'
+                        )
+                        for range_index, begin_doc_index in enumerate(
+                            range(0, self._file_len_in_docs, self._range_len_in_docs)
+                        )
+                    ]
+                )
+                meta = {
+                    'file_len_in_docs'  : self._file_len_in_docs,
+                    'range_len_in_docs' : self._range_len_in_docs
+                }
+            self._connection.execute('COMMIT')
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+
+        if (
+            meta['file_len_in_docs'] != self._file_len_in_docs
+            or meta['range_len_in_docs'] != self._range_len_in_docs
+        ):
+            self._logger.critical(
+                dedent(
+                    '''\
+                    io.work_queue: WorkQueue.__init__:
+                    the work queue {0} was created for an input file of {1} docs
+                    split into ranges of {2} docs,
+                    but this worker has an input file of {3} docs
+                    and a range length of {4} docs:
+                    all workers must use the same input file and range length'''
+                ).replace('\n', ' ').format(
+                    self._file_path,
+                    meta['file_len_in_docs'],
+                    meta['range_len_in_docs'],
+                    self._file_len_in_docs,
+                    self._range_len_in_docs
+                )
+            )
+            sys.exit(-1)
+
+
+    #######################################################
+    #### accessors
+
+    def get_worker_id(self : WorkQueue) -> str:
+        return self._worker_id
+
+    def get_lease_secs(self : WorkQueue) -> float:
+        return self._lease_secs
+
+    def get_n_ranges(self : WorkQueue) -> int:
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM ranges'
+        ).fetchone()[0]
+
+    def get_state_to_n_ranges(self : WorkQueue) -> dict:
+        state_to_n_ranges = {state : 0 for state in WorkQueue._STATES}
+        state_to_n_ranges.update(
+            self._connection.execute(
+                'SELECT state, COUNT(*) FROM ranges GROUP BY state'
+            ).fetchall()
+        )
+        return state_to_n_ranges
+
+    def is_done(self : WorkQueue) -> bool:
+        return self.get_state_to_n_ranges()['done'] == self.get_n_ranges()
+
+
+    #######################################################
+    #### lease, renew and complete ranges
+
+    def lease_range(self : WorkQueue) -> tuple[int, int, int] | None:
+        # returns range_index, begin_doc_index and end_doc_index (exclusive)
+        #     of the first range that is pending or whose lease expired,
+        #     or None if there is none
+        now = time.time()
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._connection.execute(
+                'SELECT range_index, begin_doc_index, end_doc_index, state, worker_id '
+                'FROM ranges '
+                'WHERE state = \'pending\' '
+                'OR (state = \'leased\' AND lease_expires_at < ?) '
+                'ORDER BY range_index LIMIT 1',
+                (now,)
+            ).fetchone()
+            if row is not None:
+                self._connection.execute(
+                    'UPDATE ranges '
+                    'SET state = \'leased\', worker_id = ?, lease_expires_at = ?, '
+                    'n_leases = n_leases + 1 '
+                    'WHERE range_index = ?',
+                    (self._worker_id, now + self._lease_secs, row[0])
+                )
+            self._connection.execute('COMMIT')
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+
+        if row is None:
+            return None
+        range_index, begin_doc_index, end_doc_index, state, previous_worker_id = row
+        if 'leased' == state:
+            self._logger.warning(
+                dedent(
+                    '''\
+                    io.work_queue: WorkQueue.lease_range:
+                    reclaimed range {0} (docs {1} to {2})
+                    whose lease by worker {3} expired'''
+                ).replace('\n', ' ').format(
+                    range_index,
+                    begin_doc_index,
+                    end_doc_index - 1,
+                    previous_worker_id
+                )
+            )
+        return range_index, begin_doc_index, end_doc_index
+
+    def _update_leased_range(
+        self        : WorkQueue,
+        range_index : int,
+        sql         : str,
+        parameters  : tuple
+    ) -> bool:
+        # applies the update only if this worker still holds the lease
+        cursor = self._connection.execute(
+            sql + ' WHERE range_index = ? AND state = \'leased\' AND worker_id = ?',
+            parameters + (range_index, self._worker_id)
+        )
+        return 1 == cursor.rowcount
+
+    def heartbeat(
+        self        : WorkQueue,
+        range_index : int
+    ) -> bool:
+        # renews the lease; False if the lease was lost to another worker
+        #     after it expired
+        return self._update_leased_range(
+            range_index,
+            'UPDATE ranges SET lease_expires_at = ?',
+            (time.time() + self._lease_secs,)
+        )
+
+    def complete_range(
+        self        : WorkQueue,
+        range_index : int
+    ) -> bool:
+        # False if the lease was lost to another worker after it expired
+        return self._update_leased_range(
+            range_index,
+            'UPDATE ranges SET state = \'done\', lease_expires_at = NULL',
+            ()
+        )
+
+    def close(self : WorkQueue) -> None:
+        self._connection.close()
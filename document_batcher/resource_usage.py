@@ -0,0 +1,138 @@
+from __future__ import annotations
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from logging import Logger
+from textwrap import dedent
+from typing import Iterator
+
+try:
+    import resource # not available on windows
+except ImportError:
+    resource = None
+
+
+class ResourceUsage:
+
+    #######################################################
+    #### process memory and cpu usage
+    ####
+    #### rss_bytes is the current resident set size,
+    ####     read from /proc/self/statm where available;
+    #### peak_rss_bytes, user_cpu_secs and system_cpu_secs
+    ####     come from resource.getrusage
+
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    @staticmethod
+    def get_snapshot() -> dict:
+        snapshot = {
+            'rss_bytes'       : None,
+            'peak_rss_bytes'  : None,
+            'user_cpu_secs'   : None,
+            'system_cpu_secs' : None,
+            'wall_secs'       : time.perf_counter()
+        }
+        try:
+            with open('/proc/self/statm', 'r') as statm_file:
+                snapshot['rss_bytes'] = \
+                    int(statm_file.read().split()[1]) * ResourceUsage._PAGE_SIZE
+        except OSError:
+            pass
+        if resource is not None:
+            rusage = resource.getrusage(resource.RUSAGE_SELF)
+            # ru_maxrss is in bytes on macos and in kilobytes elsewhere
+            snapshot['peak_rss_bytes'] = \
+                rusage.ru_maxrss if 'darwin' == sys.platform else rusage.ru_maxrss * 1024
+            snapshot['user_cpu_secs']   = rusage.ru_utime
+            snapshot['system_cpu_secs'] = rusage.ru_stime
+        return snapshot
+
+    @staticmethod
+    def get_cpu_secs_between(
+        begin : dict,
+        end   : dict
+    ) -> tuple[float | None, float | None]:
+        if begin['user_cpu_secs'] is None or end['user_cpu_secs'] is None:
+            return None, None
+        return (
+            end['user_cpu_secs']   - begin['user_cpu_secs'],
+            end['system_cpu_secs'] - begin['system_cpu_secs']
+        )
+
+    @staticmethod
+    def to_mib(n_bytes : int | None) -> float:
+        return float('nan') if n_bytes is None else n_bytes / 1024 / 1024
+
+
+    #######################################################
+    #### optional allocation tracing with tracemalloc;
+    ####     tracing slows down allocations considerably,
+    ####     so it is only enabled on request
+
+    @staticmethod
+    def start_tracing_allocations() -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @staticmethod
+    def get_top_allocators(n_allocators : int = 5) -> list[str]:
+        if not tracemalloc.is_tracing():
+            return []
+        statistics = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__)
+        ]).statistics('lineno')
+        return [
+            '{0}:{1}: {2:.1f} MiB in {3} blocks'.format(
+                statistic.traceback[0].filename,
+                statistic.traceback[0].lineno,
+                ResourceUsage.to_mib(statistic.size),
+                statistic.count
+            )
+            for statistic in statistics[:n_allocators]
+        ]
+
+
+    #######################################################
+    #### log the resource usage of a phase, e.g. loading
+    ####     or writing a cache
+
+    @staticmethod
+    @contextmanager
+    def log_phase(
+        logger     : Logger,
+        phase_name : str
+    ) -> Iterator[None]:
+        assert isinstance(logger, Logger)
+        assert isinstance(phase_name, str)
+        begin = ResourceUsage.get_snapshot()
+        yield
+        end = ResourceUsage.get_snapshot()
+        user_cpu_secs, system_cpu_secs = ResourceUsage.get_cpu_secs_between(begin, end)
+        logger.debug(
+            dedent(
+                '''\
+                resource_usage: {0}:
+                took {1:.3f} s wall, {2:.3f} s user cpu, {3:.3f} s system cpu;
+                rss went from {4:.1f} MiB to {5:.1f} MiB,
+                peak rss is {6:.1f} MiB'''
+            ).replace('\n', ' ').format(
+                phase_name,
+                end['wall_secs'] - begin['wall_secs'],
+                float('nan') if user_cpu_secs   is None else user_cpu_secs,
+                float('nan') if system_cpu_secs is None else system_cpu_secs,
+                ResourceUsage.to_mib(begin['rss_bytes']),
+                ResourceUsage.to_mib(end['rss_bytes']),
+                ResourceUsage.to_mib(end['peak_rss_bytes'])
+            )
+        )
+        for top_allocator in ResourceUsage.get_top_allocators():
+            logger.debug(
+                'resource_usage: {0}: top allocator: {1}'
+                .format(
+                    phase_name,
+                    top_allocator
+                )
+            )
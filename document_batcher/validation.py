@@ -0,0 +1,59 @@
+from __future__ import annotations
+import os
+
+
+class Validation:
+
+    #######################################################
+    #### library-wide validation level
+    ####
+    #### 'full'     : every getter and setter re-validates
+    ####              the state it touches (the default,
+    ####              meant for development)
+    #### 'boundary' : only data entering the library is
+    ####              validated, i.e. docs read from the
+    ####              input and output files and values
+    ####              passed in by the user
+    #### 'off'      : no validation beyond what the python
+    ####              interpreter itself enforces
+    ####
+    #### the level can be set with set_level or with the
+    ####     DOCUMENT_BATCHER_VALIDATION environment variable;
+    ####     hot paths read the full and boundary class
+    ####     attributes directly, e.g.
+    ####
+    ####         if Validation.full:
+    ####             assert isinstance(self._id, str)
+
+    _LEVELS = ['full', 'boundary', 'off']
+
+    _ENV_VAR = 'DOCUMENT_BATCHER_VALIDATION'
+
+    level    = 'full'
+    full     = True
+    boundary = True
+
+    @staticmethod
+    def get_levels() -> list[str]:
+        return Validation._LEVELS.copy()
+
+    @staticmethod
+    def set_level(level : str) -> None:
+        assert level in Validation._LEVELS, \
+            'level is {0} but should be one of {1}' \
+            .format(
+                level,
+                Validation._LEVELS
+            )
+        Validation.level    = level
+        Validation.full     = 'full' == level
+        Validation.boundary = 'off' != level
+
+    @staticmethod
+    def get_level() -> str:
+        return Validation.level
+
+
+Validation.set_level(
+    os.environ.get(Validation._ENV_VAR, 'full')
+)
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from document_batcher.document.document import Document
+from document_batcher.io.input_cache import InputCache
+from document_batcher.io.input_file import InputFile
+
+
+class TestInputFile(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._logger = logging.getLogger('test_input_file')
+        self._logger.setLevel(logging.ERROR)
+
+        # the sents of the docs are of different lengths, so that every
+        #     max sent len below truncates a different subset of the docs
+        self._input_doc_dicts = [
+            {
+                'document_id' : 'd{0}'.format(doc_index),
+                'fullText'    : ' '.join(
+                    ' '.join(['word'] * (1 + (doc_index * sent_index) % 13)) + '.'
+                    for sent_index in range(1, 4)
+                )
+            }
+            for doc_index in range(12)
+        ]
+        self._input_file_path = os.path.join(self._dir.name, 'in.jsonl')
+        with open(self._input_file_path, 'w') as input_file:
+            input_file.write(
+                '\n'.join(
+                    json.dumps(input_doc_dict)
+                    for input_doc_dict in self._input_doc_dicts
+                )
+            )
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _get_file_path_of_version(self, version):
+        if 1 == version:
+            return os.path.join(self._dir.name, 'in.input_file_cache_v1.pickle')
+        return InputFile.get_mmap_cache_file_path_of(
+            self._input_file_path,
+            version = version
+        )
+
+    def _assert_docs(self, input_file, max_sent_len_in_chars):
+        expected_docs = [
+            Document.from_input_doc_dict(
+                logger                = self._logger,
+                input_doc_dict        = input_doc_dict,
+                max_sent_len_in_chars = max_sent_len_in_chars
+            )
+            for input_doc_dict in self._input_doc_dicts
+        ]
+        self.assertEqual(len(expected_docs), input_file.get_file_len_in_docs())
+        for doc_index, expected_doc in enumerate(expected_docs):
+            doc = input_file.get_input_doc_at_index(doc_index)
+            self.assertEqual(expected_doc.get_id(), doc.get_id())
+            self.assertEqual(expected_doc.get_list_of_sents(), doc.get_list_of_sents())
+        self.assertEqual(
+            sum(doc.get_len_in_sents() for doc in expected_docs),
+            input_file.get_file_len_in_sents()
+        )
+        self.assertEqual(
+            sum(doc.get_len_in_words() for doc in expected_docs),
+            input_file.get_file_len_in_words()
+        )
+        self.assertEqual(
+            sum(doc.get_len_in_chars() for doc in expected_docs),
+            input_file.get_file_len_in_chars()
+        )
+
+    def test_earlier_version_caches_are_rebuilt_as_v3_and_removed(self):
+        # the earlier caches are not even read, so their content is irrelevant
+        for version in [1, 2]:
+            with open(self._get_file_path_of_version(version), 'wb') as cache_file:
+                cache_file.write(b'not a cache of this version')
+        with open(self._get_file_path_of_version(2) + '.lock', 'w'):
+            pass
+
+        input_file = InputFile(
+            logger    = self._logger,
+            file_path = self._input_file_path
+        )
+
+        self.assertTrue(os.path.isfile(self._get_file_path_of_version(3)))
+        for file_path in [
+            self._get_file_path_of_version(1),
+            self._get_file_path_of_version(2),
+            self._get_file_path_of_version(2) + '.lock'
+        ]:
+            self.assertFalse(os.path.exists(file_path))
+        self._assert_docs(input_file, 2048)
+
+    def test_one_cache_serves_every_max_sent_len(self):
+        # the first input file builds the cache, which every later one reads
+        #     with the truncation records of its own max sent len
+        for max_sent_len_in_chars in [2048, 20, 7, 1]:
+            input_file = InputFile(
+                logger                = self._logger,
+                file_path             = self._input_file_path,
+                max_sent_len_in_chars = max_sent_len_in_chars
+            )
+            self._assert_docs(input_file, max_sent_len_in_chars)
+
+            input_cache = InputCache(
+                logger                = self._logger,
+                cache_file_path       = self._get_file_path_of_version(3),
+                max_sent_len_in_chars = max_sent_len_in_chars
+            )
+            untruncated_docs = [
+                Document.from_input_doc_dict(
+                    logger                = self._logger,
+                    input_doc_dict        = input_doc_dict,
+                    max_sent_len_in_chars = None
+                )
+                for input_doc_dict in self._input_doc_dicts
+            ]
+            self.assertEqual(
+                sum(
+                    1
+                    for doc in untruncated_docs
+                    for sent in doc.get_list_of_sents()
+                    if max_sent_len_in_chars < len(sent)
+                ),
+                input_cache.get_n_truncated_sents()
+            )
+            self.assertEqual(
+                sum(
+                    1
+                    for doc in untruncated_docs
+                    if max(len(sent) for sent in doc.get_list_of_sents())
+                        > max_sent_len_in_chars
+                ),
+                input_cache.get_n_truncated_docs()
+            )
+            input_cache.close()
+        self.assertEqual(
+            [os.path.basename(self._get_file_path_of_version(3))],
+            [
+                file_name for file_name in os.listdir(self._dir.name)
+                if file_name.endswith('.mmap')
+            ]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
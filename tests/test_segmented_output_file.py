@@ -0,0 +1,146 @@
+import datetime
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from document_batcher.io.input_file import InputFile
+from document_batcher.io.segmented_output_file import SegmentedOutputFile
+from document_batcher.document.document_batch_iterator import DocumentBatchIterator
+
+
+class TestSegmentedOutputFile(unittest.TestCase):
+
+    _N_DOCS = 20
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._logger = logging.getLogger('test_segmented_output_file')
+        self._logger.setLevel(logging.ERROR)
+
+        self._input_file_path = os.path.join(self._dir.name, 'in.jsonl')
+        with open(self._input_file_path, 'w') as input_file:
+            input_file.write(
+                '\n'.join(
+                    json.dumps({
+                        'document_id' : 'd{0}'.format(doc_index),
+                        'fullText'    : 'Doc {0} begins. Doc {0} ends.'.format(doc_index)
+                    })
+                    for doc_index in range(TestSegmentedOutputFile._N_DOCS)
+                )
+            )
+        self._output_file_path = os.path.join(self._dir.name, 'out.jsonl')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _run(self, n_doc_batches=None):
+        # processes n_doc_batches doc batches, or all of them, in doc
+        #     batches of 2 docs and segments of at least 5 docs, i.e. of
+        #     3 doc batches; returns the output file
+        output_file = SegmentedOutputFile(
+            logger                   = self._logger,
+            file_path                = self._output_file_path,
+            predicted_statistics_key = 'n_chars',
+            segment_max_n_docs       = 5
+        )
+        iterator = DocumentBatchIterator(
+            logger         = self._logger,
+            input_file     = InputFile(
+                logger    = self._logger,
+                file_path = self._input_file_path
+            ),
+            output_file    = output_file,
+            doc_batch_size = 2
+        )
+        for doc_batch_index, doc_batch in enumerate(iterator):
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for doc in doc_batch.get_list_of_docs():
+                doc.set_predicted_statistics({'n_chars' : len(doc.get_full_text())})
+            doc_batch.set_begin_datetime(now)
+            doc_batch.set_end_datetime(now)
+            doc_batch.write_to_disk()
+            if doc_batch_index + 1 == n_doc_batches:
+                return output_file
+        output_file.write_cache_to_disk()
+        return output_file
+
+    def _get_doc_ids_in_segments(self):
+        manifest = SegmentedOutputFile.read_manifest(self._output_file_path)
+        doc_ids = []
+        for segment in manifest['segments']:
+            with open(os.path.join(self._dir.name, segment['file_name']), 'r') as segment_file:
+                segment_doc_ids = [
+                    json.loads(line)['document_id'] for line in segment_file
+                ]
+            self.assertEqual(segment['n_docs'], len(segment_doc_ids))
+            doc_ids += segment_doc_ids
+        return doc_ids
+
+    def _assert_complete_output(self):
+        manifest = SegmentedOutputFile.read_manifest(self._output_file_path)
+        self.assertTrue(manifest['finalized'])
+        self.assertEqual(
+            [6, 6, 6, 2],
+            [segment['n_docs'] for segment in manifest['segments']]
+        )
+        self.assertEqual(
+            [3, 3, 3, 1],
+            [segment['n_doc_batches'] for segment in manifest['segments']]
+        )
+        self.assertEqual(
+            [
+                'd{0}'.format(doc_index)
+                for doc_index in range(TestSegmentedOutputFile._N_DOCS)
+            ],
+            self._get_doc_ids_in_segments()
+        )
+
+    def test_segments_are_rolled_over_at_doc_batch_boundaries(self):
+        output_file = self._run()
+        self.assertEqual(TestSegmentedOutputFile._N_DOCS, output_file.get_file_len_in_docs())
+        self._assert_complete_output()
+
+    def test_resume_in_the_middle_of_a_segment(self):
+        # 4 doc batches: one completed segment, and one doc batch in the next
+        output_file = self._run(n_doc_batches=4)
+        self.assertEqual(6, output_file.get_n_docs_in_completed_segments())
+        self.assertEqual(8, output_file.get_file_len_in_docs())
+
+        self._run()
+        self._assert_complete_output()
+
+    def test_resume_after_a_crash_between_finalizing_a_segment_and_writing_the_manifest(self):
+        # 6 doc batches: two completed segments
+        self._run(n_doc_batches=6)
+        manifest_file_path = \
+            SegmentedOutputFile.get_manifest_file_path_of(self._output_file_path)
+        with open(manifest_file_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        self.assertEqual(2, len(manifest['segments']))
+
+        # the second segment is finalized, but the process died before it
+        #     was recorded in the manifest
+        removed_segment = manifest['segments'].pop()
+        with open(manifest_file_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+
+        output_file = SegmentedOutputFile(
+            logger                   = self._logger,
+            file_path                = self._output_file_path,
+            predicted_statistics_key = 'n_chars',
+            segment_max_n_docs       = 5
+        )
+        self.assertEqual(12, output_file.get_n_docs_in_completed_segments())
+        recovered_segment = \
+            SegmentedOutputFile.read_manifest(self._output_file_path)['segments'][-1]
+        for key in ['file_name', 'n_docs', 'n_sents', 'n_words', 'n_chars', 'n_bytes', 'n_doc_batches']:
+            self.assertEqual(removed_segment[key], recovered_segment[key])
+
+        self._run()
+        self._assert_complete_output()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import datetime
+import json
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+from document_batcher.io.input_file import InputFile
+from document_batcher.io.work_queue import WorkQueue
+from document_batcher.document.work_queue_document_batch_iterator import \
+    WorkQueueDocumentBatchIterator
+
+
+class TestWorkQueueDocumentBatchIterator(unittest.TestCase):
+
+    _LEASE_SECS = 0.5
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._logger = logging.getLogger('test_work_queue_document_batch_iterator')
+        self._logger.setLevel(logging.ERROR)
+
+        self._input_file_path = os.path.join(self._dir.name, 'in.jsonl')
+        with open(self._input_file_path, 'w') as input_file:
+            input_file.write(
+                '\n'.join(
+                    json.dumps({
+                        'document_id' : 'd{0}'.format(doc_index),
+                        'fullText'    : 'Doc {0} begins. Doc {0} ends.'.format(doc_index)
+                    })
+                    for doc_index in range(10)
+                )
+            )
+        self._output_file_path = os.path.join(self._dir.name, 'out.jsonl')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _get_iterator(self, worker_id):
+        input_file = InputFile(
+            logger    = self._logger,
+            file_path = self._input_file_path
+        )
+        work_queue = WorkQueue(
+            logger            = self._logger,
+            file_path         = os.path.join(self._dir.name, 'work_queue.sqlite'),
+            file_len_in_docs  = input_file.get_file_len_in_docs(),
+            range_len_in_docs = 5,
+            lease_secs        = TestWorkQueueDocumentBatchIterator._LEASE_SECS,
+            worker_id         = worker_id
+        )
+        iterator = WorkQueueDocumentBatchIterator(
+            logger                   = self._logger,
+            input_file               = input_file,
+            work_queue               = work_queue,
+            output_file_path         = self._output_file_path,
+            predicted_statistics_key = 'n_chars',
+            doc_batch_size           = 2
+        )
+        return work_queue, iterator
+
+    @staticmethod
+    def _process(doc_batch):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for doc in doc_batch.get_list_of_docs():
+            doc.set_predicted_statistics({'n_chars' : len(doc.get_full_text())})
+        doc_batch.set_begin_datetime(now)
+        doc_batch.set_end_datetime(now)
+
+    def test_lease_expires_while_a_doc_batch_is_in_progress(self):
+        work_queue_a, iterator_a = self._get_iterator('a')
+        work_queue_b, iterator_b = self._get_iterator('b')
+
+        doc_batch = next(iterator_a)
+        self._process(doc_batch)
+        doc_batch.write_to_disk()
+
+        # worker a stalls on its second doc batch of range 0 until its lease
+        #     expires, and worker b reclaims range 0 and processes every range
+        doc_batch = next(iterator_a)
+        self._process(doc_batch)
+        time.sleep(1.5 * TestWorkQueueDocumentBatchIterator._LEASE_SECS)
+        for doc_batch_b in iterator_b:
+            self._process(doc_batch_b)
+            doc_batch_b.write_to_disk()
+        self.assertTrue(work_queue_b.is_done())
+
+        # the stale doc batch of worker a is dropped, not appended
+        doc_batch.write_to_disk()
+        self.assertEqual([], list(iterator_a))
+
+        self._assert_merged_output_file(work_queue_b)
+
+        work_queue_a.close()
+        work_queue_b.close()
+
+    def test_doc_batch_requested_before_the_last_one_is_written(self):
+        work_queue_a, iterator_a = self._get_iterator('a')
+        work_queue_b, iterator_b = self._get_iterator('b')
+
+        # worker a may not look ahead: it would otherwise lease another range
+        #     while a doc batch of range 0 is still unwritten
+        doc_batch = next(iterator_a)
+        self._process(doc_batch)
+        with self.assertRaises(AssertionError):
+            next(iterator_a)
+
+        time.sleep(1.5 * TestWorkQueueDocumentBatchIterator._LEASE_SECS)
+        for doc_batch_b in iterator_b:
+            self._process(doc_batch_b)
+            doc_batch_b.write_to_disk()
+        self.assertTrue(work_queue_b.is_done())
+
+        doc_batch.write_to_disk()
+        self.assertEqual([], list(iterator_a))
+
+        self._assert_merged_output_file(work_queue_b)
+
+        work_queue_a.close()
+        work_queue_b.close()
+
+    def _assert_merged_output_file(self, work_queue):
+        WorkQueueDocumentBatchIterator.merge_range_output_files(
+            self._logger,
+            work_queue,
+            self._output_file_path
+        )
+        with open(self._output_file_path, 'r') as output_file:
+            doc_ids = [json.loads(line)['document_id'] for line in output_file]
+        self.assertEqual(['d{0}'.format(doc_index) for doc_index in range(10)], doc_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()